@@ -2,37 +2,227 @@
 # TravelAgents.py
 # ---------------
 Defines the TravelAgents class which creates the CrewAI agents.
-Also includes the StreamToExpander class for redirecting agent output to Streamlit.
+Also includes PacedLLM, which routes every LLM call through its model's rate limiter
+and enforces per-agent budgets, and AgentPool, which keeps built agents and their LLM
+client warm across runs.
 """
 
-import streamlit as st
+import random
+import threading
+import time
+from contextlib import contextmanager
+from TravelStartup import configure_api_keys, prepare_crewai
+
+prepare_crewai()
+
 from crewai import Agent
-import re
-import os
 from crewai import LLM
-from tools.search_tools import search_internet
+from tools.search_tools import get_search_tool
+from TravelBudgets import finalize_message, stage_budget
+from TravelConfig import get_flag, get_float, get_int, get_setting
+from TravelModels import (
+    ModelRouter, agent_model, is_rate_limit_error, is_transient_error, retry_after_seconds,
+)
+from TravelRateLimiter import estimate_message_tokens, estimate_tokens, get_rate_limiter
+
+
+# Completion allowance reserved up front; settled with the real size afterwards
+DEFAULT_COMPLETION_TOKENS = 1024
+
+
+class PacedLLM(LLM):
+    """
+    LLM that waits for a slot in its model's RateLimiter before each call.
+    `session_id` identifies the Streamlit session so the limiter can queue
+    sessions fairly; calls, wait time, latency and tokens are kept for this instance.
+    When a run binds a `tracer`, every request is recorded as an "llm" span, and
+    when it binds `budgets`, an agent that has run out of budget is told to write
+    its final answer in that request. With a `router`, the request may be served
+    by a sibling client for another model (see TravelModels.ModelRouter).
+    """
+
+    def __init__(self, *args, session_id="default", limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session_id = session_id
+        self.limiter = limiter or get_rate_limiter(self.model)
+        self.tracer = None
+        self.budgets = None
+        self.router = None
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.calls = 0
+            self.wait_seconds = 0.0
+            self.latency_seconds = 0.0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.rate_limited = 0
+            self.retries = 0
 
-# Set GROQ API key from Streamlit secrets
-try:
-    os.environ['GROQ_API_KEY'] = st.secrets.get("GROQ_API", os.getenv("GROQ_API_KEY", ""))
-except:
-    os.environ['GROQ_API_KEY'] = os.getenv("GROQ_API_KEY", "")
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "calls": self.calls,
+                "wait_seconds": self.wait_seconds,
+                "avg_latency": self.latency_seconds / self.calls if self.calls else 0.0,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "rate_limited": self.rate_limited,
+                "retries": self.retries,
+            }
+
+    def call(self, messages, *args, **kwargs):
+        forced = self._check_budget(kwargs.get("from_agent"))
+        if forced:
+            messages = self._with_finalize(messages, forced)
+        if self.router is not None:
+            return self.router.call(self, messages, forced, *args, **kwargs)
+        return self.paced_call(messages, forced, {}, *args, **kwargs)
+
+    def paced_call(self, messages, forced, attrs, *args, **kwargs):
+        """One request to this instance's model; `attrs` are added to its span."""
+        tracer = self.tracer
+        if tracer is None:
+            return self._paced_call(messages, None, *args, **kwargs)
+        attrs = dict(attrs, model=self.model)
+        agent = getattr(kwargs.get("from_agent"), "role", None)
+        if agent:
+            attrs["agent"] = agent
+        if forced:
+            attrs["forced_final"] = forced
+        with tracer.span("LLM request", "llm", **attrs) as span:
+            return self._paced_call(messages, span, *args, **kwargs)
+
+    def _check_budget(self, agent):
+        budget = self.budgets.get(agent) if self.budgets is not None else None
+        return budget.begin_iteration() if budget is not None else None
+
+    @staticmethod
+    def _with_finalize(messages, reason):
+        # A copy: the executor's own message history must not keep the instruction
+        if isinstance(messages, str):
+            return f"{messages}\n\n{finalize_message(reason)}"
+        return list(messages) + [{"role": "user", "content": finalize_message(reason)}]
+
+    def _paced_call(self, messages, span, *args, **kwargs):
+        # Retries are made here rather than inside litellm (max_retries=0), so they
+        # are paced, traced and follow the provider's retry-after hints
+        max_retries = get_int("LLM_MAX_RETRIES", 4)
+        for attempt in range(max_retries + 1):
+            try:
+                return self._attempt(messages, span, *args, **kwargs)
+            except Exception as exc:
+                delay = self._retry_delay(exc, attempt, max_retries)
+                if delay is None:
+                    raise
+                with self._stats_lock:
+                    self.retries += 1
+                if span is not None:
+                    span.attrs["retries"] = attempt + 1
+                    if delay > 0:
+                        now = time.perf_counter()
+                        self.tracer.add("Retry backoff", "backoff", now, now + delay, parent_id=span.id,
+                                        error=type(exc).__name__)
+                time.sleep(delay)
+
+    def _retry_delay(self, exc, attempt, max_retries):
+        """Seconds to wait before retrying after `exc`, or None to give up."""
+        if attempt >= max_retries or not is_transient_error(exc):
+            return None
+        hint = retry_after_seconds(exc)
+        if hint is not None and is_rate_limit_error(exc):
+            # A long wait is better spent on a fallback model
+            if self.router is not None and hint > get_float("LLM_MAX_RETRY_WAIT_SECONDS", 20):
+                return None
+            # Every caller of this model waits out the hint in the limiter queue
+            self.limiter.pause(hint)
+            return 0.0
+        # No hint: exponential backoff with full jitter
+        return random.uniform(0, min(60.0, 2.0 ** (attempt + 1)))
+
+    def _attempt(self, messages, span, *args, **kwargs):
+        prompt_tokens = estimate_message_tokens(messages)
+        completion_allowance = getattr(self, "max_tokens", None) or DEFAULT_COMPLETION_TOKENS
+        requested_at = time.perf_counter()
+        grant = self.limiter.acquire(self.session_id, prompt_tokens + completion_allowance)
+        if span is not None and grant.waited > 0:
+            self.tracer.add("Waiting for rate budget", "rate_limit", requested_at, requested_at + grant.waited,
+                            parent_id=span.id)
+        response = None
+        rate_limited = False
+        started = time.perf_counter()
+        try:
+            response = self._complete(messages, *args, **kwargs)
+            return response
+        except Exception as exc:
+            rate_limited = is_rate_limit_error(exc)
+            raise
+        finally:
+            latency = time.perf_counter() - started
+            completion_tokens = estimate_tokens(str(response or ""))
+            self.limiter.settle(grant, prompt_tokens + completion_tokens)
+            with self._stats_lock:
+                self.calls += 1
+                self.wait_seconds += grant.waited
+                self.latency_seconds += latency
+                self.prompt_tokens += prompt_tokens
+                self.completion_tokens += completion_tokens
+                self.rate_limited += rate_limited
+            if span is not None:
+                span.attrs.setdefault("retries", 0)
+                span.attrs["wait_seconds"] = span.attrs.get("wait_seconds", 0.0) + grant.waited
+                span.attrs.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def _complete(self, messages, *args, **kwargs):
+        # The provider call itself; stand-in LLMs (benchmarks) override only this
+        return super().call(messages, *args, **kwargs)
 
 
 class TravelAgents():
     """
     Collection of CrewAI agents for the travel planning application.
     Each method returns a configured Agent object.
+    `llm_factory` builds the LLM clients (PacedLLM by default) from their settings;
+    agents get the client for their stage's model from a shared ModelRouter.
     """
 
-    def __init__(self) -> None:
-        self.llm = LLM(
-            model="groq/llama-3.3-70b-versatile",
+    def __init__(self, session_id="default", progress=None, llm_factory=None) -> None:
+        # Keys are read here rather than at import so the UI never touches secrets
+        # until a plan is generated.
+        configure_api_keys()
+        # Progress reaches the UI through step callbacks; verbose console logging
+        # is off on the hot path unless explicitly requested for debugging.
+        self.progress = progress
+        self.verbose = get_flag("VERBOSE_AGENTS", False)
+        self.llm_factory = llm_factory or PacedLLM
+        self.search_tool = get_search_tool()
+        self.session_id = session_id
+        self.router = ModelRouter(self._build_llm)
+
+    def _build_llm(self, model):
+        return self.llm_factory(
+            model=model,
             temperature=0.2,
-            max_retries=3,
-            request_timeout=120
+            max_retries=0,
+            request_timeout=120,
+            session_id=self.session_id,
         )
 
+    def _llm(self, stage, role):
+        self.router.stages[role] = stage
+        return self.router.client(agent_model(stage))
+
+    def _max_iter(self, stage):
+        # CrewAI's own limit is only a backstop; budgets finalize the agent first
+        return stage_budget(stage)["max_iterations"] + 2
+
+    def _step_callback(self, role):
+        if self.progress is None:
+            return None
+        return self.progress.step_callback(role)
+
     def location_expert(self):
         return Agent(
             role="Senior Destination Research Specialist",
@@ -51,10 +241,13 @@ class TravelAgents():
                 "You present information in a structured, scannable format so travelers can "
                 "quickly find what they need."
             ),
-            tools=[search_internet],
-            verbose=True,
-            llm=self.llm,
+            # Each agent gets its own copy of the tool so it can carry that agent's budget
+            tools=[self.search_tool.for_run()],
+            verbose=self.verbose,
+            llm=self._llm("location", "Senior Destination Research Specialist"),
+            max_iter=self._max_iter("location"),
             allow_delegation=False,
+            step_callback=self._step_callback("Senior Destination Research Specialist"),
         )
 
     def guide_expert(self):
@@ -76,10 +269,12 @@ class TravelAgents():
                 "surprising. You write with warmth, specificity, and enthusiasm, making the reader "
                 "excited to explore."
             ),
-            tools=[search_internet],
-            verbose=True,
-            llm=self.llm,
+            tools=[self.search_tool.for_run()],
+            verbose=self.verbose,
+            llm=self._llm("guide", "Local Culture & Experience Curator"),
+            max_iter=self._max_iter("guide"),
             allow_delegation=False,
+            step_callback=self._step_callback("Local Culture & Experience Curator"),
         )
 
     def planner_expert(self):
@@ -102,65 +297,200 @@ class TravelAgents():
                 "and feel like they were written by someone who genuinely cares about the traveler "
                 "having the best possible trip."
             ),
-            tools=[search_internet],
-            verbose=True,
-            llm=self.llm,
+            tools=[self.search_tool.for_run()],
+            verbose=self.verbose,
+            llm=self._llm("planner", "Master Travel Itinerary Architect"),
+            max_iter=self._max_iter("planner"),
             allow_delegation=False,
+            step_callback=self._step_callback("Master Travel Itinerary Architect"),
         )
 
 
-class StreamToExpander:
-    """Redirects stdout to a Streamlit expander, filtering noise."""
+def _chain(callbacks):
+    """One step callback calling each of `callbacks` in order, or None if there are none."""
+    if len(callbacks) < 2:
+        return callbacks[0] if callbacks else None
 
-    def __init__(self, expander):
-        self.expander = expander
-        self.buffer = []
-        self.colors = ['red', 'green', 'blue', 'orange']
-        self.color_index = 0
+    def callback(step):
+        for each in callbacks:
+            each(step)
+    return callback
 
-    def write(self, data):
-        cleaned_data = re.sub(r'\x1B\[[0-9;]*[mK]', '', data)
 
-        # Suppress internal crewai event bus noise
-        if '[CrewAIEventsBus]' in cleaned_data:
-            return
+class AgentSet:
+    """
+    One fully built set of the three agents and the LLM clients they share.
+    A set is used by exactly one run at a time; `bind` resets the state a
+    previous run left behind and points callbacks at the new run.
+    """
 
-        task_match_object = re.search(r'\"task\"\s*:\s*\"(.*?)\"', cleaned_data, re.IGNORECASE)
-        task_match_input = re.search(r'task\s*:\s*([^\n]*)', cleaned_data, re.IGNORECASE)
-        task_value = None
-        if task_match_object:
-            task_value = task_match_object.group(1)
-        elif task_match_input:
-            task_value = task_match_input.group(1).strip()
+    def __init__(self, llm_factory=None):
+        started = time.perf_counter()
+        self.factory = TravelAgents(llm_factory=llm_factory)
+        self.router = self.factory.router
+        self.verbose = self.factory.verbose
+        self.location_expert = self.factory.location_expert()
+        self.guide_expert = self.factory.guide_expert()
+        self.planner_expert = self.factory.planner_expert()
+        self._compaction_llm = None
+        self._batch_planners = []
+        self._progress = None
+        self._tracer = None
+        self._budgets = None
+        self._trip = {}
+        self.build_seconds = time.perf_counter() - started
 
-        if task_value:
-            st.toast(":robot_face: " + task_value)
+    @property
+    def agents(self):
+        return [self.location_expert, self.guide_expert, self.planner_expert] + self._batch_planners
 
-        if "Entering new CrewAgentExecutor chain" in cleaned_data:
-            self.color_index = (self.color_index + 1) % len(self.colors)
-            cleaned_data = cleaned_data.replace(
-                "Entering new CrewAgentExecutor chain",
-                f":{self.colors[self.color_index]}[Entering new CrewAgentExecutor chain]"
-            )
+    def stage_of(self, agent):
+        if agent is self.location_expert:
+            return "location"
+        if agent is self.guide_expert:
+            return "guide"
+        return "planner"
 
-        if "Finished chain." in cleaned_data:
-            cleaned_data = cleaned_data.replace(
-                "Finished chain.",
-                f":{self.colors[self.color_index]}[Finished chain.]"
+    def batch_planners(self, count):
+        """
+        `count` planner agents for concurrent day-batch crews. An Agent must not run
+        two tasks at once, so each concurrent crew gets its own; they share the
+        LLM clients and are kept with the set for later runs.
+        """
+        while len(self._batch_planners) < count:
+            agent = self.factory.planner_expert()
+            self._bind_agent(agent)
+            self._batch_planners.append(agent)
+        return self._batch_planners[:count]
+
+    def compaction_llm(self):
+        """Smaller, cheaper model used to condense research before planning."""
+        if self._compaction_llm is None:
+            self._compaction_llm = self.factory.llm_factory(
+                model=get_setting("COMPACTION_MODEL", "groq/llama-3.1-8b-instant"),
+                temperature=0.0,
+                max_retries=0,
+                request_timeout=60,
+                session_id=self.router.session_id,
             )
+            self._compaction_llm.tracer = self._tracer
+        return self._compaction_llm
+
+    def llm_stats(self):
+        """Calls, rate-limit wait and per-model figures for the current run."""
+        stats = self.router.stats()
+        llm = self._compaction_llm
+        if llm is not None and llm.calls:
+            entry = llm.stats()
+            stats["models"].setdefault(llm.model, entry)
+            stats["calls"] += entry["calls"]
+            stats["wait_seconds"] += entry["wait_seconds"]
+        return stats
+
+    def bind(self, session_id, progress, tracer=None, budgets=None, trip=None):
+        """`trip` ({"destination", "travel_month"}) tags the searches of the run for the knowledge base."""
+        self.router.bind(session_id, tracer, budgets)
+        if self._compaction_llm is not None:
+            self._compaction_llm.session_id = session_id
+            self._compaction_llm.tracer = tracer
+            self._compaction_llm.reset_stats()
+        self._progress = progress
+        self._tracer = tracer
+        self._budgets = budgets
+        self._trip = trip or {}
+        for agent in self.agents:
+            self._bind_agent(agent)
+
+    def _bind_agent(self, agent):
+        # Crew.kickoff attaches itself and its helpers to each agent; clear
+        # them so nothing from the previous crew leaks into this one.
+        for attr, value in (("crew", None), ("tools_results", []),
+                            ("_times_executed", 0), ("_rpm_controller", None)):
+            if hasattr(agent, attr):
+                setattr(agent, attr, value)
+        callbacks = [source.step_callback(agent.role)
+                     for source in (self._progress, self._tracer) if source is not None]
+        agent.step_callback = _chain(callbacks)
+        budget = self._budgets.track(agent, self.stage_of(agent)) if self._budgets is not None else None
+        for tool in agent.tools or []:
+            tool.tracer = self._tracer
+            tool.budget = budget
+            tool.destination = self._trip.get("destination", "")
+            tool.travel_month = self._trip.get("travel_month")
+
+
+class AgentPool:
+    """
+    Process-level registry of warm AgentSets.
+    `checkout` hands a run an idle set (building one only when none is free)
+    and returns it to the pool afterwards, so only Tasks and the Crew are
+    created per request. At most `max_idle` sets are kept between runs.
+    """
+
+    def __init__(self, max_idle=4, llm_factory=None):
+        self.max_idle = max_idle
+        self.llm_factory = llm_factory
+        self._idle = []
+        self._lock = threading.Lock()
+        self.built = 0
+        self.reused = 0
+        self.total_build_seconds = 0.0
+
+    @property
+    def avg_build_seconds(self):
+        return self.total_build_seconds / self.built if self.built else 0.0
+
+    @contextmanager
+    def checkout(self, session_id="default", progress=None, tracer=None, budgets=None, trip=None):
+        started = time.perf_counter()
+        with self._lock:
+            agent_set = self._idle.pop() if self._idle else None
+        reused = agent_set is not None
+        if agent_set is None:
+            agent_set = AgentSet(self.llm_factory)
+            with self._lock:
+                self.built += 1
+                self.total_build_seconds += agent_set.build_seconds
+        else:
+            with self._lock:
+                self.reused += 1
+        agent_set.bind(session_id, progress, tracer, budgets, trip)
+        agent_set.setup_seconds = time.perf_counter() - started
+        # Setup a cold build would have cost, minus what this checkout took
+        agent_set.setup_saved = max(0.0, self.avg_build_seconds - agent_set.setup_seconds) if reused else 0.0
+        try:
+            yield agent_set
+        finally:
+            agent_set.bind("default", None)
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(agent_set)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "built": self.built,
+                "reused": self.reused,
+                "idle": len(self._idle),
+                "avg_build_seconds": self.avg_build_seconds,
+            }
+
+
+_agent_pool = None
+_agent_pool_lock = threading.Lock()
 
-        self.buffer.append(cleaned_data)
-        if "\n" in data:
-            self.expander.markdown(''.join(self.buffer), unsafe_allow_html=True)
-            self.buffer = []
 
-    def flush(self):
-        if self.buffer:
-            self.expander.markdown(''.join(self.buffer), unsafe_allow_html=True)
-            self.buffer = []
+def get_agent_pool():
+    """Returns the agent pool shared by every session in this process."""
+    global _agent_pool
+    with _agent_pool_lock:
+        if _agent_pool is None:
+            _agent_pool = AgentPool(max_idle=get_int("AGENT_POOL_SIZE", 4))
+        return _agent_pool
 
-    def isatty(self):
-        return False
 
-    def fileno(self):
-        raise AttributeError("StreamToExpander has no file descriptor")
+def set_agent_pool(pool):
+    """Replaces the shared pool, e.g. with one built on a stand-in LLM for offline benchmarks."""
+    global _agent_pool
+    with _agent_pool_lock:
+        _agent_pool = pool
@@ -0,0 +1,213 @@
+"""
+TravelArtifacts.py
+------------------
+Run-scoped artifact store for reports, plans and traces.
+Every run gets its own directory under ARTIFACT_DIR, keyed by run id, so
+concurrent sessions never overwrite each other. Artifacts are gzip-compressed and
+written atomically (temporary file + os.replace), so a crashed run can leave a
+missing artifact but never a half-written one. A small SQLite index by
+destination, dates and creation time lets the UI list past plans and reload them
+without rerunning any agents.
+"""
+
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from TravelCache import STAGE_INPUTS, normalize_input
+from TravelConfig import get_int, get_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARTIFACT_DIR = os.path.join(".cache", "runs")
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+INDEX_COLUMNS = ("run_id", "from_city", "destination_city", "interests", "date_from", "date_to",
+                 "created_at", "finished_at", "status", "artifacts")
+
+
+def write_atomic(path, data):
+    """Writes text or bytes via a temporary file and os.replace, so readers never see a partial file."""
+    directory = os.path.dirname(path) or "."
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(handle, "wb") as temp_file:
+            temp_file.write(data.encode("utf-8") if isinstance(data, str) else data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _trip_inputs(inputs):
+    return {name: normalize_input(name, inputs.get(name) or "") for name in STAGE_INPUTS["planner"]}
+
+
+class ArtifactStore:
+    """
+    Directory per run (`<root>/<run_id>/`) holding `meta.json` and one
+    `<name>.gz` per artifact, plus `index.sqlite3` for listing runs. Only the
+    newest `max_runs` runs are kept.
+    """
+
+    def __init__(self, root=None, max_runs=None):
+        self.root = root or get_setting("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR)
+        self.max_runs = max_runs or get_int("ARTIFACT_MAX_RUNS", 200)
+        self.index_path = os.path.join(self.root, "index.sqlite3")
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " run_id TEXT PRIMARY KEY,"
+                " from_city TEXT,"
+                " destination_city TEXT,"
+                " destination_key TEXT,"
+                " interests TEXT,"
+                " date_from TEXT,"
+                " date_to TEXT,"
+                " created_at REAL NOT NULL,"
+                " finished_at REAL,"
+                " status TEXT NOT NULL,"
+                " artifacts TEXT NOT NULL DEFAULT '')"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_destination ON runs (destination_key, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def run_dir(self, run_id):
+        return os.path.join(self.root, run_id)
+
+    def begin(self, run_id, inputs):
+        """Registers a new run with its trip inputs."""
+        now = time.time()
+        inputs = {name: str(value) for name, value in inputs.items()}
+        os.makedirs(self.run_dir(run_id), exist_ok=True)
+        self._write_meta(run_id, {"run_id": run_id, "inputs": inputs, "created_at": now, "status": RUNNING})
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO runs (run_id, from_city, destination_city, destination_key,"
+                " interests, date_from, date_to, created_at, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, inputs.get("from_city"), inputs.get("destination_city"),
+                 inputs.get("destination_city", "").strip().lower(), inputs.get("interests"),
+                 inputs.get("date_from"), inputs.get("date_to"), now, RUNNING),
+            )
+        self._prune()
+
+    def save(self, run_id, name, text):
+        """Stores one artifact (e.g. "planner.md") compressed, replacing any previous version."""
+        write_atomic(os.path.join(self.run_dir(run_id), f"{name}.gz"), gzip.compress(text.encode("utf-8")))
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT artifacts FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            names = [artifact for artifact in (row[0] if row else "").split(",") if artifact]
+            if name not in names:
+                conn.execute("UPDATE runs SET artifacts = ? WHERE run_id = ?",
+                             (",".join(names + [name]), run_id))
+
+    def finish(self, run_id, status, **details):
+        """Marks a run done or failed; `details` (timings, stats) are kept in its meta.json."""
+        now = time.time()
+        meta = self.get_run(run_id) or {"run_id": run_id}
+        meta.update(details, status=status, finished_at=now)
+        self._write_meta(run_id, meta)
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?", (status, now, run_id))
+
+    def load(self, run_id, name):
+        """Returns an artifact's text, or None if the run or artifact does not exist."""
+        try:
+            with open(os.path.join(self.run_dir(run_id), f"{name}.gz"), "rb") as artifact_file:
+                return gzip.decompress(artifact_file.read()).decode("utf-8")
+        except (OSError, EOFError):
+            return None
+
+    def get_run(self, run_id):
+        try:
+            with open(os.path.join(self.run_dir(run_id), "meta.json"), encoding="utf-8") as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+    def list_runs(self, destination=None, status=DONE, limit=20):
+        """Newest runs first, optionally for one destination (case-insensitive)."""
+        query = f"SELECT {', '.join(INDEX_COLUMNS)} FROM runs WHERE status = ?"
+        params = [status]
+        if destination:
+            query += " AND destination_key = ?"
+            params.append(destination.strip().lower())
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        runs = [dict(zip(INDEX_COLUMNS, row)) for row in rows]
+        for run in runs:
+            run["artifacts"] = [name for name in run["artifacts"].split(",") if name]
+        return runs
+
+    def find_failed(self, inputs, max_age_seconds):
+        """
+        The newest failed run with the same trip inputs started within
+        `max_age_seconds`, or None. Inputs match the way stage cache keys do.
+        """
+        wanted = _trip_inputs(inputs)
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(INDEX_COLUMNS)} FROM runs WHERE status = ? AND created_at >= ?"
+                " ORDER BY created_at DESC",
+                (FAILED, time.time() - max_age_seconds),
+            ).fetchall()
+        for row in rows:
+            run = dict(zip(INDEX_COLUMNS, row))
+            if _trip_inputs(run) == wanted:
+                run["artifacts"] = [name for name in run["artifacts"].split(",") if name]
+                return run
+        return None
+
+    def delete(self, run_id):
+        shutil.rmtree(self.run_dir(run_id), ignore_errors=True)
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def _write_meta(self, run_id, meta):
+        write_atomic(os.path.join(self.run_dir(run_id), "meta.json"), json.dumps(meta, default=str))
+
+    def _prune(self):
+        with self._lock, self._connect() as conn:
+            stale = [row[0] for row in conn.execute(
+                "SELECT run_id FROM runs ORDER BY created_at DESC LIMIT -1 OFFSET ?", (self.max_runs,)
+            )]
+        for run_id in stale:
+            self.delete(run_id)
+
+
+_artifact_store = None
+_artifact_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Returns the artifact store shared by every session in this process."""
+    global _artifact_store
+    with _artifact_store_lock:
+        if _artifact_store is None:
+            _artifact_store = ArtifactStore()
+        return _artifact_store
@@ -0,0 +1,256 @@
+"""
+TravelBatch.py
+--------------
+Headless batch mode: generates travel plans for many trip requests without the UI.
+Requests are read from a JSONL or CSV file and run through TravelCrew with a
+concurrency limit; every LLM call still goes through the process-wide rate
+limiter, so the whole batch shares one request/token budget. Each finished plan
+is written to its own file as soon as it completes, and a rerun skips requests
+that already finished, so an interrupted batch can simply be started again.
+Plans also land in the stage cache, so the UI serves pre-generated trips instantly.
+
+    python TravelBatch.py trips.jsonl --out plans/ --concurrency 2
+
+Each request needs from_city, destination_city, interests, date_from and date_to
+(ISO dates); "from", "destination", "start" and "end" are accepted as aliases, and
+an optional "id" names the output files (reduced to letters, digits, ".", "_" and "-").
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+
+from TravelArtifacts import write_atomic
+from TravelProgress import ProgressChannel
+
+logger = logging.getLogger(__name__)
+
+FIELD_ALIASES = {
+    "from": "from_city",
+    "origin": "from_city",
+    "destination": "destination_city",
+    "to": "destination_city",
+    "start": "date_from",
+    "end": "date_to",
+}
+REQUIRED_FIELDS = ("from_city", "destination_city", "interests", "date_from", "date_to")
+
+
+class BatchRequestError(ValueError):
+    """Raised for a trip request that is missing fields or has unreadable dates."""
+
+
+def read_requests(path):
+    """Yields (line number, raw request dict) from a .jsonl/.json-lines or .csv file."""
+    with open(path, encoding="utf-8", newline="") as request_file:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(request_file)
+            for raw in reader:
+                yield reader.line_num, raw
+            return
+        for line_number, line in enumerate(request_file, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise BatchRequestError(f"{path}:{line_number}: {exc}") from exc
+
+
+def load_requests(path):
+    """
+    Valid (request_id, params) pairs of a request file, in file order. Invalid
+    requests and repeated ids are reported on stderr with their line and skipped:
+    two requests sharing an id would write the same output files.
+    """
+    requests, first_lines = [], {}
+    for line_number, raw in read_requests(path):
+        try:
+            request = normalize_request(raw)
+        except BatchRequestError as exc:
+            print(f"Skipping invalid request at {path}:{line_number}: {exc}", file=sys.stderr)
+            continue
+        if request[0] in first_lines:
+            print(f"Skipping duplicate request id {request[0]!r} at {path}:{line_number}"
+                  f" (first used on line {first_lines[request[0]]})", file=sys.stderr)
+            continue
+        first_lines[request[0]] = line_number
+        requests.append(request)
+    return requests
+
+
+def normalize_request(raw):
+    """Returns (request_id, TravelCrew keyword arguments) for one raw request."""
+    fields = {}
+    for name, value in raw.items():
+        # csv.DictReader files cells beyond the header under the key None
+        if not isinstance(name, str):
+            continue
+        name = FIELD_ALIASES.get(name.strip().lower(), name.strip().lower())
+        fields[name] = value.strip() if isinstance(value, str) else value
+
+    missing = [name for name in REQUIRED_FIELDS if not fields.get(name)]
+    if missing:
+        raise BatchRequestError(f"missing {', '.join(missing)} in {raw}")
+
+    interests = fields["interests"]
+    if isinstance(interests, (list, tuple)):
+        interests = ", ".join(str(interest).strip() for interest in interests)
+    try:
+        date_from = date.fromisoformat(str(fields["date_from"]))
+        date_to = date.fromisoformat(str(fields["date_to"]))
+    except ValueError as exc:
+        raise BatchRequestError(f"bad date in {raw}: {exc}") from exc
+    if date_to < date_from:
+        raise BatchRequestError(f"date_to is before date_from in {raw}")
+
+    params = {
+        "from_city": fields["from_city"],
+        "destination_city": fields["destination_city"],
+        "interests": interests,
+        "date_from": date_from,
+        "date_to": date_to,
+    }
+    return safe_id(fields.get("id")) or request_id(params), params
+
+
+def safe_id(value):
+    """A user-supplied id reduced to a file name: no path separators and no leading dots."""
+    if value is None:
+        return ""
+    return re.sub(r"[^A-Za-z0-9._-]+", "-", str(value)).strip(".-")[:80]
+
+
+def request_id(params):
+    """Stable id from the inputs, so the same request maps to the same files on every run."""
+    slug = re.sub(r"[^a-z0-9]+", "-", params["destination_city"].lower()).strip("-")[:40]
+    digest = hashlib.sha256(
+        json.dumps({name: str(value) for name, value in params.items()}, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:10]
+    return f"{slug}-{params['date_from']:%Y%m%d}-{digest}"
+
+
+class _PrintChannel(ProgressChannel):
+    """Progress channel that echoes a request's agent activity to stderr."""
+
+    def __init__(self, request_id):
+        super().__init__()
+        self.request_id = request_id
+
+    def publish(self, kind, agent, text):
+        print(f"[{self.request_id}] {text}", file=sys.stderr, flush=True)
+
+
+class BatchRunner:
+    """
+    Runs trip requests `concurrency` at a time and writes, per request,
+    `<id>.md` (the plan) and `<id>.json` (status, inputs, timings, stats).
+    A request whose status file says "done" is skipped on later runs.
+    """
+
+    def __init__(self, out_dir, concurrency=2, verbose=False, retry_failed=True):
+        self.out_dir = out_dir
+        self.concurrency = max(1, concurrency)
+        self.verbose = verbose
+        self.retry_failed = retry_failed
+        self._print_lock = threading.Lock()
+        os.makedirs(out_dir, exist_ok=True)
+
+    def status_path(self, request_id):
+        return os.path.join(self.out_dir, f"{request_id}.json")
+
+    def is_finished(self, request_id):
+        try:
+            with open(self.status_path(request_id), encoding="utf-8") as status_file:
+                status = json.load(status_file).get("status")
+        except (OSError, ValueError):
+            return False
+        return status == "done" or (status == "failed" and not self.retry_failed)
+
+    def run(self, requests):
+        """Runs (request_id, params) pairs; returns a {"done", "failed", "skipped"} count."""
+        counts = {"done": 0, "failed": 0, "skipped": 0}
+        pending = []
+        for request_id, params in requests:
+            if self.is_finished(request_id):
+                counts["skipped"] += 1
+            else:
+                pending.append((request_id, params))
+        self._log(f"{len(pending)} to run, {counts['skipped']} already finished")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+            futures = {executor.submit(self._run_one, request_id, params): request_id
+                       for request_id, params in pending}
+            for future in as_completed(futures):
+                counts[future.result()] += 1
+        return counts
+
+    def _run_one(self, request_id, params):
+        from TravelCrew import TravelCrew
+
+        started = time.time()
+        status = {"id": request_id, "inputs": {name: str(value) for name, value in params.items()},
+                  "started_at": started}
+        progress = _PrintChannel(request_id) if self.verbose else None
+        try:
+            crew = TravelCrew(**params, session_id=f"batch-{request_id}", progress=progress)
+            plan = crew.run()
+        except Exception as exc:
+            logger.exception("Request %s failed", request_id)
+            status.update(status="failed", error=str(exc), finished_at=time.time())
+            write_atomic(self.status_path(request_id), json.dumps(status, indent=2))
+            self._log(f"✗ {request_id} failed: {exc}")
+            return "failed"
+
+        plan_path = os.path.join(self.out_dir, f"{request_id}.md")
+        write_atomic(plan_path, plan)
+        status.update(
+            status="done",
+            plan=os.path.basename(plan_path),
+            run_id=crew.run_id,
+            finished_at=time.time(),
+            timings=crew.timings,
+            cached_stages=crew.cached_stages,
+            llm_stats=crew.llm_stats,
+            budget_hits=crew.budget_hits,
+        )
+        # The status file is written last: its "done" marks the plan as complete
+        write_atomic(self.status_path(request_id), json.dumps(status, indent=2, default=str))
+        self._log(f"✓ {request_id} in {time.time() - started:.0f}s → {plan_path}")
+        return "done"
+
+    def _log(self, text):
+        with self._print_lock:
+            print(text, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("requests", help="JSONL or CSV file of trip requests")
+    parser.add_argument("--out", default="plans", help="Directory for <id>.md plans and <id>.json status files")
+    parser.add_argument("--concurrency", type=int, default=2, help="Trips planned at the same time")
+    parser.add_argument("--skip-failed", action="store_true", help="Do not retry requests that failed before")
+    parser.add_argument("--verbose", action="store_true", help="Print agent activity")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    requests = load_requests(args.requests)
+    runner = BatchRunner(args.out, concurrency=args.concurrency, verbose=args.verbose,
+                         retry_failed=not args.skip_failed)
+    counts = runner.run(requests)
+    print(f"Done: {counts['done']} planned, {counts['failed']} failed, {counts['skipped']} skipped")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
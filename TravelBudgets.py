@@ -0,0 +1,197 @@
+"""
+TravelBudgets.py
+----------------
+Per-agent budgets that bound how long one run can take.
+Each agent gets a cap on reasoning iterations (LLM calls), search tool calls and
+wall-clock seconds. When one runs out the agent is not aborted: PacedLLM adds a
+"write your final answer now" instruction to its next request and the search
+tool refuses further queries, so the agent finishes from what it has gathered.
+Budgets are read per stage, e.g. GUIDE_MAX_ITERATIONS or PLANNER_MAX_TOOL_CALLS.
+"""
+
+import threading
+import time
+
+from TravelConfig import get_float, get_int
+
+ITERATIONS = "iterations"
+TOOL_CALLS = "tool_calls"
+DEADLINE = "deadline"
+# Not a budget: the run was called off (a superseded prefetch), so wrap up at once
+CANCELLED = "cancelled"
+
+BUDGET_LABELS = {
+    ITERATIONS: "step limit",
+    TOOL_CALLS: "search limit",
+    DEADLINE: "time limit",
+}
+
+# The planner already receives the full research, so it gets a single search
+DEFAULT_BUDGETS = {
+    "location": {"max_iterations": 8, "max_tool_calls": 6, "deadline_seconds": 180},
+    "guide": {"max_iterations": 8, "max_tool_calls": 6, "deadline_seconds": 180},
+    "planner": {"max_iterations": 4, "max_tool_calls": 1, "deadline_seconds": 300},
+}
+
+FINALIZE_REASONS = {
+    ITERATIONS: "You have reached your step limit for this task.",
+    TOOL_CALLS: "You have used all the searches available for this task.",
+    DEADLINE: "The time available for this task is up.",
+    CANCELLED: "This task has been cancelled.",
+}
+
+FINALIZE_INSTRUCTION = (
+    " Do not use any tools. Write your complete final answer now, using only the "
+    "information you have already gathered, in the required format: start with "
+    "\"Thought: I now know the final answer\" followed by \"Final Answer:\"."
+)
+
+TOOL_REFUSAL = (
+    "Search budget for this task is used up, so this search was not run. "
+    "Do not search again: write your Final Answer now from what you have already gathered."
+)
+
+
+def stage_budget(stage):
+    """Budget limits for `stage` from settings, falling back to DEFAULT_BUDGETS."""
+    defaults = DEFAULT_BUDGETS[stage]
+    prefix = stage.upper()
+    return {
+        "max_iterations": max(1, get_int(f"{prefix}_MAX_ITERATIONS", defaults["max_iterations"])),
+        "max_tool_calls": max(0, get_int(f"{prefix}_MAX_TOOL_CALLS", defaults["max_tool_calls"])),
+        "deadline_seconds": get_float(f"{prefix}_DEADLINE_SECONDS", defaults["deadline_seconds"]),
+    }
+
+
+def finalize_message(reason):
+    return FINALIZE_REASONS[reason] + FINALIZE_INSTRUCTION
+
+
+class AgentBudget:
+    """
+    Budget state of one agent for one run. The clock starts at the agent's first
+    LLM call, so research that waits behind other tasks is not charged for it.
+    Once a budget forces finalization, every later search is refused as well.
+    Setting the `cancelled` event finalizes the agent the same way.
+    """
+
+    def __init__(self, agent, stage, max_iterations, max_tool_calls, deadline_seconds, on_hit=None,
+                 cancelled=None):
+        self.agent = agent
+        self.stage = stage
+        self.max_iterations = max_iterations
+        self.max_tool_calls = max_tool_calls
+        self.deadline_seconds = deadline_seconds
+        self.on_hit = on_hit
+        self.cancelled = cancelled
+        self.started = None
+        self.iterations = 0
+        self.tool_calls = 0
+        self.finalizing = False
+        self.hits = []
+        self._lock = threading.Lock()
+
+    def limit(self, budget):
+        return {
+            ITERATIONS: self.max_iterations,
+            TOOL_CALLS: self.max_tool_calls,
+            DEADLINE: self.deadline_seconds,
+        }[budget]
+
+    def elapsed(self):
+        return time.monotonic() - self.started if self.started is not None else 0.0
+
+    def begin_iteration(self):
+        """Counts one LLM call; returns the budget that requires finalizing now, or None."""
+        with self._lock:
+            if self.started is None:
+                self.started = time.monotonic()
+            self.iterations += 1
+            if self.cancelled is not None and self.cancelled.is_set():
+                self.finalizing = True
+                return CANCELLED
+            if self.iterations >= self.max_iterations:
+                reason = ITERATIONS
+            elif self.elapsed() >= self.deadline_seconds:
+                reason = DEADLINE
+            elif self.finalizing or (self.max_tool_calls and self.tool_calls >= self.max_tool_calls):
+                # Searches are spent; the tool records a hit only if the agent
+                # actually tries to search again
+                reason = TOOL_CALLS
+            else:
+                return None
+            self.finalizing = True
+            if reason != TOOL_CALLS:
+                self._hit(reason)
+            return reason
+
+    def use_tool(self):
+        """Claims one tool call; False (recording the hit) when no budget is left."""
+        with self._lock:
+            if self.started is None:
+                self.started = time.monotonic()
+            if self.cancelled is not None and self.cancelled.is_set():
+                self.finalizing = True
+                return False
+            if self.tool_calls >= self.max_tool_calls:
+                self._hit(TOOL_CALLS)
+            elif self.elapsed() >= self.deadline_seconds:
+                self._hit(DEADLINE)
+            elif not self.finalizing:
+                self.tool_calls += 1
+                return True
+            self.finalizing = True
+            return False
+
+    def _hit(self, budget):
+        if budget in self.hits:
+            return
+        self.hits.append(budget)
+        if self.on_hit is not None:
+            self.on_hit(self, budget)
+
+
+class BudgetLedger:
+    """
+    The budgets of every agent in one run, looked up by agent object. Concurrent
+    day-batch planners share a role but are separate agents, so each gets its own.
+    `on_hit(budget, name)` is called the first time an agent runs out of a budget;
+    setting the `cancelled` event makes every agent of the run wrap up.
+    """
+
+    def __init__(self, on_hit=None, cancelled=None):
+        self.on_hit = on_hit
+        self.cancelled = cancelled
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def track(self, agent, stage):
+        budget = AgentBudget(agent.role, stage, on_hit=self.on_hit, cancelled=self.cancelled,
+                             **stage_budget(stage))
+        with self._lock:
+            self._budgets[id(agent)] = budget
+        return budget
+
+    def get(self, agent):
+        if agent is None:
+            return None
+        with self._lock:
+            return self._budgets.get(id(agent))
+
+    def hits(self):
+        """One entry per agent role and budget reached, with how many agents reached it."""
+        with self._lock:
+            budgets = list(self._budgets.values())
+        summary = {}
+        for budget in budgets:
+            for name in budget.hits:
+                entry = summary.setdefault((budget.agent, name), {
+                    "agent": budget.agent,
+                    "stage": budget.stage,
+                    "budget": name,
+                    "limit": budget.limit(name),
+                    "count": 0,
+                })
+                entry["count"] += 1
+        return list(summary.values())
+
@@ -0,0 +1,233 @@
+"""
+TravelCache.py
+--------------
+SQLite-backed key/value cache with a per-entry TTL and size-bounded LRU eviction.
+Entries live on disk, so cached results survive Streamlit restarts and are shared
+by every session served from the same working directory.
+Also provides StageCache, which stores each task's output under the inputs its
+prompt actually uses.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from TravelConfig import get_float, get_setting
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "travel_cache.sqlite3")
+
+
+def cache_path():
+    """Returns the on-disk location of the shared cache database."""
+    return get_setting("CACHE_PATH", DEFAULT_CACHE_PATH)
+
+
+class DiskCache:
+    """
+    JSON value cache stored in one SQLite table, partitioned by namespace.
+    Expired entries are dropped on read and on write; once a namespace holds more
+    than `max_entries`, the least recently read entries are evicted. A TTL of
+    None never expires; a TTL of 0 or less turns storing off.
+    """
+
+    def __init__(self, namespace, ttl_seconds=86400, max_entries=1000, path=None):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path = path or cache_path()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL,"
+                " last_access REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_lru ON entries (namespace, last_access)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """Returns the cached value for `key`, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                )
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value, ttl_seconds=None):
+        """Stores a JSON-serializable value. `ttl_seconds` overrides the default TTL."""
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl is not None and ttl <= 0:
+            # Caching is off for this entry; drop any older value so it is not served either
+            self.delete(key)
+            return
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries"
+                " (namespace, key, value, created_at, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), now, expires_at, now),
+            )
+            self._evict(conn, now)
+
+    def delete(self, key):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            )
+
+    def clear(self):
+        """Removes every entry in this namespace."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE namespace = ?", (self.namespace,))
+
+    def _evict(self, conn, now):
+        conn.execute(
+            "DELETE FROM entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+            (self.namespace, now),
+        )
+        (count,) = conn.execute(
+            "SELECT COUNT(*) FROM entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key IN ("
+                " SELECT key FROM entries WHERE namespace = ?"
+                " ORDER BY last_access ASC LIMIT ?)",
+                (self.namespace, self.namespace, overflow),
+            )
+            self.evictions += overflow
+
+    def __len__(self):
+        """Live entries; expired rows awaiting removal are not counted."""
+        with self._connect() as conn:
+            (count,) = conn.execute(
+                "SELECT COUNT(*) FROM entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (self.namespace, time.time()),
+            ).fetchone()
+        return count
+
+    def stats(self):
+        """Returns hit/miss counters for this process plus the current entry count."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self),
+        }
+
+
+# Inputs each task's prompt reads. Changing any other field must not invalidate it.
+STAGE_INPUTS = {
+    "location": ("from_city", "destination_city", "date_from", "date_to"),
+    "guide": ("destination_city", "interests", "date_from", "date_to"),
+    "planner": ("from_city", "destination_city", "interests", "date_from", "date_to"),
+}
+
+# Default lifetime per stage: logistics and prices go stale faster than attractions
+STAGE_TTL_HOURS = {
+    "location": 12,
+    "guide": 72,
+    "planner": 24,
+}
+
+# Bump when a task prompt changes so old outputs are not served for the new prompt
+STAGE_CACHE_VERSION = 4
+
+
+def normalize_input(name, value):
+    """Canonical form of one trip input, so casing, spacing and interest order do not matter."""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    value = " ".join(str(value).split()).lower()
+    if name == "interests":
+        return ", ".join(sorted(part.strip() for part in value.split(",") if part.strip()))
+    return value
+
+
+def stage_key(stage, **inputs):
+    """Cache key of `stage` for the trip inputs; extra inputs the stage does not read are ignored."""
+    payload = {name: normalize_input(name, inputs[name]) for name in STAGE_INPUTS[stage]}
+    payload["stage"] = stage
+    payload["version"] = STAGE_CACHE_VERSION
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8"))
+    return f"{stage}:{digest.hexdigest()}"
+
+
+class StageCache:
+    """
+    Caches the raw markdown output of each crew task.
+    Keys are built from exactly the inputs listed in STAGE_INPUTS, so a rerun with
+    a different interest reuses the destination research, and a different origin
+    reuses the local guide. Expiry is per stage (STAGE_CACHE_TTL_HOURS_<STAGE>).
+    """
+
+    def __init__(self, path=None, max_entries=500):
+        self.store = DiskCache("stages", max_entries=max_entries, path=path)
+
+    def key(self, stage, **inputs):
+        return stage_key(stage, **inputs)
+
+    def ttl_seconds(self, stage):
+        hours = get_float(f"STAGE_CACHE_TTL_HOURS_{stage.upper()}", STAGE_TTL_HOURS[stage])
+        return hours * 3600
+
+    def get(self, stage, **inputs):
+        return self.store.get(self.key(stage, **inputs))
+
+    def set(self, stage, output, **inputs):
+        if output:
+            self.store.set(self.key(stage, **inputs), output, ttl_seconds=self.ttl_seconds(stage))
+
+    def stats(self):
+        return self.store.stats()
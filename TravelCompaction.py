@@ -0,0 +1,151 @@
+"""
+TravelCompaction.py
+-------------------
+Reduces the research reports to compact digests before they reach the planner.
+The full markdown reports (tables, Maps links, prose) are the largest part of the
+planner's prompt and are re-sent on every agent iteration; a digest keeps only
+places, costs, opening hours and areas, under a per-report token budget.
+"""
+
+import logging
+import re
+
+from TravelConfig import get_int, get_setting
+from TravelRateLimiter import CHARS_PER_TOKEN, estimate_tokens
+from TravelRender import MAPS_MARKER
+
+logger = logging.getLogger(__name__)
+
+MAPS_LINK = re.compile(r"\[[^\]]*\]\(https?://www\.google\.com/maps[^)]*\)")
+MARKDOWN_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+BOLD = re.compile(r"\*\*(.+?)\*\*")
+COST = re.compile(
+    r"(?:₹|Rs\.?|INR|USD|EUR|\$|€|£)\s?\d[\d,]*(?:\.\d+)?(?:\s?[-–]\s?(?:₹|Rs\.?|\$|€|£)?\s?\d[\d,]*)?"
+    r"|\d[\d,]*(?:\s?[-–]\s?\d[\d,]*)?\s?(?:INR|rupees|USD|EUR)",
+    re.IGNORECASE,
+)
+HOURS = re.compile(
+    r"\d{1,2}(?::\d{2})?\s?(?:AM|PM)(?:\s?[-–]\s?\d{1,2}(?::\d{2})?\s?(?:AM|PM))?"
+    r"|\b(?:open|closed)\b[^.;|]{0,40}|\b24\s?(?:hours|hrs)\b",
+    re.IGNORECASE,
+)
+AREA = re.compile(r"\b(?:in|at|near|area:|located in)\s+([A-Z][\w'’.-]*(?:\s+[A-Z][\w'’.-]*){0,3})")
+LIST_PREFIX = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s*")
+
+# Longest a single digest line may get, in characters
+MAX_ITEM_CHARS = 160
+
+
+def _clean(line):
+    line = MAPS_MARKER.sub(r"**\1**", line)
+    line = MAPS_LINK.sub("", line)
+    line = MARKDOWN_LINK.sub(r"\1", line)
+    line = LIST_PREFIX.sub("", line)
+    return " ".join(line.replace("`", "").split())
+
+
+def _digest_line(line):
+    """Turns one report line into 'Name · cost · hours · area', or None if it carries no facts."""
+    if re.fullmatch(r"\|?\s*:?-{2,}.*", line):
+        return None
+    if line.startswith("|"):
+        cells = [cell.strip() for cell in line.strip("|").split("|") if cell.strip()]
+        return " · ".join(BOLD.sub(r"\1", cell) for cell in cells)[:MAX_ITEM_CHARS] if cells else None
+
+    name = BOLD.search(line)
+    costs = COST.findall(line)
+    hours = HOURS.findall(line)
+    areas = AREA.findall(line)
+    if not (name or costs or hours):
+        return None
+
+    parts = [name.group(1).strip(" :—-")] if name else [BOLD.sub(r"\1", line)[:80]]
+    parts += [cost.strip() for cost in costs[:2]]
+    parts += [hour.strip() for hour in hours[:1]]
+    parts += [area for area in areas[:1] if not name or area not in parts[0]]
+    return " · ".join(part for part in parts if part)[:MAX_ITEM_CHARS]
+
+
+def parse_digest(report, token_budget):
+    """
+    Deterministic digest: keeps fact-bearing lines grouped under their section
+    headings. When over budget, sections are filled round-robin so every section
+    keeps its most important (earliest) items.
+    """
+    sections = []
+    current = ["Overview", []]
+    for raw_line in report.splitlines():
+        heading = re.match(r"^\s*#{1,6}\s+(.*)", raw_line)
+        if heading:
+            if current[1]:
+                sections.append(current)
+            current = [_clean(heading.group(1)).strip("*"), []]
+            continue
+        line = _clean(raw_line)
+        item = _digest_line(line) if line else None
+        if item and item not in current[1]:
+            current[1].append(item)
+    if current[1]:
+        sections.append(current)
+
+    chosen = [[] for _ in sections]
+    used = sum(estimate_tokens(f"## {title}\n") for title, _ in sections)
+    depth = 0
+    progressed = True
+    while progressed:
+        progressed = False
+        for index, (_, items) in enumerate(sections):
+            if depth < len(items):
+                cost = estimate_tokens(f"- {items[depth]}\n")
+                if used + cost > token_budget:
+                    continue
+                chosen[index].append(items[depth])
+                used += cost
+                progressed = True
+        depth += 1
+
+    return "\n".join(
+        f"## {title}\n" + "\n".join(f"- {item}" for item in items)
+        for (title, _), items in zip(sections, chosen) if items
+    )
+
+
+def llm_digest(report, token_budget, llm):
+    """Asks a (cheaper) model for the digest. Returns None if the call fails."""
+    prompt = (
+        f"Condense this travel research into a terse digest of at most {token_budget} tokens. "
+        "Keep only: place names, costs, opening hours and the area/neighbourhood of each place, "
+        "one '- Name · cost · hours · area' line per place, grouped under short '## Section' headings. "
+        "No prose, no links.\n\n" + report
+    )
+    try:
+        return str(llm.call([{"role": "user", "content": prompt}]))
+    except Exception as exc:
+        logger.warning("LLM compaction failed, falling back to parsing: %s", exc)
+        return None
+
+
+def compact_report(report, token_budget=None, mode=None, llm=None):
+    """
+    Returns (digest, stats). `mode` is "parse" (default, no LLM call), "llm"
+    (the model condenses the raw report) or "both" (parsing pre-filters to twice
+    the budget, so the model only reads facts, then condenses to the budget).
+    """
+    token_budget = token_budget or get_int("COMPACTION_TOKEN_BUDGET", 1200)
+    mode = mode or get_setting("COMPACTION_MODE", "parse")
+    before = estimate_tokens(report)
+
+    digest = None
+    if mode == "llm" and llm is not None:
+        digest = llm_digest(report, token_budget, llm)
+    elif mode == "both" and llm is not None:
+        digest = llm_digest(parse_digest(report, token_budget * 2), token_budget, llm)
+    if digest is None:
+        digest = parse_digest(report, token_budget)
+    if not digest.strip():
+        # Nothing fact-shaped was found; fall back to a plain truncation
+        digest = report[:token_budget * CHARS_PER_TOKEN]
+
+    after = estimate_tokens(digest)
+    logger.info("Compacted report from ~%d to ~%d tokens (%s)", before, after, mode)
+    return digest, {"before": before, "after": after, "mode": mode}
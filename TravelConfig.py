@@ -0,0 +1,49 @@
+"""
+TravelConfig.py
+---------------
+Reads runtime settings from Streamlit secrets, falling back to environment variables.
+Every optional behaviour of the planner is switched through these helpers so the
+same keys work in .streamlit/secrets.toml and in a plain shell environment.
+"""
+
+import os
+
+
+def get_setting(name, default=None):
+    """Returns the raw value of a setting, or `default` when it is unset or empty."""
+    try:
+        import streamlit as st
+        value = st.secrets.get(name)
+    except Exception:
+        value = None
+    if value is None:
+        value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value
+
+
+def get_flag(name, default=False):
+    """Returns a boolean setting. Accepts true/false, yes/no, on/off and 1/0."""
+    value = get_setting(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_int(name, default):
+    """Returns an integer setting, or `default` when it is unset or malformed."""
+    try:
+        return int(get_setting(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_float(name, default):
+    """Returns a float setting, or `default` when it is unset or malformed."""
+    try:
+        return float(get_setting(name, default))
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,526 @@
+"""
+TravelCrew.py
+-------------
+Defines the TravelCrew class, which wires TravelAgents and TravelTasks into a crew
+for one trip request and records per-stage timings, cache use and LLM stats.
+Completed tasks are checkpointed as run artifacts; when a recent run for the same
+inputs failed, a new run resumes from its first incomplete task.
+"""
+
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from TravelStartup import prepare_crewai
+
+prepare_crewai()
+
+from crewai import Crew, Process
+
+from TravelAgents import get_agent_pool
+from TravelArtifacts import DONE, FAILED, get_artifact_store
+from TravelBudgets import BUDGET_LABELS, DEADLINE, BudgetLedger
+from TravelTasks import TravelTasks
+from TravelCache import StageCache
+from TravelCompaction import compact_report
+from TravelConfig import get_flag, get_float, get_int, get_setting
+from TravelGeo import geo_planning_default, plan_days
+from TravelKnowledge import get_knowledge_base, travel_month
+from TravelItinerary import (
+    assemble_plan, candidate_places, merge_day_batches, partition_days, trip_days,
+)
+from TravelRender import expand_maps_links
+from TravelTracing import Tracer
+
+logger = logging.getLogger(__name__)
+
+# Shared across sessions: research for a destination is reused by every visitor
+stage_cache = StageCache()
+
+REPORT_TITLES = {
+    "location": "Destination Research Report",
+    "guide": "Local Guide",
+}
+
+STAGE_LABELS = {
+    "location": "Destination research",
+    "guide": "Local guide curation",
+    "planner": "Itinerary planning",
+}
+
+
+class TravelCrew:
+    """
+    Runs the three-stage planning crew for one trip request.
+    Never touches the Streamlit UI, so it can run on a worker thread or process;
+    progress is reported through an optional ProgressChannel.
+    """
+
+    def __init__(self, from_city, destination_city, interests, date_from, date_to,
+                 parallel_research=None, use_stage_cache=None, session_id="default",
+                 progress=None, compact_context=None, chunked_planning=None, geo_planning=None):
+        self.destination_city = destination_city
+        self.from_city = from_city
+        self.interests = interests
+        self.date_from = date_from
+        self.date_to = date_to
+        if parallel_research is None:
+            parallel_research = get_flag("PARALLEL_RESEARCH", True)
+        if use_stage_cache is None:
+            use_stage_cache = get_flag("STAGE_CACHE", True)
+        if compact_context is None:
+            compact_context = get_flag("COMPACTION", False)
+        if chunked_planning is None:
+            chunked_planning = get_flag("CHUNKED_PLANNING", True)
+        if geo_planning is None:
+            geo_planning = get_flag("GEO_PLANNING", geo_planning_default())
+        self.parallel_research = parallel_research
+        self.use_stage_cache = use_stage_cache
+        self.compact_context = compact_context
+        self.chunked_planning = chunked_planning
+        self.geo_planning = geo_planning
+        self.geo_stats = {}
+        self.compaction_stats = {}
+        self.batch_stats = {}
+        self.budget_hits = []
+        self.prompt_stats = {}
+        self._compaction_seconds = 0.0
+        self.session_id = session_id
+        self.progress = progress
+        self.llm_stats = {"calls": 0, "wait_seconds": 0.0, "fallbacks": 0, "models": {}}
+        self.cached_stages = []
+        self.resumed_stages = []
+        self.resumed_from = None
+        self.timings = {}
+        self.stage_outputs = {}
+        self.run_id = None
+        self._checkpoint = {}
+        self.tracer = Tracer()
+        self._finished_at = {}
+
+    @property
+    def inputs(self):
+        return {
+            "from_city": self.from_city,
+            "destination_city": self.destination_city,
+            "interests": self.interests,
+            "date_from": self.date_from,
+            "date_to": self.date_to,
+        }
+
+    @property
+    def trip(self):
+        """Tags for the run's searches and reports in the knowledge base."""
+        return {"destination": self.destination_city, "travel_month": travel_month(self.date_from)}
+
+    def _stage_done(self, stage):
+        # Task callbacks fire from the worker thread for async tasks. Outputs are
+        # cached as soon as each stage finishes, not only when the whole crew does.
+        def callback(output):
+            self._finished_at[stage] = time.perf_counter()
+            if self.use_stage_cache:
+                stage_cache.set(stage, output.raw, **self.inputs)
+            self._remember(stage, output.raw)
+            self._record_output(stage, output.raw)
+            self._publish("task_done", f"✅ {STAGE_LABELS[stage]} complete")
+        return callback
+
+    def _remember(self, stage, output):
+        # Fresh research is added to the knowledge base for later searches
+        knowledge = get_knowledge_base()
+        if knowledge is None:
+            return
+        try:
+            knowledge.add_report(stage, output, self.destination_city, self.trip["travel_month"])
+        except Exception as exc:
+            logger.warning("Could not add the %s report to the knowledge base: %s", stage, exc)
+
+    def _publish(self, kind, text):
+        if self.progress is not None:
+            self.progress.publish(kind, "", text)
+
+    def _record_output(self, stage, output):
+        # Outputs are kept raw (with [[Place]] markers); links are expanded on render
+        self.stage_outputs[stage] = output
+        if self.progress is not None:
+            self.progress.record_output(stage, output)
+        self._save_artifact(f"{stage}.md", output)
+
+    def _save_artifact(self, name, text):
+        # Artifacts are a record of the run; failing to store one must not fail the run
+        try:
+            get_artifact_store().save(self.run_id, name, text)
+        except OSError as exc:
+            logger.warning("Could not store artifact %s of run %s: %s", name, self.run_id, exc)
+
+    def _load_checkpoint(self):
+        """Task outputs of the newest recent failed run with the same inputs, by artifact name."""
+        if not get_flag("RESUME_FAILED_RUNS", True):
+            return {}
+        artifacts = get_artifact_store()
+        try:
+            failed = artifacts.find_failed(self.inputs, get_float("RESUME_MAX_AGE_HOURS", 6) * 3600)
+        except Exception as exc:
+            logger.warning("Could not look up failed runs to resume: %s", exc)
+            return {}
+        if failed is None:
+            return {}
+        checkpoint = {}
+        for name in failed["artifacts"]:
+            # The final plan is only written on success; a partial one is never reused
+            if name.endswith(".md") and name != "planner.md":
+                text = artifacts.load(failed["run_id"], name)
+                if text:
+                    checkpoint[name] = text
+        if checkpoint:
+            self.resumed_from = failed["run_id"]
+        return checkpoint
+
+    def _budget_hit(self, budget, name):
+        # Called from the agent's thread the moment it runs out of `name`
+        limit = budget.limit(name)
+        limit_text = f"{limit:.0f}s" if name == DEADLINE else str(limit)
+        self._publish("budget", f"⏳ {budget.agent} reached its {BUDGET_LABELS[name]} "
+                      f"({limit_text}); finishing with what it has")
+
+    def _record_timings(self, started_at, research_started, finished_at, fresh_stages, parallel):
+        # Research stages start together when parallel, back-to-back otherwise. They
+        # are timed from the research kickoff, so cache lookups and agent setup
+        # before it do not count as research (or as time saved by running it in parallel).
+        durations = {"location": 0.0, "guide": 0.0}
+        previous_end = research_started
+        for stage in fresh_stages:
+            stage_end = self._finished_at.get(stage, finished_at)
+            durations[stage] = stage_end - (research_started if parallel else previous_end)
+            previous_end = stage_end
+        research_end = max([self._finished_at.get(s, finished_at) for s in fresh_stages] or [research_started])
+        research_wall = research_end - research_started
+        self.timings = {
+            **durations,
+            "planner": finished_at - research_end,
+            "total": finished_at - started_at,
+            # Wall-clock the research leg would have taken run back-to-back
+            "saved": max(0.0, sum(durations.values()) - research_wall),
+        }
+
+    def run(self):
+        self.run_id = uuid.uuid4().hex
+        self.tracer = Tracer(self.run_id)
+        artifacts = get_artifact_store()
+        self.resumed_from = None
+        self._checkpoint = self._load_checkpoint()
+        artifacts.begin(self.run_id, self.inputs)
+        status = FAILED
+        try:
+            with self.tracer.span("Trip plan", "run", destination=self.destination_city):
+                result = self._run()
+            status = DONE
+            return result
+        finally:
+            self.tracer.export()
+            self._save_artifact("trace.json", json.dumps(self.tracer.to_dict(), default=str))
+            artifacts.finish(self.run_id, status, timings=self.timings, cached_stages=self.cached_stages,
+                             resumed_stages=self.resumed_stages, resumed_from=self.resumed_from,
+                             budget_hits=self.budget_hits, prompt_stats=self.prompt_stats)
+
+    def prefetch_research(self, cancelled=None):
+        """
+        Runs destination research on its own and stores it in the stage cache, so a
+        full run for the same origin, destination and dates skips that stage. Its
+        key ignores interests, so the form does not need to be complete. Setting
+        `cancelled` makes the agent wrap up at once and nothing is stored.
+        Returns True when fresh research was stored.
+        """
+        if stage_cache.get("location", **self.inputs) is not None:
+            return False
+        budgets = BudgetLedger(cancelled=cancelled)
+        with get_agent_pool().checkout(self.session_id, self.progress, self.tracer, budgets,
+                                        trip=self.trip) as agents:
+            task = TravelTasks().location_task(
+                agents.location_expert, self.from_city, self.destination_city,
+                self.date_from, self.date_to,
+            )
+            output = self._kickoff_crew("Prefetch crew", [task], agents)
+            self.llm_stats = agents.llm_stats()
+        if cancelled is not None and cancelled.is_set():
+            return False
+        stage_cache.set("location", str(output), **self.inputs)
+        self._remember("location", str(output))
+        self._publish("task_done", f"✅ {STAGE_LABELS['location']} prefetched")
+        return True
+
+    def _run(self):
+        started_at = time.perf_counter()
+        self._research_started = None
+        self._finished_at = {}
+        self.stage_outputs = {}
+        self.cached_stages = []
+        self.resumed_stages = []
+        self.compaction_stats = {}
+        self.batch_stats = {}
+        self.geo_stats = {}
+        self.budget_hits = []
+        self.prompt_stats = {}
+        self._compaction_seconds = 0.0
+
+        upstream = {}
+        if self.use_stage_cache:
+            cached_plan = stage_cache.get("planner", **self.inputs)
+            if cached_plan is not None:
+                self.cached_stages = ["location", "guide", "planner"]
+                self._record_output("planner", cached_plan)
+                self._record_timings(started_at, started_at, time.perf_counter(), [], False)
+                self._publish("task_done", "♻️ Reused a recent plan for these inputs")
+                return expand_maps_links(cached_plan, self.destination_city)
+            for stage in REPORT_TITLES:
+                cached = stage_cache.get(stage, **self.inputs)
+                if cached is not None:
+                    upstream[REPORT_TITLES[stage]] = cached
+                    self._record_output(stage, cached)
+                    self.cached_stages.append(stage)
+        for stage in REPORT_TITLES:
+            checkpointed = self._checkpoint.get(f"{stage}.md")
+            if stage not in self.cached_stages and checkpointed is not None:
+                upstream[REPORT_TITLES[stage]] = checkpointed
+                self._record_output(stage, checkpointed)
+                self.resumed_stages.append(stage)
+        if self.resumed_from is not None:
+            self._publish("task_done", "⏯️ Resuming the last failed run for these inputs")
+
+        budgets = BudgetLedger(on_hit=self._budget_hit)
+        tasks = TravelTasks()
+        with get_agent_pool().checkout(self.session_id, self.progress, self.tracer, budgets,
+                                        trip=self.trip) as agents:
+            try:
+                result, fresh_stages, parallel = self._kickoff(agents, tasks, upstream)
+            finally:
+                self.llm_stats = agents.llm_stats()
+                self.budget_hits = budgets.hits()
+                self.prompt_stats = tasks.prompt_stats.to_dict()
+            setup = {"setup": agents.setup_seconds, "setup_saved": agents.setup_saved}
+
+        finished_at = time.perf_counter()
+        research_started = self._research_started if self._research_started is not None else started_at
+        self._record_timings(started_at, research_started, finished_at, fresh_stages, parallel)
+        self.timings.update(setup)
+        self.timings["compaction"] = self._compaction_seconds
+        self.timings["planner"] -= self._compaction_seconds
+        self._trace_stages(finished_at, fresh_stages)
+        result_str = str(result) if not isinstance(result, str) else result
+        self._record_output("planner", result_str)
+        if self.use_stage_cache:
+            stage_cache.set("planner", result_str, **self.inputs)
+        return expand_maps_links(result_str, self.destination_city)
+
+    def _kickoff(self, agents, tasks, upstream):
+        fresh_stages = [stage for stage in REPORT_TITLES
+                        if stage not in self.cached_stages and stage not in self.resumed_stages]
+        # Only worth running concurrently when both research stages are missing
+        parallel = self.parallel_research and len(fresh_stages) > 1
+
+        self._publish("task_started", "🚀 Running: " + ", ".join(
+            STAGE_LABELS[stage] for stage in fresh_stages + ["planner"]
+        ))
+
+        chunked = self._use_chunked_planning()
+        day_places = None
+        if self.compact_context or chunked or self.geo_planning:
+            # Research finishes before planning starts, so its outputs can be
+            # compacted (and mined for places to group by area) first
+            self._run_research(agents, tasks, fresh_stages, parallel)
+            if self.geo_planning:
+                day_places = self._plan_days()
+            # Every day-batch reads the research, so batches always get digests
+            planner_context = []
+            if self.compact_context or chunked:
+                reports = self._compact_reports(agents)
+            else:
+                reports = {title: self.stage_outputs[stage] for stage, title in REPORT_TITLES.items()}
+            if chunked:
+                return self._plan_in_batches(agents, tasks, reports, day_places), fresh_stages, parallel
+        else:
+            research_tasks = self._research_tasks(agents, tasks, fresh_stages, async_execution=parallel)
+            planner_context, reports = research_tasks, upstream
+            # Research starts with the planning crew below
+            self._research_started = time.perf_counter()
+
+        planner_task = tasks.planner_task(
+            planner_context, agents.planner_expert,
+            self.destination_city, self.interests,
+            self.date_from, self.date_to,
+            reports=reports, day_places=day_places,
+        )
+        planner_tasks = planner_context + [planner_task]
+        return self._kickoff_crew("Planning crew", planner_tasks, agents), fresh_stages, parallel
+
+    def _use_chunked_planning(self):
+        days = len(trip_days(self.date_from, self.date_to))
+        return self.chunked_planning and days >= get_int("CHUNKED_PLANNING_MIN_DAYS", 10)
+
+    def _candidate_places(self):
+        return candidate_places([self.stage_outputs.get("guide"), self.stage_outputs.get("location")])
+
+    def _plan_days(self):
+        """Fixed places per day grouped by area (TravelGeo), or None when too few places can be located."""
+        places = self._candidate_places()
+        dates = trip_days(self.date_from, self.date_to)
+        with self.tracer.span("Group places by area", "geo", places=len(places)) as span:
+            try:
+                plan = plan_days(places, len(dates), self.destination_city)
+            except Exception as exc:
+                # Grouping is an optimization; the planner can still place everything itself
+                logger.warning("Could not group places by area: %s", exc)
+                plan = None
+            span.attrs["located"] = plan.located if plan is not None else 0
+        if plan is None:
+            return None
+        self.geo_stats = plan.stats()
+        self._publish("task_done", f"📍 Grouped {self.geo_stats['located']} places into "
+                      f"{self.geo_stats['days']} days by area (~{self.geo_stats['route_km']:.0f} km between stops)")
+        return plan.days
+
+    def _plan_in_batches(self, agents, tasks, reports, day_places=None):
+        """
+        Plans a long trip as concurrent day-batches plus a frame (introduction and
+        budget), each in its own single-task crew, and merges them in day order.
+        Wall time grows with PLAN_BATCH_DAYS rather than with the trip length;
+        every call still goes through the shared rate limiter.
+        """
+        dates = trip_days(self.date_from, self.date_to)
+        places = self._candidate_places()
+        batches = partition_days(dates, places, get_int("PLAN_BATCH_DAYS", 3), day_places)
+        self._publish("task_started", f"🧩 Planning {len(dates)} days in {len(batches)} batches: "
+                      + ", ".join(batch.label for batch in batches))
+
+        planners = agents.batch_planners(len(batches) + 1)
+        # The frame is queued first so it never waits behind the batches
+        crew_tasks = [tasks.plan_frame_task(
+            planners[0], self.destination_city, self.interests,
+            self.date_from, self.date_to, reports=reports,
+        )]
+        for batch, planner in zip(batches, planners[1:]):
+            reserved = [place for other in batches if other is not batch for place in other.allotted]
+            crew_tasks.append(tasks.day_batch_task(
+                planner, self.destination_city, self.interests, batch, len(dates), reserved,
+                reports=reports, callback=self._batch_done(batch),
+            ))
+
+        labels = ["Introduction and budget"] + [batch.label for batch in batches]
+        names = ["plan-frame.md"] + [f"plan-days-{batch.first_day}-{batch.last_day}.md" for batch in batches]
+        resumed = [name for name in names if name in self._checkpoint]
+        if resumed:
+            self._publish("task_done", f"⏯️ Reusing {len(resumed)} of {len(names)} planned parts")
+        workers = max(1, min(get_int("PLAN_BATCH_CONCURRENCY", 4), len(crew_tasks)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plan-batch") as executor:
+            outputs = list(executor.map(
+                lambda label, task, name: self._plan_part(label, task, name, agents), labels, crew_tasks, names
+            ))
+
+        days_markdown, dropped = merge_day_batches(outputs[1:])
+        self.batch_stats = {
+            "days": len(dates),
+            "batches": len(batches),
+            "places": len(places),
+            "dropped": len(dropped),
+        }
+        if dropped:
+            self._publish("task_done", f"🧹 Removed {len(dropped)} repeated places: " + ", ".join(dropped))
+        return assemble_plan(outputs[0], days_markdown, self.destination_city)
+
+    def _plan_part(self, label, task, name, agents):
+        # Each part is checkpointed on its own, so a failed batch only reruns itself
+        output = self._checkpoint.get(name)
+        if output is None:
+            output = str(self._kickoff_crew(label, [task], agents))
+        self._save_artifact(name, output)
+        return output
+
+    def _batch_done(self, batch):
+        def callback(output):
+            self._publish("task_done", f"✅ {batch.label} planned")
+        return callback
+
+    def _kickoff_crew(self, label, crew_tasks, agents):
+        with self.tracer.span(label, "crew", tasks=len(crew_tasks)):
+            return self._crew([task.agent for task in crew_tasks], crew_tasks, agents).kickoff()
+
+    def _trace_stages(self, finished_at, fresh_stages):
+        # Task spans are derived from the same completion times as self.timings
+        for stage in fresh_stages:
+            end = self._finished_at.get(stage, finished_at)
+            self.tracer.add(STAGE_LABELS[stage], "task", end - self.timings[stage], end, stage=stage)
+        self.tracer.add(STAGE_LABELS["planner"], "task", finished_at - self.timings["planner"],
+                        finished_at, stage="planner")
+
+    def _crew(self, crew_agents, crew_tasks, agents):
+        # Request and token pacing is done by the shared limiter behind agents.llm,
+        # which covers concurrent research tasks and concurrent sessions alike.
+        unique_agents = []
+        for agent in crew_agents:
+            if agent not in unique_agents:
+                unique_agents.append(agent)
+        return Crew(
+            agents=unique_agents,
+            tasks=crew_tasks,
+            process=Process.sequential,
+            share_crew=False,
+            verbose=agents.verbose,
+        )
+
+    def _research_tasks(self, agents, tasks, fresh_stages, async_execution):
+        # Returned in fresh_stages order
+        research_tasks = []
+        if "location" in fresh_stages:
+            research_tasks.append(tasks.location_task(
+                agents.location_expert, self.from_city, self.destination_city,
+                self.date_from, self.date_to,
+                async_execution=async_execution,
+                callback=self._stage_done("location"),
+            ))
+        if "guide" in fresh_stages:
+            research_tasks.append(tasks.guide_task(
+                agents.guide_expert, self.destination_city, self.interests,
+                self.date_from, self.date_to,
+                async_execution=async_execution,
+                callback=self._stage_done("guide"),
+            ))
+        return research_tasks
+
+    def _run_research(self, agents, tasks, fresh_stages, parallel):
+        """
+        Runs the research stages to completion ahead of planning. In parallel, each
+        stage gets its own single-task crew on a thread pool: within one crew, a
+        sync task waits for every pending async task before it starts, so
+        location (async) and guide (sync) would still run back-to-back.
+        """
+        research_tasks = self._research_tasks(agents, tasks, fresh_stages, async_execution=False)
+        self._research_started = time.perf_counter()
+        if not research_tasks:
+            return
+        if not parallel:
+            self._kickoff_crew("Research crew", research_tasks, agents)
+            return
+        labels = [STAGE_LABELS[stage] for stage in fresh_stages]
+        with ThreadPoolExecutor(max_workers=len(research_tasks), thread_name_prefix="research") as executor:
+            list(executor.map(lambda label, task: self._kickoff_crew(label, [task], agents),
+                              labels, research_tasks))
+
+    def _compact_reports(self, agents):
+        started = time.perf_counter()
+        llm = None
+        if get_setting("COMPACTION_MODE", "parse") != "parse":
+            llm = agents.compaction_llm()
+        reports = {}
+        for stage, title in REPORT_TITLES.items():
+            with self.tracer.span(f"Compact {STAGE_LABELS[stage].lower()}", "compaction"):
+                digest, stats = compact_report(self.stage_outputs[stage], llm=llm)
+            reports[title] = digest
+            self.compaction_stats[stage] = stats
+            self._publish(
+                "compaction",
+                f"🗜️ {STAGE_LABELS[stage]}: ~{stats['before']} → ~{stats['after']} tokens",
+            )
+        self._compaction_seconds = time.perf_counter() - started
+        return reports
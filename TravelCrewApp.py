@@ -5,66 +5,35 @@ Main Streamlit application entry point.
 Handles the UI, user input, and orchestration of the CrewAI agents.
 """
 
-import sys
-import os
-
-# 1. DOTENV FIXES
-# Fix dotenv encoding issue before importing crewai
-try:
-    import dotenv.parser
-    import io
-    original_reader_init = dotenv.parser.Reader.__init__
-    def safe_reader_init(self, stream):
-        try:
-            if hasattr(stream, 'read'):
-                try:
-                    content = stream.read()
-                    if isinstance(content, bytes):
-                        try:
-                            content = content.decode('utf-8')
-                        except UnicodeDecodeError:
-                            content = ""
-                    safe_stream = io.StringIO(content)
-                    original_reader_init(self, safe_stream)
-                except Exception:
-                    self.string = ""
-                    self.position = dotenv.parser.Position.start()
-                    self.mark = dotenv.parser.Position.start()
-            else:
-                original_reader_init(self, stream)
-        except Exception:
-            self.string = ""
-            self.position = dotenv.parser.Position.start()
-            self.mark = dotenv.parser.Position.start()
-    dotenv.parser.Reader.__init__ = safe_reader_init
-except Exception:
-    pass
-
-try:
-    import dotenv.main
-    original_load = dotenv.main.load_dotenv
-    def safe_load_dotenv(*args, **kwargs):
-        try:
-            return original_load(*args, **kwargs)
-        except Exception:
-            return False
-    dotenv.main.load_dotenv = safe_load_dotenv
-except Exception:
-    pass
-
-# 2. IMPORTS & CONFIG
-import streamlit as st
+import time
+
+_rerun_started = time.perf_counter()
+
+# 1. IMPORTS & CONFIG
+# Only light modules are imported here. crewai and the API keys are
+# loaded by the background worker when a plan is generated (see TravelStartup.py),
+# because Streamlit re-executes this script on every widget interaction.
+from TravelStartup import profile
+
+with profile.timed("import streamlit"):
+    import streamlit as st
+import json
+import uuid
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings("ignore", message=".*signal.*")
 
-try:
-    from crewai import Crew, Process
-except UnicodeDecodeError:
-    from crewai import Crew, Process
+with profile.timed("import app modules"):
+    from TravelArtifacts import get_artifact_store
+    from TravelBudgets import BUDGET_LABELS, DEADLINE
+    from TravelConfig import get_flag, get_float
+    from TravelJobs import CANCELLED, DONE, FAILED, QUEUED, JobRejected, get_job_manager
+    from TravelProgress import render_progress
+    from TravelRateLimiter import limiter_stats
+    from TravelRender import expand_maps_links, split_plan
+    from TravelTracing import start_metrics_server
 
-from TravelAgents import TravelAgents, StreamToExpander
-from TravelTasks import TravelTasks
+_imports_done = time.perf_counter()
 
 # Page config
 st.set_page_config(
@@ -179,54 +148,6 @@ hr { border-color: #2A2D3E !important; }
 """, unsafe_allow_html=True)
 
 
-# TravelCrew class
-class TravelCrew:
-
-    def __init__(self, from_city, destination_city, interests, date_from, date_to):
-        self.destination_city = destination_city
-        self.from_city = from_city
-        self.interests = interests
-        self.date_from = date_from
-        self.date_to = date_to
-        self.output_placeholder = st.empty()
-
-    def run(self):
-        agents = TravelAgents()
-        tasks = TravelTasks()
-
-        location_expert = agents.location_expert()
-        guide_expert = agents.guide_expert()
-        planner_expert = agents.planner_expert()
-
-        location_task = tasks.location_task(
-            location_expert, self.from_city, self.destination_city,
-            self.date_from, self.date_to
-        )
-        guide_task = tasks.guide_task(
-            guide_expert, self.destination_city, self.interests,
-            self.date_from, self.date_to
-        )
-        planner_task = tasks.planner_task(
-            [location_task, guide_task], planner_expert,
-            self.destination_city, self.interests,
-            self.date_from, self.date_to,
-        )
-
-        crew = Crew(
-            agents=[location_expert, guide_expert, planner_expert],
-            tasks=[location_task, guide_task, planner_task],
-            process=Process.sequential,
-            share_crew=False,
-            verbose=True,
-            max_rpm=3,
-        )
-
-        result = crew.kickoff()
-        result_str = str(result) if not isinstance(result, str) else result
-        self.output_placeholder.markdown(result_str)
-        return result_str
-
-
 # Hero Section
 st.markdown("""
 <div class="hero">
@@ -235,6 +156,19 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Identifies this browser session to the shared rate limiter and job queue
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+job_manager = get_job_manager()
+# Prometheus endpoint on METRICS_PORT; a no-op when unset or already running
+start_metrics_server()
+
+REPORT_LABELS = {
+    "location": "📋 Destination research",
+    "guide": "🧭 Local guide",
+}
+
 # Input Fields
 today = datetime.now()
 seven_days = today + timedelta(days=7)
@@ -280,6 +214,33 @@ with st.container():
     with col4:
         date_to = st.date_input("🗓️ Return", seven_days, format="DD/MM/YYYY")
 
+    with st.expander("⚙️ Advanced"):
+        parallel_research = st.toggle(
+            "⚡ Research destination and local guide in parallel",
+            value=get_flag("PARALLEL_RESEARCH", True),
+            help="Runs the two research agents at the same time. Both still share the same request-rate budget.",
+        )
+        use_stage_cache = st.toggle(
+            "♻️ Reuse recent research for unchanged inputs",
+            value=get_flag("STAGE_CACHE", True),
+            help="Skips any stage whose inputs match a recent run and feeds its saved output to the planner.",
+        )
+        compact_context = st.toggle(
+            "🗜️ Compact research before planning",
+            value=get_flag("COMPACTION", False),
+            help="Hands the planner a short digest of places, costs, hours and areas instead of the full reports, to save prompt tokens.",
+        )
+        chunked_planning = st.toggle(
+            "🧩 Plan long trips in parallel day-batches",
+            value=get_flag("CHUNKED_PLANNING", True),
+            help="For trips of 10+ days, writes a few days per call concurrently and guarantees no place is repeated across days.",
+        )
+        prefetch_research = st.toggle(
+            "🔮 Start destination research while I fill in the form",
+            value=get_flag("PREFETCH", False),
+            help="Once origin, destination and dates stop changing, researches the destination in the background so the plan only waits for the guide and itinerary. Needs research reuse.",
+        )
+
 # Trip summary and Generate logic
 all_filled = from_city and destination_city and interests and date_from and date_to
 
@@ -294,29 +255,365 @@ if all_filled:
     </div>
     """, unsafe_allow_html=True)
 
-    if st.button("Generate My Travel Plan ✨"):
+    generate_clicked = st.button("Generate My Travel Plan ✨")
+    if generate_clicked:
         try:
-            with st.status("🤖 Agents at work…", state="running", expanded=True) as status:
-                with st.container(height=500, border=False):
-                    sys.stdout = StreamToExpander(st)
-                    travel_crew = TravelCrew(
-                        from_city, destination_city, interests, date_from, date_to
-                    )
-                    result = travel_crew.run()
-                status.update(label="✅ Your plan is ready!", state="complete", expanded=False)
-
-            st.markdown("---")
-            st.markdown("### 🗺️ Your Itinerary")
-            st.markdown(result)
-
-        except Exception as e:
-            sys.stdout = sys.__stdout__
-            error_msg = str(e)
-            if "rate_limit" in error_msg.lower() or "ratelimit" in error_msg.lower():
-                st.warning(
-                    "⏳ **Rate limit hit** (after auto-retries).\n\n"
-                    "Groq's free tier allows 6,000 tokens/min. "
-                    "Wait a minute and try again, or [upgrade here](https://console.groq.com/settings/billing)."
-                )
-            else:
-                st.error(f"❌ Something went wrong: {error_msg}")
+            job_id = job_manager.submit(
+                {
+                    "from_city": from_city,
+                    "destination_city": destination_city,
+                    "interests": interests,
+                    "date_from": date_from,
+                    "date_to": date_to,
+                    "parallel_research": parallel_research,
+                    "use_stage_cache": use_stage_cache,
+                    "compact_context": compact_context,
+                    "chunked_planning": chunked_planning,
+                },
+                st.session_state.session_id,
+            )
+            st.session_state.job_id = job_id
+            st.session_state.progress_cursor = 0
+            st.query_params["job"] = job_id
+        except JobRejected as e:
+            st.warning(f"🚦 {e}")
+
+
+def update_prefetch():
+    """
+    Starts destination research once origin, destination and dates are valid and
+    have stayed the same for PREFETCH_DEBOUNCE_SECONDS across reruns; cancels it
+    as soon as they change or become incomplete.
+    """
+    session_id = st.session_state.session_id
+    valid = from_city.strip() and destination_city.strip() and date_from and date_to and date_to >= date_from
+    if not (prefetch_research and use_stage_cache and valid):
+        if st.session_state.pop("prefetch_inputs", None) is not None:
+            job_manager.cancel_prefetch(session_id)
+        return
+
+    inputs = (from_city.strip(), destination_city.strip(), date_from, date_to)
+    now = time.time()
+    seen = st.session_state.get("prefetch_inputs")
+    if seen is None or seen[0] != inputs:
+        if seen is not None:
+            job_manager.cancel_prefetch(session_id)
+        st.session_state.prefetch_inputs = (inputs, now)
+        st.session_state.pop("prefetch_job", None)
+        return
+    if "prefetch_job" in st.session_state or now - seen[1] < get_float("PREFETCH_DEBOUNCE_SECONDS", 2.0):
+        return
+    job_id = job_manager.prefetch(
+        {"from_city": inputs[0], "destination_city": inputs[1], "date_from": date_from, "date_to": date_to},
+        session_id,
+    )
+    if job_id:
+        st.session_state.prefetch_job = job_id
+
+
+if not (all_filled and generate_clicked):
+    update_prefetch()
+prefetch_job = job_manager.get(st.session_state.get("prefetch_job", ""))
+if prefetch_job is not None and prefetch_job.status != CANCELLED:
+    if prefetch_job.active:
+        st.caption(f"🔮 Researching {prefetch_job.params['destination_city']} in the background…")
+    elif prefetch_job.report.get("prefetched"):
+        st.caption(f"🔮 Destination research for {prefetch_job.params['destination_city']} is ready")
+
+
+@st.fragment(run_every=get_float("PROGRESS_REFRESH_SECONDS", 1.0))
+def show_job_progress(job_id):
+    job = job_manager.get(job_id)
+    if job is None or not job.active:
+        # Finished: rerun the whole script so the result renders outside the fragment
+        st.rerun()
+
+    if job.status == QUEUED:
+        stats = job_manager.stats()
+        label = f"⏳ Waiting for a free planner… ({stats['queued']} in queue)"
+    else:
+        label = "🤖 Agents at work…"
+    with st.status(label, state="running", expanded=True):
+        with st.container(height=500, border=False):
+            st.session_state.progress_cursor = render_progress(
+                job.progress, st.empty(), st.session_state.get("progress_cursor", 0)
+            )
+    for stage, output in job.stage_outputs.items():
+        if stage in REPORT_LABELS:
+            with st.expander(f"{REPORT_LABELS[stage]} (ready)"):
+                st.markdown(expand_maps_links(output, job.params["destination_city"]))
+
+
+def show_job_result(job):
+    if job.status != DONE:
+        error_msg = job.error or "The plan was cancelled."
+        if "rate_limit" in error_msg.lower() or "ratelimit" in error_msg.lower():
+            st.warning(
+                "⏳ **Rate limit hit** (after auto-retries).\n\n"
+                "Groq's free tier allows 6,000 tokens/min. "
+                "Wait a minute and try again, or [upgrade here](https://console.groq.com/settings/billing)."
+            )
+        else:
+            st.error(f"❌ Something went wrong: {error_msg}")
+        if job.status == FAILED and get_flag("RESUME_FAILED_RUNS", True):
+            st.info("Finished research is saved: generating the plan again resumes where this run stopped.")
+        return
+
+    report = job.report
+    timings = report["timings"]
+    if report["cached_stages"]:
+        st.caption("♻️ Reused cached output for: " + ", ".join(report["cached_stages"]))
+    if report.get("resumed_stages"):
+        st.caption("⏯️ Resumed from the last failed run: "
+                   + ", ".join(REPORT_LABELS[stage] for stage in report["resumed_stages"]))
+    if report["parallel_research"]:
+        st.caption(
+            f"⚡ Parallel research saved ~{timings['saved']:.0f}s "
+            f"(total {timings['total']:.0f}s)"
+        )
+    else:
+        st.caption(f"⏱️ Completed in {timings['total']:.0f}s")
+    for stage, stats in report["compaction"].items():
+        st.caption(
+            f"🗜️ {REPORT_LABELS[stage]} compacted from ~{stats['before']:,} "
+            f"to ~{stats['after']:,} tokens"
+        )
+    batches = report["plan_batches"]
+    if batches:
+        st.caption(
+            f"🧩 Planned {batches['days']} days in {batches['batches']} parallel batches "
+            f"· {batches['dropped']} repeated places removed"
+        )
+    geo = report.get("geo")
+    if geo:
+        st.caption(
+            f"📍 Grouped {geo['located']} of {geo['places']} places into {geo['days']} days by area "
+            f"· ~{geo['route_km']:.0f} km between stops"
+        )
+    for hit in report.get("budget_hits", []):
+        limit = f"{hit['limit']:.0f}s" if hit["budget"] == DEADLINE else hit["limit"]
+        agents = f" ({hit['count']} agents)" if hit["count"] > 1 else ""
+        st.caption(
+            f"⏳ {hit['agent']}{agents} reached its {BUDGET_LABELS[hit['budget']]} "
+            f"of {limit} and finished early"
+        )
+    if timings.get("setup_saved"):
+        st.caption(f"🧩 Reused warm agents · saved ~{timings['setup_saved'] * 1000:.0f}ms of setup")
+    cache_stats = report["search_cache"]
+    st.caption(
+        f"🔎 Search cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses "
+        f"· {cache_stats['entries']} stored"
+    )
+    knowledge = cache_stats.get("knowledge")
+    if knowledge and knowledge["hits"] + knowledge["misses"]:
+        st.caption(
+            f"📚 Past research answered {knowledge['hits']} of {knowledge['hits'] + knowledge['misses']} "
+            f"searches · {knowledge['passages']:,} passages stored"
+        )
+    refine = cache_stats.get("refine")
+    if refine and refine["calls"]:
+        st.caption(
+            f"✂️ Search results trimmed by ~{refine['saved_per_call']:.0f} tokens per call "
+            f"({refine['saved_share']:.0%} of what the searches returned)"
+        )
+    server_stats = limiter_stats()
+    llm_stats = report["llm_stats"]
+    st.caption(
+        f"🚦 {llm_stats['calls']} LLM calls · waited "
+        f"{llm_stats['wait_seconds']:.0f}s for rate budget "
+        f"· {server_stats['queue_depth']} calls queued server-wide "
+        f"(avg wait {server_stats['avg_wait']:.1f}s)"
+    )
+    for model, stats in llm_stats.get("models", {}).items():
+        limited = f" · {stats['rate_limited']} rate-limited" if stats["rate_limited"] else ""
+        if stats.get("retries"):
+            limited += f" · {stats['retries']} retried"
+        st.caption(
+            f"🧠 {model.split('/')[-1]}: {stats['calls']} calls · {stats['avg_latency']:.1f}s avg "
+            f"· {stats['prompt_tokens'] + stats['completion_tokens']:,} tokens{limited}"
+        )
+    prompts = report.get("prompt_stats")
+    if prompts and prompts["static_tokens"]:
+        st.caption(
+            f"🧾 Task prompts: ~{prompts['static_tokens']:,} static prefix tokens (cacheable) "
+            f"· ~{prompts['variable_tokens']:,} trip-specific ({prompts['static_share']:.0%} static)"
+        )
+    if llm_stats.get("fallbacks"):
+        st.caption(f"🔀 Switched models {llm_stats['fallbacks']} times after rate limits")
+
+    if report.get("trace") and get_flag("SHOW_PERFORMANCE", True):
+        show_performance(report["trace"])
+
+    st.markdown("---")
+    st.markdown("### 🗺️ Your Itinerary")
+    show_plan(job.result, f"job-{job.id}", job.params["destination_city"])
+
+
+# Parsed plans kept in session state, so reruns neither re-parse nor re-send whole plans
+PLANS_CACHED = 4
+
+
+def show_plan(text, key, city):
+    """Renders a plan as its introduction, one day at a time, and its budget."""
+    plans = st.session_state.setdefault("plan_sections", {})
+    sections = plans.pop(key, None) or split_plan(text)
+    plans[key] = sections
+    while len(plans) > PLANS_CACHED:
+        plans.pop(next(iter(plans)))
+
+    st.markdown(expand_maps_links(sections.intro, city))
+    if sections.days:
+        show_plan_day(sections, key, city)
+    if sections.outro:
+        st.markdown(expand_maps_links(sections.outro, city))
+    st.download_button(
+        "⬇️ Download full plan (Markdown)",
+        expand_maps_links(text, city),
+        file_name=f"travel-plan-{key}.md",
+        mime="text/markdown",
+        key=f"plan_download_{key}",
+    )
+
+
+@st.fragment
+def show_plan_day(sections, key, city):
+    # Picking a day reruns only this fragment and sends only that day's markdown
+    numbers = [number for number, _, _ in sections.days]
+    number = st.segmented_control(
+        "Day", numbers, default=numbers[0], format_func=lambda number: f"Day {number}",
+        key=f"plan_day_{key}", label_visibility="collapsed",
+    )
+    if number is None:
+        st.caption("Pick a day to see its schedule.")
+        return
+    heading, body = sections.day(number)
+    st.markdown(f"#### {heading}")
+    st.markdown(expand_maps_links(body, city))
+
+
+# Spans drawn in the waterfall, longest first when a run has more
+MAX_WATERFALL_SPANS = 150
+
+
+def show_performance(trace):
+    with st.expander("📊 Performance"):
+        spans = trace["spans"]
+        totals = {}
+        for span in spans:
+            entry = totals.setdefault(span["kind"], {"kind": span["kind"], "spans": 0, "seconds": 0.0})
+            entry["spans"] += 1
+            entry["seconds"] += span["duration"]
+        st.dataframe(
+            [{**entry, "seconds": round(entry["seconds"], 2)} for entry in totals.values()],
+            hide_index=True,
+        )
+
+        import altair as alt
+
+        shown = sorted(spans, key=lambda span: -span["duration"])[:MAX_WATERFALL_SPANS]
+        shown.sort(key=lambda span: span["start"])
+        rows = [{
+            "row": f"{index:03d} {span['name']}",
+            "name": span["name"],
+            "kind": span["kind"],
+            "start": round(span["start"], 3),
+            "end": round(max(span["end"], span["start"] + 0.01), 3),
+            "seconds": round(span["duration"], 2),
+            "details": ", ".join(f"{key}={value}" for key, value in span["attrs"].items()),
+        } for index, span in enumerate(shown)]
+        chart = alt.Chart(alt.Data(values=rows)).mark_bar().encode(
+            x=alt.X("start:Q", title="seconds since start"),
+            x2="end:Q",
+            y=alt.Y("row:N", sort=None, axis=alt.Axis(title=None, labelExpr="substring(datum.value, 4)")),
+            color="kind:N",
+            tooltip=["name:N", "kind:N", "seconds:Q", "details:N"],
+        ).properties(height=max(200, 16 * len(rows)))
+        st.altair_chart(chart, use_container_width=True)
+
+        st.download_button(
+            "⬇️ Download trace (JSON)",
+            json.dumps(trace, indent=2, default=str),
+            file_name=f"trace-{trace['run_id']}.json",
+            mime="application/json",
+        )
+
+
+# Current job for this browser session; the id also lives in the URL so a
+# refresh picks the same job back up instead of losing the result.
+job_id = st.session_state.get("job_id") or st.query_params.get("job")
+if job_id:
+    st.session_state.job_id = job_id
+    job = job_manager.get(job_id)
+    if job is None:
+        st.info("That plan is no longer available on this server. Generate a new one above.")
+        del st.session_state.job_id
+        st.query_params.pop("job", None)
+    elif job.active:
+        show_job_progress(job_id)
+    else:
+        show_job_result(job)
+
+
+# Past plans: stored artifacts of earlier runs, reloaded without rerunning any agents
+PAST_PLANS_SHOWN = 30
+
+
+def run_label(run):
+    created = datetime.fromtimestamp(run["created_at"]).strftime("%d %b %H:%M")
+    return (f"{run['destination_city']} · {run['date_from']} → {run['date_to']} "
+            f"· {run['interests']} · generated {created}")
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_past_artifact(run_id, name):
+    # Artifacts of a finished run never change, so reruns reuse what was read
+    return get_artifact_store().load(run_id, name) or ""
+
+
+@st.fragment
+def show_past_plans():
+    # Picking a plan or a report reruns only this fragment and reads only that artifact
+    runs = get_artifact_store().list_runs(limit=PAST_PLANS_SHOWN)
+    if not runs:
+        return
+    with st.expander(f"🗂️ Past plans ({len(runs)})"):
+        run = st.selectbox("Plan", runs, index=None, format_func=run_label,
+                           placeholder="Choose a previous plan…", label_visibility="collapsed")
+        if run is None:
+            return
+        city = run["destination_city"]
+        names = [name for name in ("planner.md", "location.md", "guide.md") if name in run["artifacts"]]
+        if not names:
+            return
+        titles = {"planner.md": "🗺️ Itinerary", "location.md": REPORT_LABELS["location"],
+                  "guide.md": REPORT_LABELS["guide"]}
+        name = st.segmented_control(
+            "Report", names, default=names[0], format_func=titles.get,
+            key=f"past_report_{run['run_id']}", label_visibility="collapsed",
+        )
+        if name is None:
+            return
+        text = load_past_artifact(run["run_id"], name)
+        if name == "planner.md":
+            show_plan(text, f"run-{run['run_id']}", city)
+        else:
+            st.markdown(expand_maps_links(text, city))
+
+
+show_past_plans()
+
+
+# Startup profile: where import, initialization and rerun time goes
+_rerun_finished = time.perf_counter()
+profile.record_rerun({
+    "imports": _imports_done - _rerun_started,
+    "script body": _rerun_finished - _imports_done,
+    "total": _rerun_finished - _rerun_started,
+})
+if get_flag("PROFILE_STARTUP", False):
+    with st.expander("🩺 Startup profile"):
+        st.table([
+            {"section": section, "item": item, "ms": round(ms, 1)}
+            for section, item, ms in profile.report()
+        ])
+        st.caption("Run `python -X importtime -m streamlit run TravelCrewApp.py` for a per-module import breakdown.")
@@ -0,0 +1,352 @@
+"""
+TravelGeo.py
+------------
+Geographic pre-stage of itinerary planning.
+Candidate places from the research are located with a pluggable geocoder
+(a local gazetteer, optionally OpenStreetMap Nominatim, behind a persistent
+cache), grouped into one area per trip day with a capacity-balanced k-means,
+and each day's places are put in visiting order with a nearest-neighbour plus
+2-opt route. The planner then writes days around these fixed groups instead of
+reasoning about geography itself. Everything here is deterministic: the same
+places and coordinates always give the same days.
+"""
+
+import csv
+import logging
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from TravelCache import DiskCache
+from TravelConfig import get_float, get_setting
+from TravelItinerary import place_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GAZETTEER_PATH = os.path.join("data", "gazetteer.csv")
+
+# Kilometres per degree of latitude, and of longitude at the equator
+KM_PER_DEGREE_LAT = 110.57
+KM_PER_DEGREE_LON = 111.32
+
+# Arrival and departure days get this share of a full day's places
+EDGE_DAY_WEIGHT = 0.5
+
+
+def city_key(city):
+    return place_key(str(city or "").split(",")[0])
+
+
+class Gazetteer:
+    """
+    Local place coordinates from a CSV file with name, city, lat and lon columns
+    (GAZETTEER_PATH). A missing file is an empty gazetteer.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_setting("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH)
+        self.points = {}
+        try:
+            with open(self.path, encoding="utf-8", newline="") as gazetteer_file:
+                for row in csv.DictReader(gazetteer_file):
+                    try:
+                        point = (float(row["lat"]), float(row["lon"]))
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    self.points[(place_key(row.get("name", "")), city_key(row.get("city", "")))] = point
+        except OSError:
+            pass
+
+    def locate(self, place, city):
+        return self.points.get((place_key(place), city_key(city))) or self.points.get((place_key(place), ""))
+
+
+class NominatimGeocoder:
+    """Live OpenStreetMap lookups, at most one request per second as its usage policy asks."""
+
+    URL = "https://nominatim.openstreetmap.org/search"
+
+    def __init__(self, user_agent=None, timeout=10):
+        import requests
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent or get_setting(
+            "GEOCODER_USER_AGENT", "travel-planner/1.0")
+        self.timeout = timeout
+        self._last_request = 0.0
+        self._lock = threading.Lock()
+
+    def locate(self, place, city):
+        with self._lock:
+            time.sleep(max(0.0, self._last_request + 1.0 - time.monotonic()))
+            self._last_request = time.monotonic()
+        response = self.session.get(self.URL, params={"q": f"{place}, {city}", "format": "json", "limit": 1},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        results = response.json()
+        return (float(results[0]["lat"]), float(results[0]["lon"])) if results else None
+
+
+class CachedGeocoder:
+    """
+    Asks the local gazetteer first, then each live geocoder in turn, and
+    remembers the live answers, including "not found", in a DiskCache, so a
+    destination's places are looked up once. Gazetteer answers are not cached:
+    they are already local, and edits to the file apply at once.
+    """
+
+    def __init__(self, gazetteer=None, geocoders=(), cache=None):
+        self.gazetteer = gazetteer
+        self.geocoders = list(geocoders)
+        self.cache = cache
+        if self.cache is None and self.geocoders:
+            self.cache = DiskCache("geocode", ttl_seconds=90 * 86400, max_entries=50000)
+
+    def locate(self, place, city):
+        point = self.gazetteer.locate(place, city) if self.gazetteer is not None else None
+        if point is not None or not self.geocoders:
+            return point
+        key = f"{city_key(city)}|{place_key(place)}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return tuple(cached["point"]) if cached["point"] else None
+        point = None
+        for geocoder in self.geocoders:
+            try:
+                point = geocoder.locate(place, city)
+            except Exception as exc:
+                logger.warning("Geocoding %r failed: %s", place, exc)
+                # Not cached: the lookup may succeed next time
+                return None
+            if point is not None:
+                break
+        # Misses are kept for a week, in case the map data improves
+        self.cache.set(key, {"point": point}, ttl_seconds=None if point else 7 * 86400)
+        return point
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def live_geocoding():
+    return get_setting("GEOCODER", "gazetteer") == "nominatim"
+
+
+def geo_planning_default():
+    """Whether places can be located without extra setup: a gazetteer file exists or a live geocoder is set."""
+    return live_geocoding() or os.path.isfile(get_setting("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH))
+
+
+def get_geocoder():
+    """The shared geocoder: the gazetteer, then Nominatim (cached) when GEOCODER = "nominatim"."""
+    global _geocoder
+    with _geocoder_lock:
+        if _geocoder is None:
+            _geocoder = CachedGeocoder(Gazetteer(), [NominatimGeocoder()] if live_geocoding() else [])
+        return _geocoder
+
+
+def set_geocoder(geocoder):
+    """Replaces the shared geocoder, e.g. with a fixed table for offline benchmarks."""
+    global _geocoder
+    with _geocoder_lock:
+        _geocoder = geocoder
+
+
+def locate_places(places, city, geocoder, budget_seconds=None):
+    """
+    {place: (lat, lon)} for the places the geocoder finds within `budget_seconds`.
+    Points more than GEO_MAX_KM from the median of the rest are dropped as
+    wrong matches (a same-named place in another city).
+    """
+    deadline = time.monotonic() + (budget_seconds if budget_seconds is not None
+                                   else get_float("GEOCODE_BUDGET_SECONDS", 20))
+    located = {}
+    for place in places:
+        if time.monotonic() > deadline:
+            break
+        point = geocoder.locate(place, city)
+        if point is not None:
+            located[place] = point
+    if len(located) < 3:
+        return located
+    names = list(located)
+    xy = project(np.array([located[name] for name in names]))
+    distance = np.linalg.norm(xy - np.median(xy, axis=0), axis=1)
+    return {name: located[name] for name, km in zip(names, distance) if km <= get_float("GEO_MAX_KM", 50)}
+
+
+def project(points):
+    """(lat, lon) degrees to planar kilometres, accurate at city scale."""
+    lat0 = math.radians(float(points[:, 0].mean()))
+    return np.column_stack((points[:, 1] * KM_PER_DEGREE_LON * math.cos(lat0), points[:, 0] * KM_PER_DEGREE_LAT))
+
+
+def pairwise(a, b):
+    """Distance matrix between two sets of planar points."""
+    return np.sqrt(((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=-1))
+
+
+def day_weights(days):
+    """Relative size of each day; arrival and departure days are lighter."""
+    weights = np.ones(days)
+    if days >= 3:
+        weights[[0, -1]] = EDGE_DAY_WEIGHT
+    return weights
+
+
+def day_capacities(days, places):
+    """Places per day, proportional to day weights."""
+    weights = day_weights(days)
+    share = places * weights / weights.sum()
+    capacities = np.floor(share).astype(int)
+    # Leftover places go to the days with the largest remainders, full days first
+    order = np.lexsort((np.arange(days), -weights, -(share - capacities)))
+    capacities[order[:places - capacities.sum()]] += 1
+    return capacities
+
+
+def _assign(distance, capacities):
+    """Nearest centroid with room; points that lose most by missing their nearest choose first."""
+    count, clusters = distance.shape
+    ranked = np.sort(distance, axis=1)
+    regret = ranked[:, 1] - ranked[:, 0] if clusters > 1 else np.zeros(count)
+    remaining = capacities.copy()
+    labels = np.empty(count, dtype=int)
+    for point in np.lexsort((np.arange(count), -regret)):
+        for cluster in np.argsort(distance[point], kind="stable"):
+            if remaining[cluster] > 0:
+                labels[point] = cluster
+                remaining[cluster] -= 1
+                break
+    return labels
+
+
+def balanced_kmeans(xy, capacities, iterations=25):
+    """
+    Lloyd's k-means with cluster sizes fixed to `capacities`. Seeds are chosen by
+    farthest-point traversal from the point nearest the centre, so cluster 0
+    (the arrival day) is the most central one.
+    """
+    seeds = [int(np.argmin(((xy - xy.mean(axis=0)) ** 2).sum(axis=1)))]
+    nearest = pairwise(xy, xy[seeds])[:, 0]
+    while len(seeds) < len(capacities):
+        seeds.append(int(np.argmax(nearest)))
+        nearest = np.minimum(nearest, pairwise(xy, xy[seeds[-1:]])[:, 0])
+    centroids = xy[seeds].astype(float)
+    labels = None
+    for _ in range(iterations):
+        new_labels = _assign(pairwise(xy, centroids), capacities)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for cluster in range(len(capacities)):
+            members = xy[labels == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+    return labels
+
+
+def route_length(path, distance):
+    return float(distance[path[:-1], path[1:]].sum()) if len(path) > 1 else 0.0
+
+
+def order_route(xy):
+    """
+    Visiting order of one day's points as an open path: nearest-neighbour tours
+    from every start, each improved with 2-opt, keeping the shortest.
+    Returns (order, length in km).
+    """
+    count = len(xy)
+    if count < 3:
+        return list(range(count)), route_length(np.arange(count), pairwise(xy, xy))
+    distance = pairwise(xy, xy)
+    best, best_length = None, math.inf
+    for start in range(count):
+        path = [start]
+        visited = np.zeros(count, dtype=bool)
+        visited[start] = True
+        while len(path) < count:
+            step = np.where(visited, np.inf, distance[path[-1]])
+            path.append(int(np.argmin(step)))
+            visited[path[-1]] = True
+        path = _two_opt(np.array(path), distance)
+        length = route_length(path, distance)
+        if length < best_length - 1e-9:
+            best, best_length = path, length
+    return [int(index) for index in best], best_length
+
+
+def _two_opt(path, distance):
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(path) - 1):
+            for j in range(i + 1, len(path)):
+                before = distance[path[i - 1], path[i]]
+                after = distance[path[i - 1], path[j]]
+                if j + 1 < len(path):
+                    before += distance[path[j], path[j + 1]]
+                    after += distance[path[i], path[j + 1]]
+                if after < before - 1e-9:
+                    path[i:j + 1] = path[i:j + 1][::-1].copy()
+                    improved = True
+    return path
+
+
+class DayPlan:
+    """
+    Places fixed to each trip day, in visiting order. `days` maps day numbers
+    to place names; places that could not be located are appended to the
+    lightest days. `route_km` is each day's straight-line route length.
+    """
+
+    def __init__(self, days, route_km, located, unlocated):
+        self.days = days
+        self.route_km = route_km
+        self.located = located
+        self.unlocated = unlocated
+
+    def stats(self):
+        return {
+            "places": self.located + len(self.unlocated),
+            "located": self.located,
+            "days": sum(1 for places in self.days.values() if places),
+            "route_km": round(sum(self.route_km.values()), 1),
+        }
+
+
+def plan_days(places, day_count, city, geocoder=None, budget_seconds=None):
+    """
+    Groups `places` into `day_count` days by area and orders each day's route.
+    Returns None when fewer than GEO_MIN_LOCATED places (or one per day) can be
+    located, in which case planning falls back to the research order.
+    """
+    geocoder = geocoder or get_geocoder()
+    points = locate_places(places, city, geocoder, budget_seconds)
+    if len(points) < max(int(get_float("GEO_MIN_LOCATED", 4)), min(day_count, len(places))):
+        return None
+
+    names = [place for place in places if place in points]
+    xy = project(np.array([points[name] for name in names]))
+    capacities = day_capacities(day_count, len(names))
+    active = np.flatnonzero(capacities)
+    labels = balanced_kmeans(xy, capacities[active])
+
+    days, route_km = {number: [] for number in range(1, day_count + 1)}, {}
+    for cluster, day_index in enumerate(active):
+        members = np.flatnonzero(labels == cluster)
+        order, length = order_route(xy[members])
+        days[day_index + 1] = [names[members[index]] for index in order]
+        route_km[day_index + 1] = length
+
+    unlocated = [place for place in places if place not in points]
+    weights = day_weights(day_count)
+    for place in unlocated:
+        lightest = min(days, key=lambda number: (len(days[number]) / weights[number - 1], number))
+        days[lightest].append(place)
+    return DayPlan(days, route_km, len(names), unlocated)
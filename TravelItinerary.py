@@ -0,0 +1,194 @@
+"""
+TravelItinerary.py
+------------------
+Chunked planning for long trips.
+Instead of one LLM call writing every day, the trip is split into day-batches
+that are planned concurrently. Candidate places from the research are shared
+out across days up front, and UsedPlaceIndex enforces the no-repetition rule
+when the batches are merged, so no place appears on more than one day.
+"""
+
+import re
+from datetime import date, timedelta
+
+from TravelRender import DAY_HEADING, MAPS_MARKER
+
+# Report sections whose places are logistics rather than things to do
+LOGISTICS_SECTION = re.compile(
+    r"getting there|transport|accommodation|where to stay|stay|emergency|practical|currency|weather",
+    re.IGNORECASE,
+)
+HEADING = re.compile(r"^\s*#{1,6}\s+(.*)")
+BUDGET_HEADING = re.compile(r"^\s*#{1,2}\s.*budget", re.IGNORECASE | re.MULTILINE)
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def trip_days(date_from, date_to):
+    """Every date of the trip, both ends included."""
+    start, end = _as_date(date_from), _as_date(date_to)
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def place_key(name):
+    """Normalized form used to compare place names ('The Meenakshi Temple' == 'meenakshi temple')."""
+    words = re.sub(r"[^\w]+", " ", name.casefold()).split()
+    if words and words[0] == "the":
+        words = words[1:]
+    return " ".join(words)
+
+
+def candidate_places(reports):
+    """
+    Places marked as [[Place]] in the research reports, in order of first
+    appearance, skipping sections about transport, hotels and other logistics.
+    """
+    places = {}
+    for report in reports:
+        logistics = False
+        for line in (report or "").splitlines():
+            heading = HEADING.match(line)
+            if heading:
+                logistics = bool(LOGISTICS_SECTION.search(heading.group(1)))
+                continue
+            if logistics:
+                continue
+            for match in MAPS_MARKER.finditer(line):
+                name = match.group(1).strip()
+                places.setdefault(place_key(name), name)
+    return list(places.values())
+
+
+class DayBatch:
+    """A run of consecutive trip days planned by one LLM call, with the places allotted to each day."""
+
+    def __init__(self, days):
+        # days: list of (day_number, date)
+        self.days = days
+        self.places = {number: [] for number, _ in days}
+
+    @property
+    def first_day(self):
+        return self.days[0][0]
+
+    @property
+    def last_day(self):
+        return self.days[-1][0]
+
+    @property
+    def label(self):
+        if self.first_day == self.last_day:
+            return f"Day {self.first_day}"
+        return f"Days {self.first_day}–{self.last_day}"
+
+    @property
+    def allotted(self):
+        return [place for number in self.places for place in self.places[number]]
+
+
+def partition_days(dates, places, batch_days, day_places=None):
+    """
+    Splits the trip into batches of `batch_days` consecutive days and deals the
+    candidate places out round-robin, so every day gets a mix of the research's
+    sections. The first and last days (arrival and departure) are dealt in only
+    after the full days, which keeps them light. `day_places` ({day: places},
+    from TravelGeo) fixes each day's places instead.
+    """
+    numbered = list(enumerate(dates, start=1))
+    batches = [DayBatch(numbered[start:start + batch_days])
+               for start in range(0, len(numbered), max(1, batch_days))]
+    by_day = {number: batch for batch in batches for number, _ in batch.days}
+    if day_places is not None:
+        for number, places_of_day in day_places.items():
+            by_day[number].places[number] = list(places_of_day)
+        return batches
+
+    full_days = [number for number, _ in numbered[1:-1]] or [number for number, _ in numbered]
+    edge_days = [number for number in (1, len(numbered)) if number not in full_days]
+    order = full_days + edge_days if len(places) > len(full_days) else full_days
+    for position, place in enumerate(places):
+        number = order[position % len(order)]
+        by_day[number].places[number].append(place)
+    return batches
+
+
+class UsedPlaceIndex:
+    """
+    First-come registry of which trip day each place belongs to.
+    Merging visits days in order, so the earliest day that plans a place keeps it.
+    """
+
+    def __init__(self):
+        self._owner = {}
+
+    def owner(self, place):
+        return self._owner.get(place_key(place))
+
+    def claim(self, place, day):
+        """Registers `place` for `day`; False if another day already has it."""
+        return self._owner.setdefault(place_key(place), day) == day
+
+    def __len__(self):
+        return len(self._owner)
+
+
+def _unmark_foreign(match, index, day):
+    owner = index.owner(match.group(1))
+    return match.group(0) if owner in (None, day) else match.group(1).strip()
+
+
+def merge_day_batches(outputs, index=None):
+    """
+    Concatenates day-batch outputs in order and enforces no-repetition.
+
+    A line whose first [[Place]] belongs to an earlier day is an activity at a
+    repeated place and is dropped. Later markers on a line are only passing
+    references ("walk from [[X]]"); if they belong to another day they are
+    unmarked, so the name stays but no second Maps link is produced. Text before
+    a batch's first day heading (preambles) is discarded.
+
+    Returns (markdown, dropped_places).
+    """
+    index = index or UsedPlaceIndex()
+    merged = []
+    dropped = []
+    for output in outputs:
+        day = None
+        for line in (output or "").strip().splitlines():
+            heading = DAY_HEADING.match(line)
+            if heading:
+                day = int(heading.group(1))
+                if merged and merged[-1].strip():
+                    merged.append("")
+                merged.append(line)
+                continue
+            if day is None:
+                continue
+
+            markers = list(MAPS_MARKER.finditer(line))
+            if markers:
+                primary = markers[0].group(1).strip()
+                if not index.claim(primary, day):
+                    dropped.append(primary)
+                    continue
+
+            if len(markers) > 1:
+                tail = markers[1].start()
+                line = line[:tail] + MAPS_MARKER.sub(
+                    lambda match: _unmark_foreign(match, index, day), line[tail:]
+                )
+            merged.append(line)
+    return "\n".join(merged).strip(), dropped
+
+
+def assemble_plan(frame, days_markdown, destination_city):
+    """Places the merged days between the frame's introduction and its budget overview."""
+    frame = (frame or "").strip()
+    budget = BUDGET_HEADING.search(frame)
+    intro, overview = (frame[:budget.start()], frame[budget.start():]) if budget else (frame, "")
+    parts = [intro.strip().rstrip("-").strip(),
+             f"# 🗓️ Your {destination_city} Itinerary\n\n{days_markdown}",
+             overview.strip()]
+    return "\n\n---\n\n".join(part for part in parts if part)
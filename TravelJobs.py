@@ -0,0 +1,403 @@
+"""
+TravelJobs.py
+-------------
+Background job subsystem for crew runs.
+Submitting a trip request returns a job id immediately; a bounded pool of worker
+threads or processes executes the crews while the UI polls status and partial
+outputs by id. Admission control caps the queue so a burst of traffic is turned
+away up front instead of piling up in memory. Prefetch jobs run destination
+research speculatively, on idle workers only, while the user is still filling in
+the form; a plan for the same trip waits for them and reuses their output.
+"""
+
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from TravelCache import stage_key
+from TravelConfig import get_int, get_setting
+from TravelProgress import ProgressChannel
+from TravelTracing import metrics
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+PLAN = "plan"
+PREFETCH = "prefetch"
+
+
+class JobRejected(Exception):
+    """Raised by JobManager.submit when the queue or the session is at capacity."""
+
+
+class Job:
+    """State of one submitted crew run. Written by workers, read by the UI."""
+
+    def __init__(self, job_id, session_id, params, kind=PLAN):
+        self.id = job_id
+        self.session_id = session_id
+        self.params = params
+        self.kind = kind
+        # Destination research reuses this key, so a plan can find its prefetch
+        self.research_key = stage_key("location", **params)
+        # Set to call off a running prefetch (thread workers only)
+        self.cancelled = threading.Event()
+        self.status = QUEUED
+        self.progress = ProgressChannel()
+        self.result = None
+        self.error = None
+        self.report = {}
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._followers = []
+        self._followers_lock = threading.Lock()
+
+    @property
+    def stage_outputs(self):
+        return self.progress.outputs()
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATES
+
+    def when_finished(self, callback):
+        """Calls `callback()` once this job has finished, or now if it already has."""
+        with self._followers_lock:
+            if self.active:
+                self._followers.append(callback)
+                return
+        callback()
+
+    def release(self):
+        with self._followers_lock:
+            followers, self._followers = self._followers, []
+        for callback in followers:
+            callback()
+
+    def snapshot(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "stages_done": list(self.stage_outputs),
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+def run_job(params, session_id, progress):
+    """Executes one crew run in a worker and returns the report the UI displays."""
+    from TravelCrew import TravelCrew
+    from tools.search_tools import get_search_tool
+
+    travel_crew = TravelCrew(**params, session_id=session_id, progress=progress)
+    result = travel_crew.run()
+    return {
+        "search_cache": get_search_tool().stats(),
+        "result": result,
+        "run_id": travel_crew.run_id,
+        "timings": travel_crew.timings,
+        "cached_stages": travel_crew.cached_stages,
+        "resumed_stages": travel_crew.resumed_stages,
+        "llm_stats": travel_crew.llm_stats,
+        "parallel_research": travel_crew.parallel_research,
+        "compaction": travel_crew.compaction_stats,
+        "plan_batches": travel_crew.batch_stats,
+        "geo": travel_crew.geo_stats,
+        "budget_hits": travel_crew.budget_hits,
+        "prompt_stats": travel_crew.prompt_stats,
+        "trace": travel_crew.tracer.to_dict(),
+    }
+
+
+class _QueueChannel(ProgressChannel):
+    """Progress channel for process workers: forwards everything over a Manager queue."""
+
+    def __init__(self, job_id, queue):
+        super().__init__()
+        self.job_id = job_id
+        self.queue = queue
+
+    def publish(self, kind, agent, text):
+        self.queue.put((self.job_id, "event", (kind, agent, text)))
+
+    def record_output(self, stage, output):
+        self.queue.put((self.job_id, "stage", (stage, output)))
+
+
+def run_prefetch(params, session_id, progress, cancelled=None):
+    """Runs speculative destination research in a worker; the output goes to the stage cache."""
+    from TravelCrew import TravelCrew
+
+    travel_crew = TravelCrew(**params, interests="", session_id=session_id, progress=progress)
+    stored = travel_crew.prefetch_research(cancelled)
+    return {"result": None, "prefetched": stored, "llm_stats": travel_crew.llm_stats}
+
+
+def _init_process_worker(workers):
+    # Every worker process has its own limiter; together they keep to one budget
+    from TravelRateLimiter import set_budget_share
+
+    set_budget_share(workers)
+
+
+def _run_job_in_process(job_id, params, session_id, queue):
+    queue.put((job_id, "started", None))
+    return run_job(params, session_id, _QueueChannel(job_id, queue))
+
+
+def _run_prefetch_in_process(job_id, params, session_id, queue):
+    queue.put((job_id, "started", None))
+    return run_prefetch(params, session_id, _QueueChannel(job_id, queue))
+
+
+class JobManager:
+    """
+    Bounded pool of crew workers plus an in-memory job table.
+
+    `mode` is "thread" (default; shares the process-wide rate limiter and caches)
+    or "process" (isolates crews from the Streamlit server's GIL). At most
+    `max_workers` jobs run at once and at most `max_queue` more wait; a session
+    may hold `max_per_session` active jobs. Finished jobs are kept for polling
+    until `max_finished` newer ones have completed. Prefetch jobs do not count
+    towards the queue or session limits, since they only start on an idle worker.
+    """
+
+    def __init__(self, max_workers=2, max_queue=8, mode="thread", max_per_session=1,
+                 max_finished=100):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.mode = mode
+        self.max_per_session = max_per_session
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._prefetches = {}
+        self._lock = threading.Lock()
+        self._events = None
+
+        if mode == "process":
+            self._manager = multiprocessing.Manager()
+            self._events = self._manager.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_init_process_worker, initargs=(max_workers,)
+            )
+            threading.Thread(target=self._pump_events, daemon=True).start()
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="travel-crew"
+            )
+
+    def submit(self, params, session_id):
+        """Queues a crew run and returns its job id, or raises JobRejected."""
+        with self._lock:
+            active = [job for job in self._jobs.values() if job.active and job.kind == PLAN]
+            if len(active) >= self.max_workers + self.max_queue:
+                raise JobRejected(
+                    "All planners are busy right now. Please try again in a few minutes."
+                )
+            if sum(job.session_id == session_id for job in active) >= self.max_per_session:
+                raise JobRejected("You already have a plan in progress.")
+
+            job = Job(uuid.uuid4().hex, session_id, params)
+            self._jobs[job.id] = job
+            # This session's prefetch for other inputs is no longer wanted
+            prefetch = self._prefetches.pop(session_id, None)
+            running = None
+            if params.get("use_stage_cache", True):
+                running = self._running_prefetch(job.research_key)
+
+        if prefetch is not None and prefetch.research_key != job.research_key:
+            self._cancel_prefetch(prefetch)
+        if running is None:
+            self._start(job)
+        else:
+            # Research for this trip is already under way: start once it is cached
+            job.progress.publish("task_started", "", "🔮 Waiting for destination research started in the background")
+            running.when_finished(lambda: self._start(job))
+        return job.id
+
+    def prefetch(self, params, session_id):
+        """
+        Starts destination research for `params` (from_city, destination_city,
+        date_from, date_to) ahead of the plan, if a worker is idle. This
+        session's prefetch for other inputs is cancelled; a prefetch for the same
+        research, from any session, is reused. Returns the job id, or None.
+        """
+        research_key = stage_key("location", **params)
+        with self._lock:
+            stale = self._prefetches.get(session_id)
+            if stale is not None and stale.research_key != research_key:
+                del self._prefetches[session_id]
+            else:
+                stale = None
+        if stale is not None:
+            self._cancel_prefetch(stale)
+
+        with self._lock:
+            for job in self._jobs.values():
+                # Already being researched, ahead of time or by a plan
+                if job.active and job.research_key == research_key:
+                    return job.id if job.kind == PREFETCH else None
+            # Speculative work never delays a real plan
+            if sum(job.active for job in self._jobs.values()) >= self.max_workers:
+                return None
+            job = Job(uuid.uuid4().hex, session_id, params, kind=PREFETCH)
+            self._jobs[job.id] = job
+            self._prefetches[session_id] = job
+        self._start(job)
+        return job.id
+
+    def cancel_prefetch(self, session_id):
+        """Calls off this session's prefetch, e.g. when its inputs became incomplete."""
+        with self._lock:
+            job = self._prefetches.pop(session_id, None)
+        if job is not None:
+            self._cancel_prefetch(job)
+
+    def _running_prefetch(self, research_key):
+        for job in self._jobs.values():
+            if job.kind == PREFETCH and job.active and job.research_key == research_key:
+                return job
+        return None
+
+    def _cancel_prefetch(self, job):
+        # Queued: never starts. Running: its agent wraps up and nothing is cached.
+        # Not called under self._lock: a cancelled future runs _finish right away.
+        job.cancelled.set()
+        if job.future is not None and job.status == QUEUED:
+            job.future.cancel()
+
+    def _start(self, job):
+        if job.status == CANCELLED:
+            return
+        if job.kind == PREFETCH and job.cancelled.is_set():
+            self._mark_cancelled(job)
+            return
+        if self.mode == "process":
+            target = _run_prefetch_in_process if job.kind == PREFETCH else _run_job_in_process
+            job.future = self._executor.submit(target, job.id, job.params, job.session_id, self._events)
+        else:
+            job.future = self._executor.submit(self._run_in_thread, job)
+        job.future.add_done_callback(lambda future: self._finish(job.id, future))
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancels a job that has not started yet. Running crews cannot be interrupted."""
+        job = self.get(job_id)
+        if job is None or job.status != QUEUED:
+            return False
+        # A plan waiting for a prefetch has no future yet; _start skips it
+        if job.future is None or job.future.cancel():
+            self._mark_cancelled(job)
+            return True
+        return False
+
+    def _mark_cancelled(self, job):
+        if job.active:
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            job.release()
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "queued": sum(job.status == QUEUED for job in jobs),
+            "running": sum(job.status == RUNNING for job in jobs),
+            "finished": sum(not job.active for job in jobs),
+            "capacity": self.max_workers + self.max_queue,
+            "mode": self.mode,
+        }
+
+    def _run_in_thread(self, job):
+        self._handle_event(job.id, "started", None)
+        if job.kind == PREFETCH:
+            return run_prefetch(job.params, job.session_id, job.progress, job.cancelled)
+        return run_job(job.params, job.session_id, job.progress)
+
+    def _handle_event(self, job_id, kind, payload):
+        job = self.get(job_id)
+        if job is None:
+            return
+        if kind == "started":
+            # A late "started" from a process worker must not revive a finished job
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+        elif kind == "event":
+            job.progress.publish(*payload)
+        elif kind == "stage":
+            job.progress.record_output(*payload)
+
+    def _pump_events(self):
+        while True:
+            try:
+                job_id, kind, payload = self._events.get()
+            except (EOFError, OSError):
+                return
+            self._handle_event(job_id, kind, payload)
+
+    def _finish(self, job_id, future):
+        job = self.get(job_id)
+        if job is None:
+            return
+        if future.cancelled():
+            self._mark_cancelled(job)
+            return
+        error = future.exception()
+        if error is not None:
+            job.error = str(error)
+            job.status = FAILED
+        else:
+            job.report = future.result()
+            job.result = job.report["result"]
+            job.status = CANCELLED if job.kind == PREFETCH and job.cancelled.is_set() else DONE
+        job.finished_at = time.time()
+        # Traces come back with the report in both worker modes, so metrics are
+        # aggregated here in the server process
+        metrics.observe_trace(job.report.get("trace"))
+        metrics.inc("travel_jobs_total", status=job.status, kind=job.kind)
+        job.release()
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+            for session_id, job in list(self._prefetches.items()):
+                if not job.active:
+                    del self._prefetches[session_id]
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Returns the job manager shared by every session in this process."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager(
+                max_workers=get_int("JOB_WORKERS", 2),
+                max_queue=get_int("JOB_MAX_QUEUE", 8),
+                mode=get_setting("JOB_WORKER_MODE", "thread"),
+                max_per_session=get_int("JOB_MAX_PER_SESSION", 1),
+            )
+        return _job_manager
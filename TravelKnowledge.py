@@ -0,0 +1,289 @@
+"""
+TravelKnowledge.py
+------------------
+Local full-text knowledge base of past research.
+Search snippets and the research reports the crew writes are split into short
+passages, tagged with their destination and travel month, and indexed in a
+SQLite FTS5 table. The search tool asks it first and only goes to Serper when
+the stored passages do not cover the query well enough, so research for popular
+destinations is answered locally. Passages older than KNOWLEDGE_MAX_AGE_DAYS are
+pruned, and the store keeps at most KNOWLEDGE_MAX_DOCS passages.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from TravelConfig import get_flag, get_float, get_int, get_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KNOWLEDGE_PATH = os.path.join(".cache", "knowledge.sqlite3")
+
+SEARCH = "search"
+REPORT = "report"
+
+# Longest passage stored; longer report sections are split at paragraph breaks
+MAX_PASSAGE_CHARS = 1200
+
+STOPWORDS = frozenset(
+    "a an and are at best by for from how in is it near of on or the to top what when where which "
+    "with vs during".split()
+)
+
+SECTION_BREAK = re.compile(r"^\s*(?:#{1,6}\s|---+\s*$)", re.MULTILINE)
+WORD = re.compile(r"\w+")
+
+
+def destination_key(destination):
+    return " ".join(str(destination or "").lower().split())
+
+
+def query_terms(query):
+    """Distinct content words of a query, in order."""
+    terms = []
+    for word in WORD.findall(str(query).lower()):
+        if word not in STOPWORDS and len(word) > 1 and word not in terms:
+            terms.append(word)
+    return terms
+
+
+def split_passages(text):
+    """Splits a report at headings and rules, then long sections at paragraph breaks."""
+    starts = [0] + [match.start() for match in SECTION_BREAK.finditer(text)] + [len(text)]
+    passages = []
+    for start, end in zip(starts, starts[1:]):
+        section = text[start:end].strip().strip("-").strip()
+        while len(section) > MAX_PASSAGE_CHARS:
+            cut = section.rfind("\n\n", 0, MAX_PASSAGE_CHARS)
+            cut = cut if cut > 0 else MAX_PASSAGE_CHARS
+            passages.append(section[:cut].strip())
+            section = section[cut:].strip()
+        if section:
+            passages.append(section)
+    return passages
+
+
+class KnowledgeBase:
+    """
+    Passages in a `passages` table with an external-content FTS5 index over
+    their title and body. Each passage is stored once (by content hash), and
+    searches are limited to one destination when it is known.
+    """
+
+    def __init__(self, path=None, max_docs=None, max_age_days=None):
+        self.path = path or get_setting("KNOWLEDGE_PATH", DEFAULT_KNOWLEDGE_PATH)
+        self.max_docs = max_docs or get_int("KNOWLEDGE_MAX_DOCS", 20000)
+        self.max_age_seconds = (max_age_days or get_float("KNOWLEDGE_MAX_AGE_DAYS", 60)) * 86400
+        self.min_hits = get_int("KNOWLEDGE_MIN_HITS", 3)
+        self.min_coverage = get_float("KNOWLEDGE_MIN_COVERAGE", 0.75)
+        self.results = get_int("KNOWLEDGE_RESULTS", 5)
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS passages ("
+                " id INTEGER PRIMARY KEY,"
+                " digest TEXT NOT NULL UNIQUE,"
+                " destination_key TEXT NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " source TEXT,"
+                " travel_month TEXT,"
+                " title TEXT NOT NULL,"
+                " body TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS passages_destination ON passages (destination_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS passages_created ON passages (created_at)")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5("
+                " title, body, content='passages', content_rowid='id', tokenize='porter unicode61')"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add_search(self, query, result, destination="", travel_month=None):
+        """Stores each snippet of a formatted search result under its query."""
+        blocks = [block.strip() for block in str(result or "").split("\n---\n")]
+        return self._add([(query, block) for block in blocks if block], SEARCH, query, destination, travel_month)
+
+    def add_report(self, stage, text, destination, travel_month=None):
+        """Stores a research report as one passage per section."""
+        passages = []
+        title = stage
+        for passage in split_passages(str(text or "")):
+            lines = passage.splitlines()
+            if lines[0].lstrip().startswith("#"):
+                title = lines[0].strip().lstrip("#").strip()
+                if len(lines) == 1:
+                    continue
+            passages.append((title, passage))
+        return self._add(passages, REPORT, stage, destination, travel_month)
+
+    def _add(self, passages, kind, source, destination, travel_month):
+        now = time.time()
+        added = 0
+        with self._lock, self._connect() as conn:
+            for title, body in passages:
+                digest = hashlib.sha256(f"{destination_key(destination)}\n{body}".encode("utf-8")).hexdigest()
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO passages (digest, destination_key, kind, source, travel_month,"
+                    " title, body, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (digest, destination_key(destination), kind, source, travel_month, title, body, now),
+                )
+                if cursor.rowcount:
+                    conn.execute("INSERT INTO passages_fts (rowid, title, body) VALUES (?, ?, ?)",
+                                 (cursor.lastrowid, title, body))
+                    added += 1
+            if added:
+                self._prune(conn, now)
+        return added
+
+    def _prune(self, conn, now):
+        stale = [row[0] for row in conn.execute(
+            "SELECT id FROM passages WHERE created_at < ?", (now - self.max_age_seconds,)
+        )]
+        (count,) = conn.execute("SELECT COUNT(*) FROM passages").fetchone()
+        overflow = count - len(stale) - self.max_docs
+        if overflow > 0:
+            stale += [row[0] for row in conn.execute(
+                "SELECT id FROM passages WHERE created_at >= ? ORDER BY created_at ASC LIMIT ?",
+                (now - self.max_age_seconds, overflow),
+            )]
+        for passage_id in stale:
+            # External-content FTS rows are removed with the 'delete' command and the old values
+            conn.execute(
+                "INSERT INTO passages_fts (passages_fts, rowid, title, body)"
+                " SELECT 'delete', id, title, body FROM passages WHERE id = ?", (passage_id,)
+            )
+            conn.execute("DELETE FROM passages WHERE id = ?", (passage_id,))
+        self.pruned += len(stale)
+
+    def search(self, query, destination=None, limit=None):
+        """Best-matching passages as dicts, optionally for one destination only."""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        sql = ("SELECT p.id, p.kind, p.source, p.travel_month, p.title, p.body, p.created_at"
+               " FROM passages_fts JOIN passages p ON p.id = passages_fts.rowid"
+               " WHERE passages_fts MATCH ?")
+        params = [" OR ".join(f'"{term}"' for term in terms)]
+        if destination:
+            sql += " AND p.destination_key = ?"
+            params.append(destination_key(destination))
+        sql += " ORDER BY bm25(passages_fts) LIMIT ?"
+        params.append(limit or self.results)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        columns = ("id", "kind", "source", "travel_month", "title", "body", "created_at")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def coverage(self, query, passages):
+        """Share of the query's words that occur (after stemming) in `passages`."""
+        terms = query_terms(query)
+        if not terms or not passages:
+            return 0.0
+        ids = ",".join(str(int(passage["id"])) for passage in passages)
+        covered = 0
+        with self._connect() as conn:
+            for term in terms:
+                row = conn.execute(
+                    f"SELECT 1 FROM passages_fts WHERE passages_fts MATCH ? AND rowid IN ({ids}) LIMIT 1",
+                    (f'"{term}"',),
+                ).fetchone()
+                covered += row is not None
+        return covered / len(terms)
+
+    def lookup(self, query, destination=None):
+        """
+        Formatted passages for `query` when the store covers it well enough
+        (KNOWLEDGE_MIN_HITS passages holding KNOWLEDGE_MIN_COVERAGE of its words), else None.
+        """
+        passages = self.search(query, destination)
+        if len(passages) < self.min_hits or self.coverage(query, passages) < self.min_coverage:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return self.format(passages)
+
+    @staticmethod
+    def format(passages):
+        now = time.time()
+        blocks = []
+        for passage in passages:
+            age = max(0, int((now - passage["created_at"]) // 86400))
+            origin = f'search "{passage["source"]}"' if passage["kind"] == SEARCH else f'{passage["source"]} report'
+            month = f", {passage['travel_month']} trip" if passage["travel_month"] else ""
+            blocks.append(f"From past research ({origin}{month}, {age} days old):\n{passage['body']}")
+        return "\n---\n".join(blocks)
+
+    def stats(self):
+        with self._connect() as conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM passages").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "pruned": self.pruned,
+            "passages": count,
+        }
+
+
+class KnowledgeBackend:
+    """
+    Search backend answered from the knowledge base alone, for offline runs and
+    tests: `SEARCH_BACKEND = "knowledge"` or CachedSearchTool(backend=KnowledgeBackend()).
+    """
+
+    def __init__(self, knowledge=None):
+        self.knowledge = knowledge or get_knowledge_base() or KnowledgeBase()
+
+    def run(self, search_query, **kwargs):
+        passages = self.knowledge.search(search_query, kwargs.get("destination"))
+        return self.knowledge.format(passages) if passages else "No results found."
+
+
+def travel_month(value):
+    """'2026-03' for a date, or None."""
+    return value.strftime("%Y-%m") if hasattr(value, "strftime") else (str(value)[:7] or None)
+
+
+_knowledge_base = None
+_knowledge_base_lock = threading.Lock()
+
+
+def get_knowledge_base():
+    """The process-wide knowledge base, or None when KNOWLEDGE_BASE is off or FTS5 is unavailable."""
+    global _knowledge_base
+    if not get_flag("KNOWLEDGE_BASE", True):
+        return None
+    with _knowledge_base_lock:
+        if _knowledge_base is None:
+            try:
+                _knowledge_base = KnowledgeBase()
+            except sqlite3.OperationalError as exc:
+                logger.warning("Knowledge base disabled: %s", exc)
+                _knowledge_base = False
+        return _knowledge_base or None
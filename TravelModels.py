@@ -0,0 +1,243 @@
+"""
+TravelModels.py
+---------------
+Model routing for agent LLM calls.
+Each stage has its own model (LOCATION_MODEL, GUIDE_MODEL, PLANNER_MODEL), and a
+stage can send its query steps (requests made before the agent has any search
+results, i.e. choosing what to search) to a different, faster model
+(<STAGE>_QUERY_MODEL). Research stages default to the fast model for query steps
+and the large model for synthesis. When the provider rate-limits a model, the call
+falls back to the next model in LLM_FALLBACK_MODELS, and the limited model is
+skipped by every session until its cooldown has passed. Also recognizes retryable
+provider errors and reads their retry-after hints.
+"""
+
+import logging
+import re
+import threading
+import time
+
+from TravelConfig import get_float, get_setting
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "groq/llama-3.3-70b-versatile"
+DEFAULT_FAST_MODEL = "groq/llama-3.1-8b-instant"
+
+RESEARCH_STAGES = ("location", "guide")
+
+QUERY_STEP = "query"
+ANSWER_STEP = "answer"
+
+# Transient provider errors worth retrying (litellm exception class names)
+TRANSIENT_ERRORS = ("Timeout", "APIConnectionError", "ServiceUnavailableError", "InternalServerError")
+
+# "7.66s", "2m59.5s" or "450ms", as in Groq's headers and error messages
+_DURATION = re.compile(r"(?:(\d+)m(?!s))?(\d+(?:\.\d+)?)(ms|s)\b")
+
+# Models recently rate-limited by the provider: {model: monotonic time it may be used again}
+_cooldowns = {}
+_cooldowns_lock = threading.Lock()
+
+
+def agent_model(stage):
+    return get_setting(f"{stage.upper()}_MODEL", get_setting("LLM_MODEL", DEFAULT_MODEL))
+
+
+def query_model(stage):
+    default = get_setting("FAST_MODEL", DEFAULT_FAST_MODEL) if stage in RESEARCH_STAGES else agent_model(stage)
+    return get_setting(f"{stage.upper()}_QUERY_MODEL", default)
+
+
+def fallback_models():
+    value = get_setting("LLM_FALLBACK_MODELS", f"{DEFAULT_MODEL}, {DEFAULT_FAST_MODEL}")
+    return [model.strip() for model in value.split(",") if model.strip()]
+
+
+def has_tool_results(messages):
+    """True once a tool observation is in the conversation (ReAct text or native tool messages)."""
+    if isinstance(messages, str):
+        return "\nObservation:" in messages
+    for message in messages or []:
+        if not isinstance(message, dict):
+            continue
+        if message.get("role") == "tool" or "\nObservation:" in str(message.get("content") or ""):
+            return True
+    return False
+
+
+def is_rate_limit_error(exc):
+    """Recognizes provider rate-limit errors (litellm.RateLimitError, HTTP 429) without importing litellm."""
+    while exc is not None:
+        text = f"{type(exc).__name__} {exc}".lower()
+        if "ratelimit" in text or "rate_limit" in text or "rate limit" in text or " 429" in text:
+            return True
+        exc = exc.__cause__
+    return False
+
+
+def is_transient_error(exc):
+    return is_rate_limit_error(exc) or any(name in type(exc).__name__ for name in TRANSIENT_ERRORS)
+
+
+def _parse_duration(text):
+    match = _DURATION.search(str(text))
+    if match is None:
+        try:
+            return float(text)
+        except (TypeError, ValueError):
+            return None
+    minutes, amount, unit = match.groups()
+    seconds = float(amount) / (1000 if unit == "ms" else 1)
+    return seconds + 60 * int(minutes or 0)
+
+
+def retry_after_seconds(exc):
+    """
+    The provider's hint for when to retry, in seconds, or None. Read from the
+    retry-after / x-ratelimit-reset-* headers when the error carries its HTTP
+    response, else from "Please try again in 7.66s" in the message.
+    """
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    for name in ("retry-after", "x-ratelimit-reset-tokens", "x-ratelimit-reset-requests"):
+        value = headers.get(name) if hasattr(headers, "get") else None
+        seconds = _parse_duration(value) if value else None
+        if seconds is not None:
+            return seconds
+    match = re.search(r"try again in ([\dms.]+)", str(exc))
+    return _parse_duration(match.group(1)) if match else None
+
+
+def cool_down(model, seconds=None):
+    seconds = get_float("MODEL_COOLDOWN_SECONDS", 30) if seconds is None else seconds
+    with _cooldowns_lock:
+        _cooldowns[model] = max(_cooldowns.get(model, 0.0), time.monotonic() + seconds)
+
+
+def is_cooling_down(model):
+    with _cooldowns_lock:
+        return _cooldowns.get(model, 0.0) > time.monotonic()
+
+
+def _merge_stats(entries):
+    """Adds up the stats of several clients of one model."""
+    calls = sum(entry["calls"] for entry in entries)
+    merged = {name: sum(entry[name] for entry in entries) for name in entries[0] if name != "avg_latency"}
+    merged["avg_latency"] = sum(entry["avg_latency"] * entry["calls"] for entry in entries) / calls if calls else 0.0
+    return merged
+
+
+class ModelRouter:
+    """
+    Per-model PacedLLM clients of one AgentSet, built on demand by `build(model)`.
+    Every agent's LLM is one of these clients; its calls come back through
+    `call`, which picks the model for the step and walks the fallback chain.
+    `stages` maps agent roles to their stage.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.stages = {}
+        self.clients = {}
+        # Clients serving another model's requests, by (model, stop words)
+        self.routed = {}
+        self.fallbacks = 0
+        self.session_id = "default"
+        self.tracer = None
+        self.budgets = None
+        self._lock = threading.Lock()
+
+    def client(self, model):
+        with self._lock:
+            if model not in self.clients:
+                llm = self.build(model)
+                llm.router = self
+                self._bind_client(llm)
+                self.clients[model] = llm
+            return self.clients[model]
+
+    def bind(self, session_id, tracer, budgets):
+        """Points every client, including ones built later in the run, at a new run."""
+        with self._lock:
+            self.session_id = session_id
+            self.tracer = tracer
+            self.budgets = budgets
+            self.fallbacks = 0
+            for llm in [*self.clients.values(), *self.routed.values()]:
+                self._bind_client(llm)
+                llm.reset_stats()
+
+    def _bind_client(self, llm):
+        llm.session_id = self.session_id
+        llm.tracer = self.tracer
+        llm.budgets = self.budgets
+
+    def routed_client(self, llm, model):
+        """
+        The client that serves a request of `llm` on `model`: `llm` itself for its
+        own model, otherwise a client kept for `llm`'s stop words, so clients shared
+        by concurrent agents are never reconfigured between calls.
+        """
+        if model == llm.model:
+            return llm
+        stop = tuple(llm.stop or ())
+        with self._lock:
+            client = self.routed.get((model, stop))
+            if client is None:
+                client = self.build(model)
+                client.stop = list(stop)
+                client.router = self
+                self._bind_client(client)
+                self.routed[(model, stop)] = client
+            return client
+
+    def route(self, llm, agent, messages, forced):
+        """Returns (model, step) for one request of `agent` made through `llm`."""
+        stage = self.stages.get(getattr(agent, "role", None))
+        if stage is None:
+            return llm.model, ANSWER_STEP
+        model = agent_model(stage)
+        if not forced and not has_tool_results(messages) and query_model(stage) != model:
+            return query_model(stage), QUERY_STEP
+        return model, ANSWER_STEP
+
+    def chain(self, model):
+        """`model` then its fallbacks; models cooling down after a rate limit go last."""
+        models = [model] + [other for other in fallback_models() if other != model]
+        return [m for m in models if not is_cooling_down(m)] + [m for m in models if is_cooling_down(m)]
+
+    def call(self, llm, messages, forced, *args, **kwargs):
+        model, step = self.route(llm, kwargs.get("from_agent"), messages, forced)
+        chain = self.chain(model)
+        for index, model in enumerate(chain):
+            # CrewAI sets its stop words on the agent's own LLM only
+            client = self.routed_client(llm, model)
+            attrs = {"step": step}
+            if index:
+                attrs["fallback_from"] = chain[index - 1]
+            try:
+                return client.paced_call(messages, forced, attrs, *args, **kwargs)
+            except Exception as exc:
+                if not is_rate_limit_error(exc) or index == len(chain) - 1:
+                    raise
+                cool_down(model, retry_after_seconds(exc))
+                with self._lock:
+                    self.fallbacks += 1
+                logger.warning("%s is rate limited; falling back to %s", model, chain[index + 1])
+
+    def stats(self):
+        """Totals over every model plus per-model calls, latency and tokens."""
+        with self._lock:
+            clients = [*self.clients.values(), *self.routed.values()]
+            fallbacks = self.fallbacks
+        per_model = {}
+        for client in clients:
+            if client.calls:
+                per_model.setdefault(client.model, []).append(client.stats())
+        models = {model: _merge_stats(entries) for model, entries in per_model.items()}
+        return {
+            "calls": sum(entry["calls"] for entry in models.values()),
+            "wait_seconds": sum(entry["wait_seconds"] for entry in models.values()),
+            "fallbacks": fallbacks,
+            "models": models,
+        }
@@ -0,0 +1,101 @@
+"""
+TravelProgress.py
+-----------------
+Structured progress reporting for crew runs.
+Agents publish step and task events into a per-run ProgressChannel through
+CrewAI callbacks; the Streamlit UI polls the channel and redraws at a fixed
+refresh rate, however chatty the agents are.
+"""
+
+import threading
+import time
+
+# Events kept in the on-screen activity log
+VISIBLE_EVENTS = 12
+
+
+def _shorten(text, limit=120):
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class ProgressChannel:
+    """
+    Thread-safe, append-only event log owned by one run.
+    Callbacks fire from CrewAI worker threads, so publishing only appends under
+    a lock; nothing here touches Streamlit.
+    """
+
+    def __init__(self):
+        self._events = []
+        self._outputs = {}
+        self._lock = threading.Lock()
+
+    def publish(self, kind, agent, text):
+        event = {"time": time.time(), "kind": kind, "agent": agent, "text": text}
+        with self._lock:
+            self._events.append(event)
+
+    def record_output(self, stage, output):
+        """Keeps a finished stage's output so it can be shown before the run ends."""
+        with self._lock:
+            self._outputs[stage] = output
+
+    def outputs(self):
+        with self._lock:
+            return dict(self._outputs)
+
+    def recent(self, count=VISIBLE_EVENTS):
+        with self._lock:
+            return self._events[-count:]
+
+    def events_since(self, cursor):
+        """Returns events published after `cursor` and the new cursor."""
+        with self._lock:
+            return self._events[cursor:], len(self._events)
+
+    def step_callback(self, agent_role):
+        """Builds an Agent.step_callback that tags each step with the agent's role."""
+        def callback(step):
+            for item in step if isinstance(step, (list, tuple)) else [step]:
+                kind, text = self._describe_step(item)
+                if text:
+                    self.publish(kind, agent_role, text)
+        return callback
+
+    @staticmethod
+    def _describe_step(step):
+        tool = getattr(step, "tool", None)
+        if tool:
+            return "tool", f"🔎 {tool}: {_shorten(getattr(step, 'tool_input', ''), 80)}"
+        if hasattr(step, "output") and hasattr(step, "thought"):
+            return "final", "📝 Writing final answer"
+        if hasattr(step, "result"):
+            return "observation", "📄 Reading results"
+        thought = getattr(step, "thought", "")
+        if thought:
+            return "thought", f"💭 {_shorten(thought)}"
+        return "step", ""
+
+
+def format_event(event):
+    if event["agent"]:
+        return f"**{event['agent']}** — {event['text']}"
+    return event["text"]
+
+
+def render_progress(channel, container, cursor=0):
+    """
+    Draws the channel's recent activity into `container` and toasts stage events
+    published after `cursor`. Returns the new cursor. Called from a Streamlit
+    fragment that reruns at a fixed interval, so redraws are coalesced to that
+    rate no matter how many events the agents emit in between.
+    """
+    import streamlit as st
+
+    events, cursor = channel.events_since(cursor)
+    for event in events:
+        if event["kind"] in ("task_started", "task_done"):
+            st.toast(event["text"])
+    container.markdown("  \n".join(format_event(event) for event in channel.recent()))
+    return cursor
@@ -0,0 +1,308 @@
+"""
+TravelPrompts.py
+----------------
+Task prompt templates laid out for provider-side prompt-prefix caching.
+Every template is a static block (instructions and output format, byte-identical
+for every trip) followed by a short variable suffix holding the trip details and
+any upstream reports. Requests for different trips, and every iteration of one
+agent, then share the longest possible prefix, so the provider can serve it from
+its prompt cache instead of re-reading the instructions each time.
+No crewai import, so benchmarks can render prompts without building agents.
+"""
+
+from TravelRateLimiter import estimate_tokens
+
+# The task's expected_output follows the description in CrewAI's prompt, after the
+# variable suffix, so it stays short and static; the real format is in the prefix
+EXPECTED_OUTPUT = "The complete markdown answer, in exactly the output format given in the task above."
+
+MARKER_RULE = """
+> **IMPORTANT**: Wrap the name of every specific place, hotel, restaurant, attraction, market or
+> landmark you mention in double square brackets, e.g. `[[Place Name]]` — every single location,
+> every time. Do not write map links or URLs; they are added automatically for every bracketed name.
+"""
+
+SEARCH_TIP = """
+> **Search efficiently**: batch related lookups into one search call by passing a list of
+> queries (e.g. weather, hotels and transport together) instead of searching one query at a time.
+"""
+
+
+class PromptTemplate:
+    """
+    A static prefix plus a variable suffix filled in with str.format. The prefix
+    is built once at import, along with its token estimate.
+    """
+
+    def __init__(self, name, static, variable):
+        self.name = name
+        self.static = static.strip("\n") + "\n\n"
+        self.variable = variable.strip("\n") + "\n"
+        self.static_tokens = estimate_tokens(self.static)
+
+    def render(self, reports=None, **fields):
+        """Returns (static, variable) text for one task; `reports` are appended to the suffix."""
+        return self.static, self.variable.format(**fields) + report_block(reports)
+
+
+def report_block(reports):
+    if not reports:
+        return ""
+    return "\nResearch already completed by your colleagues:\n" + "".join(
+        f"\n## {title}\n\n{text.strip()}\n" for title, text in reports.items()
+    )
+
+
+LOCATION = PromptTemplate("location", """
+You are researching a travel destination for a traveler. The origin, destination and
+travel window are given under "Trip details" at the end of this task.
+
+Search for and compile the following information:
+
+1. **Getting There**
+   - Best transport options from the origin to the destination (flight, train, bus, car)
+   - Estimated travel time and approximate cost for each option
+   - Recommended booking platforms or tips
+
+2. **Accommodation**
+   - 2–3 budget options (with approximate price per night in INR or local currency)
+   - 2–3 mid-range options
+   - 1–2 premium/boutique options
+   - Key neighborhoods to stay in and why
+
+3. **Cost of Living & Daily Budget**
+   - Average daily spend for budget / mid-range / comfort traveler
+   - Typical meal costs (street food, local restaurant, upscale)
+   - Local transport costs (auto, taxi, metro if available)
+
+4. **Weather During Travel Dates**
+   - Expected temperature range for the travel window
+   - Any weather advisories or seasonal considerations
+   - What to pack
+
+5. **Practical Info**
+   - Local currency and payment norms (cash vs card)
+   - Language spoken and useful local phrases
+   - Safety tips and areas to avoid
+   - Emergency contacts (police, hospital, tourist helpline)
+
+6. **Events & Festivals**
+   - Any festivals, cultural events, or local happenings during the travel window
+""" + SEARCH_TIP + MARKER_RULE + """
+Output format: a well-structured markdown report with clear headings for each section above.
+Use tables where appropriate (e.g., accommodation options, transport comparison).
+Be specific — include real names, real price ranges, and actionable advice.
+Avoid generic filler. Every sentence should add value to the traveler.
+""", """
+Trip details:
+- Origin: {from_city}
+- Destination: {destination_city}
+- Travel dates: {date_from} to {date_to}
+""")
+
+GUIDE = PromptTemplate("guide", """
+You are creating a personalized local guide to a destination, tailored to the traveler's
+interests. The destination, interests and travel dates are given under "Trip details" at
+the end of this task.
+
+Research and curate the following:
+
+1. **Top Attractions Aligned with Interests**
+   - For each of the traveler's interests, find 3–5 specific places, experiences, or activities
+   - Include name, why it's relevant to the interest, location, opening hours, entry fees
+   - Mix iconic landmarks with lesser-known local favorites
+
+2. **Food & Dining**
+   - 3–5 must-try local dishes or food experiences at the destination
+   - Specific restaurant or street food stall recommendations (name, area, price range)
+   - Any food markets, food streets, or culinary experiences worth visiting
+
+3. **Hidden Gems & Local Tips**
+   - 2–3 places or experiences that most tourists miss but locals love
+   - Best time of day to visit key attractions (to avoid crowds or catch best light)
+   - Any insider tips specific to the destination
+
+4. **Shopping & Souvenirs**
+   - What the destination is famous for buying
+   - Best markets or shopping areas
+   - Price negotiation tips if applicable
+
+5. **Day Trips (if applicable)**
+   - 1–2 nearby destinations worth a half-day or full-day trip
+""" + SEARCH_TIP + MARKER_RULE + """
+Output format: a rich, engaging markdown guide with emojis on section headers.
+Write in a warm, enthusiastic tone — make the traveler excited to explore.
+Be specific: real place names, real addresses or areas, real prices where possible.
+Organize clearly so the traveler can use this as a reference during their trip.
+""", """
+Trip details:
+- Destination: {destination_city}
+- Interests: {interests}
+- Travel dates: {date_from} to {date_to}
+""")
+
+PLANNER = PromptTemplate("planner", """
+Using the destination research and local guide provided by your colleagues, create a complete,
+day-by-day travel itinerary. The destination, the traveler's interests and the arrival and
+departure dates are given under "Trip details" at the end of this task.
+
+Build the itinerary with these principles:
+
+1. **Day-by-Day Structure**
+   - Create a separate plan for each day from arrival to departure
+   - Each day should have a Morning / Afternoon / Evening breakdown with specific times
+   - Include travel time between locations
+   - Balance activity-heavy periods with rest or leisure time
+
+2. **Smart Scheduling**
+   - Day 1: Keep it light — account for arrival fatigue. Focus on nearby, easy experiences
+   - Middle days: Pack in the highlights and interest-specific activities
+   - Last day: Wind down, shopping, and departure prep
+   - Respect opening hours — don't schedule visits to closed attractions
+
+3. **No Repetition Rule** *(strictly enforced)*
+   - Each specific location, attraction, restaurant, or place must appear **at most once** across the entire itinerary
+   - Do NOT revisit or re-suggest the same place on different days under any circumstances
+   - Every day must feature completely different locations from every other day
+   - If you run out of major attractions, suggest nearby neighborhoods, local markets, parks, or day-trip spots — but never repeat
+
+4. **Practical Details for Each Activity**
+   - Name of place + brief description (1–2 sentences)
+   - Estimated time to spend there
+   - How to get there from previous location
+   - Estimated cost
+
+5. **Meals**
+   - Suggest specific breakfast, lunch, and dinner spots for each day
+   - Vary the dining experiences across the trip
+
+6. **Budget Summary**
+   - End with a rough total trip cost breakdown (transport, accommodation, food, activities)
+   - Provide budget / mid-range / comfort estimates
+
+7. **Fixed Day Plan**
+   - If the trip details list places for each day, they were grouped by area and put in
+     visiting order to keep travel short: build each day around its listed places, in that order
+   - Add meals and nearby extras freely, but do not move listed places to other days
+""" + MARKER_RULE + """
+Output format: a beautifully formatted markdown travel plan with the following structure,
+where [Destination] is the destination's name:
+
+# 🌏 Welcome to [Destination]
+[3–4 paragraph introduction to the city — its character, vibe, what makes it special]
+
+---
+
+# 🗓️ Your [Destination] Itinerary
+
+## Day 1 — [Date] · Arrival & First Impressions
+### 🌅 Morning (9:00 AM – 12:00 PM)
+...
+### ☀️ Afternoon (12:00 PM – 5:00 PM)
+...
+### 🌙 Evening (5:00 PM – 9:00 PM)
+...
+
+[Repeat for each day]
+
+---
+
+# 💰 Budget Overview
+| Category | Budget | Mid-Range | Comfort |
+|----------|--------|-----------|---------|
+| ...      | ...    | ...       | ...     |
+
+Use emojis on every section header. Write in a friendly, confident tone.
+Every activity should feel purposeful and connected to the traveler's interests.
+""", """
+Trip details:
+- Destination: {destination_city}
+- Interests: {interests}
+- Arrival: {date_from}
+- Departure: {date_to}
+{day_plan}""")
+
+DAY_BATCH = PromptTemplate("day_batch", """
+You are writing some of the days of a longer itinerary. Colleagues are writing the other days
+at the same time, so write ONLY the days listed under "Days to plan" at the end of this task.
+
+Rules:
+1. Build each day around its allotted places, visiting them in the order listed (when they were
+   grouped by area, that order keeps travel short). Each day needs a Morning / Afternoon / Evening
+   breakdown with specific times, travel time between locations, and breakfast, lunch and dinner spots.
+2. Every place may appear on only ONE day. You may add places that are not allotted (meals, markets,
+   parks), but never any of the places listed as reserved, which belong to other days.
+3. Respect opening hours, and balance busy periods with rest.
+4. Put each activity on its own bullet that STARTS with the place: `- [[Place Name]] — ...`, followed by a
+   1–2 sentence description, time to spend there, how to get there and estimated cost.
+""" + MARKER_RULE + """
+Output format: only the listed day sections, no introduction and no budget, in exactly this format:
+
+## Day N — [Date] · [Theme of the day]
+### 🌅 Morning (9:00 AM – 12:00 PM)
+- [[Place Name]] — ...
+### ☀️ Afternoon (12:00 PM – 5:00 PM)
+...
+### 🌙 Evening (5:00 PM – 9:00 PM)
+...
+""", """
+Trip details: {label} of a {total_days}-day itinerary for {destination_city}.
+- Interests: {interests}
+- Reserved for other days: {reserved}
+
+Days to plan and the places allotted to each:
+{days}
+""")
+
+PLAN_FRAME = PromptTemplate("plan_frame", """
+Colleagues are writing the day-by-day schedule of a trip; the destination, dates and the
+traveler's interests are given under "Trip details" at the end of this task.
+Write only the parts that frame it: an introduction to the city and a budget overview.
+
+The budget overview ends the plan with a rough total trip cost breakdown (transport,
+accommodation, food, activities) with budget / mid-range / comfort estimates.
+Wrap the name of any specific place in double square brackets, e.g. `[[Place Name]]`, and
+do not write URLs.
+
+Output format, where [Destination] is the destination's name:
+
+# 🌏 Welcome to [Destination]
+[3–4 paragraph introduction to the city — its character, vibe, what makes it special]
+
+# 💰 Budget Overview
+| Category | Budget | Mid-Range | Comfort |
+|----------|--------|-----------|---------|
+| ...      | ...    | ...       | ...     |
+
+Use emojis on every section header. Write in a friendly, confident tone.
+""", """
+Trip details:
+- Destination: {destination_city}
+- Interests: {interests}
+- Travel dates: {date_from} to {date_to}
+""")
+
+TEMPLATES = {template.name: template for template in (LOCATION, GUIDE, PLANNER, DAY_BATCH, PLAN_FRAME)}
+
+
+class PromptStats:
+    """Static vs variable prompt tokens per task template, summed over the tasks of a run."""
+
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, template, variable):
+        entry = self.tasks.setdefault(template.name, {"tasks": 0, "static_tokens": 0, "variable_tokens": 0})
+        entry["tasks"] += 1
+        entry["static_tokens"] += template.static_tokens
+        entry["variable_tokens"] += estimate_tokens(variable)
+
+    def to_dict(self):
+        static = sum(entry["static_tokens"] for entry in self.tasks.values())
+        variable = sum(entry["variable_tokens"] for entry in self.tasks.values())
+        return {
+            "tasks": {name: dict(entry) for name, entry in self.tasks.items()},
+            "static_tokens": static,
+            "variable_tokens": variable,
+            "static_share": static / (static + variable) if static + variable else 0.0,
+        }
@@ -0,0 +1,217 @@
+"""
+TravelRateLimiter.py
+--------------------
+Process-wide scheduler for LLM calls. Every agent in every Streamlit session draws
+from the same requests/min and tokens/min budget per model, so concurrent sessions
+are paced ahead of time instead of tripping the provider's 429s.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from TravelConfig import get_int
+
+WINDOW_SECONDS = 60.0
+
+# Rough characters-per-token ratio for English prompts on Llama-family tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Cheap token estimate used for budgeting; no tokenizer download required."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_message_tokens(messages):
+    """Estimates prompt tokens for a string prompt or a list of chat messages."""
+    if isinstance(messages, str):
+        return estimate_tokens(messages)
+    total = 0
+    for message in messages or []:
+        content = message.get("content") if isinstance(message, dict) else message
+        if isinstance(content, list):
+            content = " ".join(str(part.get("text", "")) if isinstance(part, dict) else str(part)
+                               for part in content)
+        # A few tokens of role/formatting overhead per chat message
+        total += estimate_tokens(str(content or "")) + 4
+    return total
+
+
+class Grant:
+    """A slot in the sliding window. Settle it with the real token count after the call."""
+
+    def __init__(self, granted_at, tokens, waited):
+        self.granted_at = granted_at
+        self.tokens = tokens
+        self.waited = waited
+
+
+class RateLimiter:
+    """
+    Sliding-window limiter over requests/min and estimated tokens/min.
+
+    Callers queue per session and sessions are served round-robin, so one session
+    with a long burst of agent iterations cannot starve another. A waiter is
+    granted only when it is at the head of the rotation and the window has room
+    for both one more request and its estimated tokens.
+    """
+
+    def __init__(self, rpm, tpm, window_seconds=WINDOW_SECONDS):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window_seconds = window_seconds
+        self._cond = threading.Condition()
+        self._window = deque()
+        self._queues = OrderedDict()
+        self._rotation = deque()
+        self._granted = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._paused_until = 0.0
+
+    def _prune(self, now):
+        while self._window and now - self._window[0].granted_at >= self.window_seconds:
+            self._window.popleft()
+
+    def _seconds_until_room(self, tokens, now):
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._prune(now)
+        used_tokens = sum(grant.tokens for grant in self._window)
+        # A request larger than the whole budget still goes through on an empty window
+        tokens = min(tokens, self.tpm)
+        if len(self._window) < self.rpm and used_tokens + tokens <= self.tpm:
+            return 0.0
+
+        # Walk the window oldest-first until enough requests and tokens expire
+        freed_tokens = 0
+        for index, grant in enumerate(self._window):
+            freed_tokens += grant.tokens
+            requests_ok = len(self._window) - (index + 1) < self.rpm
+            tokens_ok = used_tokens - freed_tokens + tokens <= self.tpm
+            if requests_ok and tokens_ok:
+                return max(0.0, grant.granted_at + self.window_seconds - now)
+        return self.window_seconds
+
+    def _is_next(self, session_id, ticket):
+        return (
+            self._rotation
+            and self._rotation[0] == session_id
+            and self._queues[session_id][0] is ticket
+        )
+
+    def acquire(self, session_id, tokens):
+        """Blocks until the call fits the budget and it is this session's turn."""
+        ticket = object()
+        enqueued_at = time.monotonic()
+        with self._cond:
+            queue = self._queues.get(session_id)
+            if queue is None:
+                queue = self._queues[session_id] = deque()
+                self._rotation.append(session_id)
+            queue.append(ticket)
+
+            while True:
+                if self._is_next(session_id, ticket):
+                    delay = self._seconds_until_room(tokens, time.monotonic())
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+
+            queue.popleft()
+            self._rotation.popleft()
+            if queue:
+                self._rotation.append(session_id)
+            else:
+                del self._queues[session_id]
+
+            now = time.monotonic()
+            waited = now - enqueued_at
+            grant = Grant(now, tokens, waited)
+            self._window.append(grant)
+            self._granted += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            self._cond.notify_all()
+        return grant
+
+    def pause(self, seconds):
+        """Holds every caller for `seconds`, e.g. after the provider answered 429 with a retry-after."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def settle(self, grant, actual_tokens):
+        """Replaces a grant's estimate with the tokens the call really used."""
+        with self._cond:
+            grant.tokens = actual_tokens
+            self._cond.notify_all()
+
+    def stats(self):
+        """Queue depth and wait-time figures for capacity planning."""
+        with self._cond:
+            now = time.monotonic()
+            self._prune(now)
+            return {
+                "queue_depth": sum(len(queue) for queue in self._queues.values()),
+                "waiting_sessions": len(self._queues),
+                "requests_in_window": len(self._window),
+                "tokens_in_window": sum(grant.tokens for grant in self._window),
+                "rpm_limit": self.rpm,
+                "tpm_limit": self.tpm,
+                "granted": self._granted,
+                "avg_wait": self._total_wait / self._granted if self._granted else 0.0,
+                "max_wait": self._max_wait,
+            }
+
+
+_limiters = {}
+_limiter_lock = threading.Lock()
+_budget_share = 1
+
+
+def set_budget_share(workers):
+    """
+    Gives this process 1/`workers` of the configured budget. Process workers
+    cannot share one window, so each paces itself to its slice instead.
+    """
+    global _budget_share
+    with _limiter_lock:
+        _budget_share = max(1, workers)
+        _limiters.clear()
+
+
+def get_rate_limiter(model=None):
+    """
+    Returns the limiter for `model` shared by every session in this process.
+    Providers such as Groq budget each model separately, so each model gets its
+    own window; LLM_RPM_LIMIT and LLM_TPM_LIMIT apply to every model, divided
+    between process workers when there are several.
+    """
+    with _limiter_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limiter = _limiters[model] = RateLimiter(
+                rpm=max(1, get_int("LLM_RPM_LIMIT", 30) // _budget_share),
+                tpm=max(1, get_int("LLM_TPM_LIMIT", 6000) // _budget_share),
+            )
+        return limiter
+
+
+def limiter_stats():
+    """Queue depth and average wait over the limiters of every model."""
+    with _limiter_lock:
+        limiters = list(_limiters.values())
+    stats = [limiter.stats() for limiter in limiters]
+    granted = sum(entry["granted"] for entry in stats)
+    return {
+        "queue_depth": sum(entry["queue_depth"] for entry in stats),
+        "avg_wait": sum(entry["avg_wait"] * entry["granted"] for entry in stats) / granted if granted else 0.0,
+        "models": len(stats),
+    }
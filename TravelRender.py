@@ -0,0 +1,100 @@
+"""
+TravelRender.py
+---------------
+Post-processing shared by every rendered report and plan.
+Agents mark places as [[Place Name]] instead of writing full Google Maps URLs,
+which keeps dozens of long links out of the generated output; this module
+expands each marker into a correctly URL-encoded Maps link. Plans are also split
+into sections (introduction, one per day, budget) so the UI can show one day at a time.
+"""
+
+import re
+from urllib.parse import quote_plus
+
+MAPS_MARKER = re.compile(r"\[\[([^\[\]\n]{1,120})\]\]")
+MAPS_SEARCH_URL = "https://www.google.com/maps/search/?api=1&query="
+DAY_HEADING = re.compile(r"^\s*#{1,3}\s.*?\bDay\s+(\d+)\b", re.IGNORECASE)
+# A heading that ends the day-by-day part (budget, tips): level 1 or 2, but not a day
+SECTION_HEADING = re.compile(r"^\s*#{1,2}\s")
+RULE = re.compile(r"^\s*(?:-{3,}|\*{3,}|_{3,})\s*$")
+
+
+def maps_url(place, city=""):
+    """Google Maps search URL for a place, qualified by the city when given."""
+    query = f"{place} {city}".strip() if city and city.lower() not in place.lower() else place
+    return MAPS_SEARCH_URL + quote_plus(query)
+
+
+def expand_maps_links(text, city="", label="📍 Maps"):
+    """Replaces every [[Place Name]] marker with 'Place Name [📍 Maps](url)'."""
+    if not text or "[[" not in text:
+        return text
+
+    def replace(match):
+        place = match.group(1).strip()
+        return f"{place} [{label}]({maps_url(place, city)})"
+
+    return MAPS_MARKER.sub(replace, text)
+
+
+def strip_maps_markers(text):
+    """Drops the brackets but keeps the place name, for plain-text consumers."""
+    return MAPS_MARKER.sub(lambda match: match.group(1).strip(), text or "")
+
+
+def marked_places(text):
+    """Place names marked in `text`, in order of first appearance."""
+    seen = {}
+    for match in MAPS_MARKER.finditer(text or ""):
+        seen.setdefault(match.group(1).strip(), None)
+    return list(seen)
+
+
+class PlanSections:
+    """
+    A plan split at its day headings: `intro` (everything before Day 1), `days`
+    as (day number, heading, body) and `outro` (budget and anything after the
+    last day). A plan without day headings is all intro.
+    """
+
+    def __init__(self, intro, days, outro):
+        self.intro = intro
+        self.days = days
+        self.outro = outro
+
+    def day(self, number):
+        """(heading, body) of day `number`, or None."""
+        for day_number, heading, body in self.days:
+            if day_number == number:
+                return heading, body
+        return None
+
+
+def split_plan(text):
+    """Parses a plan's markdown into PlanSections in one pass over its lines."""
+    intro, outro, days = [], [], []
+    current = intro
+    for line in (text or "").splitlines():
+        heading = DAY_HEADING.match(line)
+        if heading and current is not outro:
+            current = []
+            days.append((int(heading.group(1)), line.strip().lstrip("#").strip(), current))
+        elif days and current is not outro and SECTION_HEADING.match(line):
+            current = outro
+            current.append(line)
+        else:
+            current.append(line)
+    return PlanSections(
+        _join(intro),
+        [(number, heading, _join(body)) for number, heading, body in days],
+        _join(outro),
+    )
+
+
+def _join(lines):
+    # Separators between sections belong to neither side
+    while lines and (not lines[-1].strip() or RULE.match(lines[-1])):
+        lines.pop()
+    while lines and (not lines[0].strip() or RULE.match(lines[0])):
+        lines.pop(0)
+    return "\n".join(lines)
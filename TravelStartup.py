@@ -0,0 +1,141 @@
+"""
+TravelStartup.py
+----------------
+Deferred initialization and startup profiling.
+Streamlit re-executes the app script on every widget interaction, so heavy
+dependencies (crewai) and API-key setup are loaded only when a plan
+is actually generated. StartupProfile records where import and rerun time goes.
+"""
+
+import importlib
+import io
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from TravelConfig import get_setting
+
+
+class StartupProfile:
+    """
+    Collects one-off import/initialization costs and per-rerun phase timings.
+    Lives at module level, so it survives Streamlit reruns for the whole process.
+    """
+
+    def __init__(self, max_reruns=50):
+        self.imports = {}
+        self.reruns = deque(maxlen=max_reruns)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, label):
+        """Times a block; only the first (cold) measurement of a label is kept."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.imports.setdefault(label, elapsed)
+
+    def record_rerun(self, phases):
+        with self._lock:
+            self.reruns.append(dict(phases))
+
+    def report(self):
+        """Rows of (section, item, milliseconds) for display."""
+        with self._lock:
+            rows = [("startup", label, seconds * 1000)
+                    for label, seconds in sorted(self.imports.items(), key=lambda item: -item[1])]
+            reruns = list(self.reruns)
+        if reruns:
+            for phase in reruns[-1]:
+                values = [rerun[phase] for rerun in reruns if phase in rerun]
+                rows.append(("last rerun", phase, reruns[-1][phase] * 1000))
+                rows.append((f"avg of {len(values)} reruns", phase, sum(values) / len(values) * 1000))
+        return rows
+
+
+profile = StartupProfile()
+
+_lock = threading.Lock()
+_crewai_ready = False
+_keys_ready = False
+
+
+def _patch_dotenv():
+    # Fix dotenv encoding issue before importing crewai
+    try:
+        import dotenv.parser
+        original_reader_init = dotenv.parser.Reader.__init__
+        def safe_reader_init(self, stream):
+            try:
+                if hasattr(stream, 'read'):
+                    try:
+                        content = stream.read()
+                        if isinstance(content, bytes):
+                            try:
+                                content = content.decode('utf-8')
+                            except UnicodeDecodeError:
+                                content = ""
+                        safe_stream = io.StringIO(content)
+                        original_reader_init(self, safe_stream)
+                    except Exception:
+                        self.string = ""
+                        self.position = dotenv.parser.Position.start()
+                        self.mark = dotenv.parser.Position.start()
+                else:
+                    original_reader_init(self, stream)
+            except Exception:
+                self.string = ""
+                self.position = dotenv.parser.Position.start()
+                self.mark = dotenv.parser.Position.start()
+        dotenv.parser.Reader.__init__ = safe_reader_init
+    except Exception:
+        pass
+
+    try:
+        import dotenv.main
+        original_load = dotenv.main.load_dotenv
+        def safe_load_dotenv(*args, **kwargs):
+            try:
+                return original_load(*args, **kwargs)
+            except Exception:
+                return False
+        dotenv.main.load_dotenv = safe_load_dotenv
+    except Exception:
+        pass
+
+
+def prepare_crewai():
+    """Patches dotenv and imports crewai once. Call before any `from crewai import ...`."""
+    global _crewai_ready
+    with _lock:
+        if _crewai_ready:
+            return
+        with profile.timed("patch dotenv"):
+            _patch_dotenv()
+        with profile.timed("import crewai"):
+            for attempt in range(2):
+                try:
+                    importlib.import_module("crewai")
+                    break
+                except UnicodeDecodeError:
+                    # A .env file that is not UTF-8 can break the first import; the retry succeeds
+                    if attempt:
+                        raise
+        _crewai_ready = True
+
+
+def configure_api_keys():
+    """Copies the Groq and Serper keys from Streamlit secrets into the environment, once."""
+    global _keys_ready
+    with _lock:
+        if _keys_ready:
+            return
+        with profile.timed("configure API keys"):
+            os.environ["GROQ_API_KEY"] = get_setting("GROQ_API", os.getenv("GROQ_API_KEY", ""))
+            os.environ["SERPER_API_KEY"] = get_setting("SERPER_API_KEY", os.getenv("SERPER_API_KEY", ""))
+        _keys_ready = True
@@ -0,0 +1,279 @@
+"""
+TravelTracing.py
+----------------
+Per-run tracing and process-wide metrics.
+A Tracer records timed spans for the crews, tasks, agent reasoning steps, LLM
+requests (with token usage, rate-limit wait and retries) and search calls of one
+run; the trace is returned with the job and can be downloaded as JSON. Finished
+traces are folded into a Metrics registry that is served in the Prometheus text
+format when METRICS_PORT is set.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from TravelConfig import get_int, get_setting
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets for span durations, in seconds
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+METRIC_HELP = {
+    "travel_span_seconds": ("histogram", "Duration of traced spans by kind."),
+    "travel_llm_requests_total": ("counter", "LLM requests by model, step and whether they were a fallback."),
+    "travel_llm_tokens_total": ("counter", "Estimated LLM tokens by model and type."),
+    "travel_llm_retries_total": ("counter", "LLM request retries."),
+    "travel_llm_wait_seconds_total": ("counter", "Seconds LLM calls waited for rate budget."),
+    "travel_search_calls_total": ("counter", "search_internet calls by cache result."),
+    "travel_search_result_tokens_total": ("counter", "Estimated search result tokens before and after filtering."),
+    "travel_jobs_total": ("counter", "Finished crew jobs by status and kind (plan or prefetch)."),
+}
+
+
+class Span:
+    """One timed operation. Times are perf_counter seconds."""
+
+    def __init__(self, name, kind, start, parent_id=None, **attrs):
+        self.id = uuid.uuid4().hex[:12]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = start
+        self.end = None
+        self.thread = threading.current_thread().name
+        self.attrs = attrs
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def to_dict(self, origin):
+        return {
+            "id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start - origin,
+            "end": (self.end or self.start) - origin,
+            "duration": self.duration,
+            "thread": self.thread,
+            "attrs": self.attrs,
+        }
+
+
+class Tracer:
+    """
+    Collects the spans of one run. Safe to use from CrewAI's worker threads;
+    nesting is tracked per thread, so spans opened inside another span on the
+    same thread record it as their parent.
+    """
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # First LLM request of the reasoning step in progress, per thread
+        self._step_started = {}
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name, kind, **attrs):
+        stack = self._stack()
+        span = Span(name, kind, time.perf_counter(), stack[-1].id if stack else None, **attrs)
+        if kind == "llm":
+            self._step_started.setdefault(threading.get_ident(), span.start)
+        stack.append(span)
+        try:
+            yield span
+        except Exception as exc:
+            span.attrs["error"] = f"{type(exc).__name__}: {exc}"[:200]
+            raise
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+            with self._lock:
+                self.spans.append(span)
+
+    def add(self, name, kind, start, end, **attrs):
+        """Records a span measured elsewhere (perf_counter start and end)."""
+        span = Span(name, kind, start, **attrs)
+        span.end = end
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def step_callback(self, agent_role):
+        """
+        Builds an Agent.step_callback recording each reasoning step: from the
+        step's first LLM request to the callback, so it includes any tool call.
+        """
+        def callback(step):
+            now = time.perf_counter()
+            start = self._step_started.pop(threading.get_ident(), now)
+            tool = getattr(step, "tool", None)
+            self.add(f"{agent_role} step", "step", start, now, agent=agent_role,
+                     **({"tool": tool} if tool else {}))
+        return callback
+
+    def totals(self):
+        """Seconds and span count per kind."""
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = totals.setdefault(span.kind, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += span.duration
+        return totals
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "spans": [span.to_dict(self.origin) for span in spans],
+        }
+
+    def export(self, directory=None):
+        """Writes the trace as JSON to TRACE_DIR (if configured); returns the path."""
+        directory = directory or get_setting("TRACE_DIR")
+        if not directory:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.run_id}.json")
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(self.to_dict(), trace_file)
+        return path
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Metrics:
+    """Process-wide counters and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                key, {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0}
+            )
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def observe_trace(self, trace):
+        """Folds a finished run's trace (Tracer.to_dict) into the metrics."""
+        for span in (trace or {}).get("spans", []):
+            self.observe("travel_span_seconds", span["duration"], kind=span["kind"])
+            attrs = span["attrs"]
+            if span["kind"] == "llm":
+                model = attrs.get("model", "")
+                self.inc("travel_llm_requests_total", model=model, step=attrs.get("step", "answer"),
+                         fallback="true" if attrs.get("fallback_from") else "false")
+                self.inc("travel_llm_tokens_total", attrs.get("prompt_tokens", 0), model=model, type="prompt")
+                self.inc("travel_llm_tokens_total", attrs.get("completion_tokens", 0), model=model,
+                         type="completion")
+                self.inc("travel_llm_retries_total", attrs.get("retries", 0))
+                self.inc("travel_llm_wait_seconds_total", attrs.get("wait_seconds", 0.0))
+            elif span["kind"] == "search":
+                self.inc("travel_search_calls_total", cache="hit" if attrs.get("cached") else "miss")
+            elif span["kind"] == "tool" and "tokens_raw" in attrs:
+                self.inc("travel_search_result_tokens_total", attrs["tokens_raw"], type="raw")
+                self.inc("travel_search_result_tokens_total", attrs["tokens_kept"], type="kept")
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: dict(value) for key, value in self._histograms.items()}
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}" if pairs else ""
+
+        lines = []
+        for name, (kind, help_text) in METRIC_HELP.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{fmt(labels)} {value}")
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{name}_sum{fmt(labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{fmt(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+_server = None
+_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port=None):
+    """
+    Serves /metrics on METRICS_PORT from a daemon thread, once per process.
+    Streamlit cannot add routes of its own, so metrics get a separate port.
+    Returns the server, or None when no port is configured.
+    """
+    global _server
+    port = port or get_int("METRICS_PORT", 0)
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as exc:
+                logger.warning("Metrics server not started on port %s: %s", port, exc)
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server
@@ -0,0 +1,142 @@
+"""
+maps_links_benchmark.py
+-----------------------
+Compares LLM-emitted Google Maps links with [[Place]] markers expanded by
+TravelRender.expand_maps_links.
+
+Offline (default): builds an itinerary-shaped text in both formats, counts output
+tokens, converts them to generation time at --tokens-per-second, and times the
+post-processor. With --live, asks the model to write the same list both ways and
+reports real completion tokens and latency (needs GROQ_API_KEY).
+
+    python benchmarks/maps_links_benchmark.py --places 80
+    python benchmarks/maps_links_benchmark.py --live --places 25
+"""
+
+import argparse
+import json
+import sys
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from TravelRateLimiter import estimate_tokens
+from TravelRender import expand_maps_links
+
+SAMPLE_PLACES = [
+    "Meenakshi Amman Temple", "Thirumalai Nayakkar Mahal", "Gandhi Memorial Museum",
+    "Vandiyur Mariamman Teppakulam", "Alagar Kovil", "Thiruparankundram Murugan Temple",
+    "Pazhamudircholai", "Puthu Mandapam", "Koodal Azhagar Temple", "Samanar Hills",
+    "Murugan Idli Shop", "Amma Mess", "Kumar Mess", "Famous Jigarthanda", "Sree Sabarees",
+    "Town Hall Road", "Chithirai Street", "Pudhu Mandapam Market", "Eco Park", "Rajaji Park",
+]
+
+
+def count_tokens(text):
+    """Uses tiktoken when installed, otherwise the limiter's estimate."""
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except Exception:
+        return estimate_tokens(text)
+
+
+def build_texts(places, city):
+    city_query = city.replace(" ", "+")
+    legacy, marked = [], []
+    for index in range(places):
+        place = SAMPLE_PLACES[index % len(SAMPLE_PLACES)]
+        if index >= len(SAMPLE_PLACES):
+            place = f"{place} {index // len(SAMPLE_PLACES) + 1}"
+        place_query = place.replace(" ", "+")
+        description = "A local favourite worth an hour, best visited early in the day."
+        legacy.append(
+            f"- **{place}** — {description} "
+            f"[📍 Maps](https://www.google.com/maps/search/?api=1&query={place_query}+{city_query})"
+        )
+        marked.append(f"- **[[{place}]]** — {description}")
+    return "\n".join(legacy), "\n".join(marked)
+
+
+def offline(places, city, tokens_per_second):
+    legacy, marked = build_texts(places, city)
+    legacy_tokens = count_tokens(legacy)
+    marked_tokens = count_tokens(marked)
+    runs = 200
+    seconds = timeit.timeit(lambda: expand_maps_links(marked, city), number=runs) / runs
+    return {
+        "mode": "offline",
+        "places": places,
+        "tokens_per_second": tokens_per_second,
+        "llm_links": {
+            "output_tokens": legacy_tokens,
+            "est_generation_seconds": legacy_tokens / tokens_per_second,
+        },
+        "markers": {
+            "output_tokens": marked_tokens,
+            "est_generation_seconds": marked_tokens / tokens_per_second,
+            "postprocess_ms": seconds * 1000,
+        },
+        "output_tokens_saved_pct": 100 * (legacy_tokens - marked_tokens) / legacy_tokens,
+    }
+
+
+def live(places, city, model):
+    import litellm
+
+    names = ", ".join(SAMPLE_PLACES[:places])
+    instructions = {
+        "llm_links": (
+            "For each place append a Google Maps link in this exact format: "
+            f"`[📍 Maps](https://www.google.com/maps/search/?api=1&query=PLACE+NAME+{city})` "
+            "Replace spaces with `+` in the URL."
+        ),
+        "markers": "Wrap each place name in double square brackets, e.g. [[Place Name]]. Do not write any URLs.",
+    }
+    report = {"mode": "live", "model": model, "places": places}
+    for variant, instruction in instructions.items():
+        prompt = (
+            f"Write one markdown bullet per place with a one-sentence description, for these places "
+            f"in {city}: {names}. {instruction}"
+        )
+        started = time.perf_counter()
+        response = litellm.completion(model=model, messages=[{"role": "user", "content": prompt}], temperature=0)
+        elapsed = time.perf_counter() - started
+        content = response.choices[0].message.content
+        post_started = time.perf_counter()
+        if variant == "markers":
+            expand_maps_links(content, city)
+        report[variant] = {
+            "output_tokens": response.usage.completion_tokens,
+            "latency_seconds": elapsed,
+            "postprocess_ms": (time.perf_counter() - post_started) * 1000,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--places", type=int, default=60)
+    parser.add_argument("--city", default="Madurai, Tamil Nadu")
+    parser.add_argument("--tokens-per-second", type=float, default=275.0,
+                        help="Generation speed used to turn output tokens into seconds offline")
+    parser.add_argument("--live", action="store_true", help="Call the model instead of estimating")
+    parser.add_argument("--model", default="groq/llama-3.3-70b-versatile")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.live:
+        report = live(min(args.places, len(SAMPLE_PLACES)), args.city, args.model)
+    else:
+        report = offline(args.places, args.city, args.tokens_per_second)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+pipeline_benchmark.py
+---------------------
+Offline benchmark of the full planning pipeline.
+Runs the real TravelAgents / TravelTasks / Crew wiring through TravelCrew.run, with
+a stand-in LLM that replays canned ReAct responses (configurable latency and token
+counts) and a stand-in backend behind the `search_internet` tool, so no Groq or
+Serper calls are made. For every trip length x interest count it reports per-stage
+wall time, LLM calls, tool calls, prompt/completion tokens, peak Python memory and
+time per span kind from the run's trace, and saves the results as JSON so runs can
+be compared over time.
+
+    python benchmarks/pipeline_benchmark.py --days 3 7 14 --interests 1 3 5 --output bench.json
+    python benchmarks/pipeline_benchmark.py --time-scale 0   # pipeline overhead only, no simulated latency
+    python benchmarks/pipeline_benchmark.py --compare old.json new.json
+
+Memory is measured with tracemalloc, which itself slows execution; compare runs
+made with the same flags.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Keep caches and report files out of the working tree, and keep CrewAI offline
+WORKDIR = tempfile.mkdtemp(prefix="travel-bench-")
+os.environ.setdefault("CACHE_PATH", os.path.join(WORKDIR, "cache.sqlite3"))
+os.environ.setdefault("ARTIFACT_DIR", os.path.join(WORKDIR, "runs"))
+os.environ.setdefault("KNOWLEDGE_PATH", os.path.join(WORKDIR, "knowledge.sqlite3"))
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+os.environ.setdefault("SERPER_API_KEY", "offline-benchmark")
+
+from TravelAgents import AgentPool, PacedLLM, set_agent_pool
+from TravelBudgets import FINALIZE_INSTRUCTION
+from TravelCrew import TravelCrew
+from TravelRateLimiter import RateLimiter, estimate_message_tokens, estimate_tokens
+from tools.search_tools import CachedSearchTool, set_search_tool
+
+INTERESTS = [
+    "History & Heritage", "Food & Cuisine", "Nature & Outdoors", "Art & Museums",
+    "Nightlife", "Shopping", "Adventure", "Spirituality",
+]
+SEARCH_MARKER = "[replay-search]"
+START_DATE = date(2026, 3, 2)
+
+# Checked in order: later prompts (planner, compaction) embed earlier outputs
+STAGE_PROMPTS = (
+    ("compaction", "Condense this travel research"),
+    ("frame", "Colleagues are writing the day-by-day schedule"),
+    ("batch", "Colleagues are writing the other days"),
+    ("location", "You are researching"),
+    ("guide", "personalized local guide"),
+    ("planner", "day-by-day travel itinerary"),
+)
+FILLER = ("Arrive early to beat the crowds, carry water, and keep small change for "
+          "entry fees and autos; the area is easy to explore on foot.")
+
+
+def pad(text, tokens):
+    """Appends filler lines until `text` is at least `tokens` (estimated) long."""
+    lines = [text]
+    while estimate_tokens("\n".join(lines)) < tokens:
+        lines.append(FILLER)
+    return "\n".join(lines)
+
+
+def message_text(messages):
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(m.get("content", "")) if isinstance(m, dict) else str(m) for m in messages)
+
+
+class Recorder:
+    """Per-stage LLM usage, shared by every stand-in LLM of a run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def add(self, stage, **counts):
+        with self._lock:
+            entry = self.stages.setdefault(
+                stage, {"calls": 0, "tool_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+            )
+            for name, value in counts.items():
+                entry[name] += value
+
+    def totals(self):
+        with self._lock:
+            totals = {"calls": 0, "tool_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+            for entry in self.stages.values():
+                for name in totals:
+                    totals[name] += entry[name]
+            return totals
+
+
+class ReplayScript:
+    """
+    Decides every stand-in LLM response from the prompt. Research agents search
+    `tool_calls` times before answering, with `queries_per_call` queries per
+    search; final answers are synthesized at the
+    configured sizes, or taken verbatim from `responses` ({stage: text}).
+    """
+
+    def __init__(self, tool_calls=2, queries_per_call=1, report_tokens=900, tokens_per_day=220,
+                 latency=0.2, tokens_per_second=275.0, time_scale=1.0, responses=None):
+        self.tool_calls = tool_calls
+        self.queries_per_call = max(1, queries_per_call)
+        self.report_tokens = report_tokens
+        self.tokens_per_day = tokens_per_day
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.time_scale = time_scale
+        self.responses = responses or {}
+        self.recorder = Recorder()
+
+    def respond(self, messages):
+        text = message_text(messages)
+        stage = next((name for name, phrase in STAGE_PROMPTS if phrase in text), "other")
+        searches = text.count(SEARCH_MARKER) // self.queries_per_call
+
+        # A budget-forced request is answered right away, as the instruction asks
+        forced = FINALIZE_INSTRUCTION in text
+        tool_call = stage in ("location", "guide") and searches < self.tool_calls and not forced
+        if tool_call:
+            query = json.dumps({"search_queries": [
+                f"{stage} research query {searches + 1}.{number + 1}" for number in range(self.queries_per_call)
+            ]})
+            response = f"Thought: I should look this up.\nAction: Search the internet\nAction Input: {query}"
+        elif stage == "compaction":
+            response = self.responses.get(stage) or self._compaction()
+        else:
+            answer = self.responses.get(stage) or getattr(self, f"_{stage}", self._other)(text)
+            response = f"Thought: I now know the final answer\nFinal Answer: {answer}"
+
+        completion_tokens = estimate_tokens(response)
+        self.recorder.add(
+            stage, calls=1, tool_calls=int(tool_call),
+            prompt_tokens=estimate_message_tokens(messages), completion_tokens=completion_tokens,
+        )
+        time.sleep(self.time_scale * (self.latency + completion_tokens / self.tokens_per_second))
+        return response
+
+    def _location(self, prompt):
+        hotels = "\n".join(f"| [[Replay Hotel {i}]] | ₹{1500 * i} | Town Hall Road |" for i in range(1, 6))
+        return pad(
+            "# 🏙️ Destination Research Report\n\n## 🚆 Getting There\n- Train: 8h, ₹600–₹1,800\n\n"
+            f"## 🏨 Accommodation\n| Hotel | Price | Area |\n|---|---|---|\n{hotels}\n\n"
+            "## 🎉 Events & Festivals\n- [[Replay Festival Grounds]] — evening music, open 6 PM – 10 PM\n\n"
+            "## 💰 Cost of Living\n", self.report_tokens,
+        )
+
+    def _guide(self, prompt):
+        match = re.search(r"^- Interests: (.+)$", prompt, flags=re.MULTILINE)
+        interests = [name.strip() for name in (match.group(1) if match else "Sightseeing").split(",")]
+        sections = []
+        for interest in interests:
+            places = "\n".join(
+                f"- **[[{interest} Spot {i}]]** — ₹{50 * i} entry, open 9 AM – 6 PM, in Old Town"
+                for i in range(1, 5)
+            )
+            sections.append(f"## ✨ {interest}\n{places}")
+        food = "\n".join(f"- **[[Replay Eatery {i}]]** — ₹{150 * i} for two, near the temple" for i in range(1, 6))
+        gems = "\n".join(f"- [[Hidden Courtyard {i}]] — quiet at sunrise" for i in range(1, 4))
+        return pad("\n\n".join(sections + [f"## 🍛 Food & Dining\n{food}", f"## 💎 Hidden Gems\n{gems}"]),
+                   self.report_tokens)
+
+    def _day(self, number, places):
+        places = places or [f"Day {number} Landmark"]
+        slots = [("🌅 Morning (9:00 AM – 12:00 PM)", places[0::3]),
+                 ("☀️ Afternoon (12:00 PM – 5:00 PM)", places[1::3]),
+                 ("🌙 Evening (5:00 PM – 9:00 PM)", places[2::3])]
+        body = [f"## Day {number} — Replay date · Exploring"]
+        for title, slot_places in slots:
+            body.append(f"### {title}")
+            body += [f"- [[{place}]] — 1–2 hours, ₹100, 10 min by auto" for place in slot_places]
+        body.append(f"- [[Day {number} Dinner House]] — dinner, ₹400 for two")
+        return pad("\n".join(body), self.tokens_per_day)
+
+    def _planner(self, prompt):
+        arrival = re.search(r"Arrival: (\S+)", prompt)
+        departure = re.search(r"Departure: (\S+)", prompt)
+        try:
+            days = (date.fromisoformat(departure.group(1)) - date.fromisoformat(arrival.group(1))).days + 1
+        except (AttributeError, ValueError):
+            days = 3
+        plan = [self._frame_intro()]
+        plan += [self._day(number, [f"Day {number} Sight {i}" for i in range(1, 4)]) for number in range(1, days + 1)]
+        return "\n\n".join(plan + [self._budget()])
+
+    def _batch(self, prompt):
+        days = re.findall(r"^- Day (\d+) — [^:]*: (.*)$", prompt, flags=re.MULTILINE)
+        return "\n\n".join(
+            self._day(int(number), [] if places == "choose from the research" else places.split(", "))
+            for number, places in days
+        )
+
+    def _frame(self, prompt):
+        return self._frame_intro() + "\n\n" + self._budget()
+
+    def _frame_intro(self):
+        return pad("# 🌏 Welcome to Replay City\n", 250)
+
+    def _budget(self):
+        return ("# 💰 Budget Overview\n| Category | Budget | Mid-Range | Comfort |\n"
+                "|---|---|---|---|\n| Stay | ₹8,000 | ₹20,000 | ₹45,000 |")
+
+    def _compaction(self):
+        return pad("## Digest\n- [[Replay Eatery 1]] · ₹150", 300)
+
+    def _other(self, prompt):
+        return pad("Replay answer.", 200)
+
+
+class ReplayLLM(PacedLLM):
+    """PacedLLM whose provider call is answered by a ReplayScript instead of Groq."""
+
+    def __init__(self, *args, script=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.script = script
+
+    def _complete(self, messages, *args, **kwargs):
+        return self.script.respond(messages)
+
+
+class ReplaySearch:
+    """Stand-in for the Serper client: fixed latency, canned results of a fixed size."""
+
+    def __init__(self, latency=0.3, tokens=400, time_scale=1.0):
+        self.latency = latency
+        self.tokens = tokens
+        self.time_scale = time_scale
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def run(self, search_query, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.time_scale * self.latency)
+        return pad(f"{SEARCH_MARKER} Results for '{search_query}':", self.tokens)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(days, interest_count, args, script, search):
+    script.recorder = Recorder()
+    search.calls = 0
+    crew = TravelCrew(
+        from_city="Chennai",
+        destination_city="Madurai",
+        interests=", ".join(INTERESTS[:interest_count]),
+        date_from=START_DATE,
+        date_to=START_DATE + timedelta(days=days - 1),
+        parallel_research=args.parallel_research,
+        use_stage_cache=False,
+        compact_context=args.compact,
+        chunked_planning=args.chunked,
+        session_id=f"bench-{days}-{interest_count}",
+    )
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    plan = crew.run()
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    return {
+        "days": days,
+        "interests": interest_count,
+        "wall_seconds": wall,
+        "timings": crew.timings,
+        "stages": script.recorder.stages,
+        **script.recorder.totals(),
+        "search_calls": search.calls,
+        "limiter_wait_seconds": crew.llm_stats["wait_seconds"],
+        "peak_memory_mb": peak / 2 ** 20,
+        "plan_tokens": estimate_tokens(plan),
+        "plan_batches": crew.batch_stats,
+        "trace_totals": crew.tracer.totals(),
+    }
+
+
+def compare(old_path, new_path):
+    """Prints wall time and token deltas between two saved result files."""
+    old, new = (json.loads(Path(path).read_text(encoding="utf-8")) for path in (old_path, new_path))
+    baseline = {(row["days"], row["interests"]): row for row in old["results"]}
+    print(f"{'days':>4} {'int':>3} {'wall old':>9} {'wall new':>9} {'Δ%':>7} {'tokens old':>11} {'tokens new':>11}")
+    for row in new["results"]:
+        before = baseline.get((row["days"], row["interests"]))
+        if before is None:
+            continue
+        tokens_before = before["prompt_tokens"] + before["completion_tokens"]
+        tokens_after = row["prompt_tokens"] + row["completion_tokens"]
+        change = 100 * (row["wall_seconds"] - before["wall_seconds"]) / before["wall_seconds"]
+        print(f"{row['days']:>4} {row['interests']:>3} {before['wall_seconds']:>9.2f} "
+              f"{row['wall_seconds']:>9.2f} {change:>+7.1f} {tokens_before:>11,} {tokens_after:>11,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 7, 14], help="Trip lengths to run")
+    parser.add_argument("--interests", type=int, nargs="+", default=[1, 3, 5], help="Interest counts to run")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per matrix cell")
+    parser.add_argument("--latency", type=float, default=0.2, help="LLM seconds per call before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=275.0, help="LLM generation speed")
+    parser.add_argument("--report-tokens", type=int, default=900, help="Size of each research report")
+    parser.add_argument("--tokens-per-day", type=int, default=220, help="Size of each itinerary day")
+    parser.add_argument("--tool-calls", type=int, default=2, help="Searches per research task")
+    parser.add_argument("--queries-per-call", type=int, default=1, help="Queries batched into each search")
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--search-tokens", type=int, default=400)
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Multiplies every simulated delay; 0 measures pipeline overhead only")
+    parser.add_argument("--rpm", type=int, default=100000, help="Rate limiter requests/min (30 mimics Groq free tier)")
+    parser.add_argument("--tpm", type=int, default=10 ** 9, help="Rate limiter tokens/min (6000 mimics Groq free tier)")
+    parser.add_argument("--responses", help="JSON file of {stage: final answer} to replay instead of synthesized ones")
+    parser.add_argument("--sequential-research", dest="parallel_research", action="store_false")
+    parser.add_argument("--compact", action="store_true", help="Enable context compaction")
+    parser.add_argument("--no-chunked", dest="chunked", action="store_false", help="Disable day-batch planning")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two saved result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    output = Path(args.output).resolve() if args.output else None
+    responses = json.loads(Path(args.responses).read_text(encoding="utf-8")) if args.responses else None
+    script = ReplayScript(
+        tool_calls=args.tool_calls, queries_per_call=args.queries_per_call,
+        report_tokens=args.report_tokens, tokens_per_day=args.tokens_per_day, latency=args.latency,
+        tokens_per_second=args.tokens_per_second, time_scale=args.time_scale, responses=responses,
+    )
+    search = ReplaySearch(latency=args.search_latency, tokens=args.search_tokens, time_scale=args.time_scale)
+    limiter = RateLimiter(rpm=args.rpm, tpm=args.tpm)
+    set_search_tool(CachedSearchTool(backend=search, cache=None))
+    set_agent_pool(AgentPool(llm_factory=lambda **settings: ReplayLLM(script=script, limiter=limiter, **settings)))
+
+    os.chdir(WORKDIR)
+    tracemalloc.start()
+    results = []
+    print(f"{'days':>4} {'int':>3} {'wall s':>7} {'loc':>6} {'guide':>6} {'plan':>6} "
+          f"{'calls':>5} {'tools':>5} {'prompt tok':>10} {'compl tok':>9} {'peak MB':>7}")
+    for days in args.days:
+        for interest_count in args.interests:
+            for _ in range(args.repeat):
+                row = run_case(days, interest_count, args, script, search)
+                results.append(row)
+                timings = row["timings"]
+                print(f"{days:>4} {interest_count:>3} {row['wall_seconds']:>7.2f} {timings['location']:>6.2f} "
+                      f"{timings['guide']:>6.2f} {timings['planner']:>6.2f} {row['calls']:>5} "
+                      f"{row['search_calls']:>5} {row['prompt_tokens']:>10,} "
+                      f"{row['completion_tokens']:>9,} {row['peak_memory_mb']:>7.1f}")
+    tracemalloc.stop()
+
+    report = {
+        "benchmark": "pipeline",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        "results": results,
+    }
+    if output:
+        output.write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
+        print(f"Saved {len(results)} results to {output}")
+
+
+if __name__ == "__main__":
+    main()
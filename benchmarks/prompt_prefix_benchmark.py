@@ -0,0 +1,170 @@
+"""
+prompt_prefix_benchmark.py
+--------------------------
+Measures what the static-prefix task prompts (TravelPrompts) gain from provider
+prompt-prefix caching, against the old layout with the trip details first.
+
+Offline (default): renders the location, guide and planner prompts of several
+trips in both layouts and replays them as a stream of agent requests, each
+iteration adding one search observation. A request's cached tokens are the
+prefix it shares with any earlier request (rounded down to --cache-block and
+counted from --min-cached-tokens, like provider caches). Time-to-first-token is
+estimated as --latency plus uncached prompt tokens at --prefill-tokens-per-second.
+With --live, streams the same first requests to the model in both layouts and
+reports measured time-to-first-token and the cached tokens the provider reports
+(needs GROQ_API_KEY and a model with prompt caching).
+
+    python benchmarks/prompt_prefix_benchmark.py --trips 6 --iterations 4
+    python benchmarks/prompt_prefix_benchmark.py --live --model groq/moonshotai/kimi-k2-instruct-0905
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from TravelPrompts import EXPECTED_OUTPUT, GUIDE, LOCATION, PLANNER
+from TravelRateLimiter import CHARS_PER_TOKEN, estimate_tokens
+
+TRIPS = [
+    ("Chennai", "Madurai", "History & Heritage, Food & Cuisine", "2026-03-02", "2026-03-05"),
+    ("Bengaluru", "Mysuru", "Art & Museums", "2026-04-10", "2026-04-12"),
+    ("Mumbai", "Goa", "Nightlife, Nature & Outdoors, Food & Cuisine", "2026-12-20", "2026-12-27"),
+    ("Delhi", "Jaipur", "Shopping, History & Heritage", "2026-11-01", "2026-11-04"),
+    ("Kolkata", "Darjeeling", "Nature & Outdoors, Adventure", "2026-05-15", "2026-05-20"),
+    ("Hyderabad", "Hampi", "History & Heritage, Spirituality", "2026-01-08", "2026-01-10"),
+]
+OBSERVATION = ("Search results: opening hours, entry fees and prices vary by season; "
+               "the old town is walkable and autos are cheap for short hops.")
+
+
+def task_prompts(trip):
+    """(stage, static, variable) for the three tasks of one trip; the planner gets stand-in reports."""
+    from_city, destination, interests, date_from, date_to = trip
+    reports = {"Destination Research Report": f"Research on {destination}. " + OBSERVATION * 20,
+               "Local Guide": f"Guide to {destination} for {interests}. " + OBSERVATION * 20}
+    return [
+        ("location",) + LOCATION.render(from_city=from_city, destination_city=destination,
+                                        date_from=date_from, date_to=date_to),
+        ("guide",) + GUIDE.render(destination_city=destination, interests=interests,
+                                  date_from=date_from, date_to=date_to),
+        ("planner",) + PLANNER.render(reports=reports, destination_city=destination, interests=interests,
+                                      date_from=date_from, date_to=date_to, day_plan=""),
+    ]
+
+
+def system_prompt(stage, tokens):
+    """Stand-in for the agent's system prompt (role, backstory, tools, ReAct format), static per stage."""
+    text = f"You are the {stage} agent.\n"
+    return text + "Answer in the ReAct format with Thought, Action and Final Answer. " * max(
+        0, tokens * CHARS_PER_TOKEN // 66)
+
+
+def task_message(static, variable, layout):
+    # The old prompts named the trip in their first line, so nothing after it was shared
+    description = static + variable if layout == "static_prefix" else variable + static
+    return f"Current Task: {description}\n\nThis is the expected criteria for your final answer: {EXPECTED_OUTPUT}"
+
+
+def requests_for(layout, trips, iterations, system_tokens):
+    """Every agent request of the run, in order: each iteration re-sends the task plus new observations."""
+    requests = []
+    for trip in trips:
+        for stage, static, variable in task_prompts(trip):
+            prompt = system_prompt(stage, system_tokens) + "\n" + task_message(static, variable, layout)
+            for iteration in range(iterations if stage != "planner" else 1):
+                requests.append(prompt + "".join(
+                    f"\nObservation {step + 1} for {trip[1]}: {OBSERVATION}" for step in range(iteration)
+                ))
+    return requests
+
+
+def cached_tokens(prompt, earlier, block, minimum):
+    shared = max((len(os.path.commonprefix([prompt, other])) for other in earlier), default=0)
+    tokens = shared // CHARS_PER_TOKEN // block * block
+    return tokens if tokens >= minimum else 0
+
+
+def offline(args):
+    trips = (TRIPS * (args.trips // len(TRIPS) + 1))[:args.trips]
+    report = {"mode": "offline", "trips": len(trips), "iterations": args.iterations,
+              "static_tokens": {template.name: template.static_tokens for template in (LOCATION, GUIDE, PLANNER)}}
+    for layout in ("variables_first", "static_prefix"):
+        requests = requests_for(layout, trips, args.iterations, args.system_tokens)
+        prompt_total = cached_total = 0
+        ttft = []
+        for index, prompt in enumerate(requests):
+            tokens = estimate_tokens(prompt)
+            cached = min(tokens, cached_tokens(prompt, requests[:index], args.cache_block, args.min_cached_tokens))
+            prompt_total += tokens
+            cached_total += cached
+            ttft.append(args.latency + (tokens - cached) / args.prefill_tokens_per_second)
+        report[layout] = {
+            "requests": len(requests),
+            "prompt_tokens": prompt_total,
+            "cached_tokens": cached_total,
+            "cached_share": cached_total / prompt_total,
+            "est_avg_ttft_seconds": sum(ttft) / len(ttft),
+        }
+    before, after = report["variables_first"], report["static_prefix"]
+    report["ttft_change_pct"] = 100 * (after["est_avg_ttft_seconds"] - before["est_avg_ttft_seconds"]) \
+        / before["est_avg_ttft_seconds"]
+    return report
+
+
+def live(args):
+    import litellm
+
+    trips = TRIPS[:max(2, args.trips)]
+    report = {"mode": "live", "model": args.model, "trips": len(trips)}
+    for layout in ("variables_first", "static_prefix"):
+        ttft, cached = [], 0
+        for trip in trips:
+            for stage, static, variable in task_prompts(trip)[:2]:
+                messages = [{"role": "system", "content": system_prompt(stage, args.system_tokens)},
+                            {"role": "user", "content": task_message(static, variable, layout)}]
+                started = time.perf_counter()
+                first = None
+                usage = None
+                for chunk in litellm.completion(model=args.model, messages=messages, temperature=0,
+                                                max_tokens=16, stream=True,
+                                                stream_options={"include_usage": True}):
+                    if first is None:
+                        first = time.perf_counter() - started
+                    usage = getattr(chunk, "usage", None) or usage
+                ttft.append(first)
+                details = getattr(usage, "prompt_tokens_details", None)
+                cached += getattr(details, "cached_tokens", 0) or 0
+        report[layout] = {"requests": len(ttft), "avg_ttft_seconds": sum(ttft) / len(ttft),
+                          "cached_tokens": cached}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trips", type=int, default=6, help="Different trips planned one after another")
+    parser.add_argument("--iterations", type=int, default=4, help="Requests per research agent")
+    parser.add_argument("--system-tokens", type=int, default=600, help="Size of the agent system prompt")
+    parser.add_argument("--latency", type=float, default=0.15, help="Seconds to first token for an empty prompt")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=4000.0,
+                        help="Prompt processing speed for uncached tokens")
+    parser.add_argument("--cache-block", type=int, default=128, help="Granularity of provider prefix caching")
+    parser.add_argument("--min-cached-tokens", type=int, default=1024, help="Shortest prefix a provider caches")
+    parser.add_argument("--live", action="store_true", help="Stream real requests instead of estimating")
+    parser.add_argument("--model", default="groq/llama-3.3-70b-versatile")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = live(args) if args.live else offline(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import datetime
+
+from TravelArtifacts import FAILED, ArtifactStore
+
+INPUTS = {
+    "from_city": "Chennai",
+    "destination_city": "Madurai",
+    "interests": "temples, food",
+    "date_from": datetime.date(2026, 1, 10),
+    "date_to": datetime.date(2026, 1, 12),
+}
+
+
+def failed_run(store, run_id, inputs):
+    store.begin(run_id, inputs)
+    store.save(run_id, "location.md", "research")
+    store.finish(run_id, FAILED, error="timeout")
+
+
+def test_artifacts_round_trip(tmp_path):
+    store = ArtifactStore(root=str(tmp_path))
+    store.begin("run-1", INPUTS)
+    store.save("run-1", "planner.md", "# Plan")
+    store.finish("run-1", "done")
+    assert store.load("run-1", "planner.md") == "# Plan"
+    assert store.load("run-1", "guide.md") is None
+    assert [run["run_id"] for run in store.list_runs(destination=" MADURAI ")] == ["run-1"]
+
+
+def test_find_failed_matches_inputs_like_the_stage_cache(tmp_path):
+    store = ArtifactStore(root=str(tmp_path))
+    failed_run(store, "run-1", INPUTS)
+    rerun = dict(INPUTS, from_city="  chennai", destination_city="MADURAI ",
+                 interests="Food,  Temples", date_from="2026-01-10")
+    run = store.find_failed(rerun, 3600)
+    assert run["run_id"] == "run-1"
+    assert run["artifacts"] == ["location.md"]
+
+
+def test_find_failed_ignores_other_trips_and_old_runs(tmp_path):
+    store = ArtifactStore(root=str(tmp_path))
+    failed_run(store, "run-1", INPUTS)
+    assert store.find_failed(dict(INPUTS, interests="temples"), 3600) is None
+    assert store.find_failed(dict(INPUTS, date_to=datetime.date(2026, 1, 13)), 3600) is None
+    assert store.find_failed(INPUTS, -1) is None
@@ -0,0 +1,89 @@
+import json
+import os
+from datetime import date
+
+import pytest
+
+from TravelBatch import (
+    BatchRequestError,
+    BatchRunner,
+    load_requests,
+    normalize_request,
+    read_requests,
+    request_id,
+)
+
+TRIP = {"from": "Chennai", "destination": "Madurai", "interests": "Food", "start": "2026-03-02",
+        "end": "2026-03-05"}
+
+
+def test_aliases_and_dates_are_normalized():
+    request, params = normalize_request({" From ": " Chennai ", "Destination": "Madurai",
+                                         "interests": ["Food", " Art "], "start": "2026-03-02",
+                                         "end": "2026-03-05"})
+    assert params == {"from_city": "Chennai", "destination_city": "Madurai", "interests": "Food, Art",
+                      "date_from": date(2026, 3, 2), "date_to": date(2026, 3, 5)}
+    assert request == request_id(params)
+    assert request.startswith("madurai-20260302-")
+
+
+def test_request_id_is_stable():
+    assert normalize_request(dict(TRIP))[0] == normalize_request(dict(TRIP))[0]
+
+
+@pytest.mark.parametrize("change, message", [
+    ({"interests": ""}, "missing interests"),
+    ({"start": "02/03/2026"}, "bad date"),
+    ({"end": "2026-03-01"}, "before"),
+])
+def test_invalid_requests_are_rejected(change, message):
+    with pytest.raises(BatchRequestError, match=message):
+        normalize_request({**TRIP, **change})
+
+
+def test_csv_row_with_extra_cells(tmp_path):
+    path = tmp_path / "trips.csv"
+    path.write_text("from,destination,interests,start,end\n"
+                    "Chennai,Madurai,Food,2026-03-02,2026-03-05,extra\n", encoding="utf-8")
+    ((line_number, raw),) = list(read_requests(str(path)))
+    assert line_number == 2
+    assert raw[None] == ["extra"]
+    assert normalize_request(raw)[1]["destination_city"] == "Madurai"
+
+
+@pytest.mark.parametrize("given, expected", [
+    ("madurai-spring", "madurai-spring"),
+    ("../x", "x"),
+    ("/etc/passwd", "etc-passwd"),
+    ("a/../../b", "a-..-..-b"),
+    (42, "42"),
+])
+def test_ids_are_reduced_to_file_names(given, expected):
+    assert normalize_request({**TRIP, "id": given})[0] == expected
+
+
+def test_id_without_usable_characters_falls_back_to_derived_id(tmp_path):
+    request, params = normalize_request({**TRIP, "id": "../"})
+    assert request == request_id(params)
+    runner = BatchRunner(str(tmp_path))
+    assert os.path.dirname(runner.status_path(request)) == str(tmp_path)
+
+
+def test_duplicate_ids_are_reported_with_their_line(tmp_path, capsys):
+    path = tmp_path / "trips.jsonl"
+    other = {**TRIP, "destination": "Thanjavur"}
+    path.write_text("\n".join([
+        json.dumps({**TRIP, "id": "spring"}),
+        json.dumps(TRIP),
+        json.dumps({**other, "id": "spring"}),
+        "",
+        json.dumps(TRIP),
+    ]) + "\n", encoding="utf-8")
+    requests = load_requests(str(path))
+    assert [request for request, _ in requests] == ["spring", normalize_request(TRIP)[0]]
+    assert requests[0][1]["destination_city"] == TRIP["destination"]
+    errors = capsys.readouterr().err.splitlines()
+    assert errors == [
+        f"Skipping duplicate request id 'spring' at {path}:3 (first used on line 1)",
+        f"Skipping duplicate request id {normalize_request(TRIP)[0]!r} at {path}:5 (first used on line 2)",
+    ]
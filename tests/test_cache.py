@@ -0,0 +1,82 @@
+import pytest
+
+import TravelCache
+from TravelCache import DiskCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(TravelCache.time, "time", clock.time)
+    return clock
+
+
+def test_values_round_trip_per_namespace(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    search, geocode = DiskCache("search", path=path), DiskCache("geocode", path=path)
+    search.set("madurai", {"results": ["a", "b"]})
+    assert search.get("madurai") == {"results": ["a", "b"]}
+    assert geocode.get("madurai") is None
+    assert search.stats()["hits"] == 1
+    assert geocode.stats()["misses"] == 1
+
+
+def test_entries_expire_after_their_ttl(tmp_path, clock):
+    cache = DiskCache("search", ttl_seconds=60, path=str(tmp_path / "cache.sqlite3"))
+    cache.set("short", 1, ttl_seconds=10)
+    cache.set("default", 2)
+    clock.now += 30
+    assert cache.get("short") is None
+    assert cache.get("default") == 2
+    clock.now += 31
+    assert cache.get("default") is None
+    assert len(cache) == 0
+
+
+def test_no_ttl_never_expires(tmp_path, clock):
+    cache = DiskCache("search", ttl_seconds=None, path=str(tmp_path / "cache.sqlite3"))
+    cache.set("key", "value")
+    clock.now += 10 ** 9
+    assert cache.get("key") == "value"
+
+
+def test_zero_ttl_stores_nothing(tmp_path, clock):
+    cache = DiskCache("search", ttl_seconds=60, path=str(tmp_path / "cache.sqlite3"))
+    cache.set("key", "old")
+    cache.set("key", "new", ttl_seconds=0)
+    assert cache.get("key") is None
+    off = DiskCache("stages", ttl_seconds=0, path=str(tmp_path / "cache.sqlite3"))
+    off.set("key", "value")
+    assert len(off) == 0
+
+
+def test_size_excludes_expired_rows(tmp_path, clock):
+    cache = DiskCache("search", ttl_seconds=60, path=str(tmp_path / "cache.sqlite3"))
+    cache.set("a", 1, ttl_seconds=10)
+    cache.set("b", 2)
+    clock.now += 30
+    assert len(cache) == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_read_entries_are_evicted(tmp_path, clock):
+    cache = DiskCache("search", max_entries=2, path=str(tmp_path / "cache.sqlite3"))
+    cache.set("a", 1)
+    clock.now += 1
+    cache.set("b", 2)
+    clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
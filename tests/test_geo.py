@@ -0,0 +1,159 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import TravelGeo
+from TravelCache import DiskCache
+from TravelGeo import (
+    CachedGeocoder,
+    Gazetteer,
+    balanced_kmeans,
+    day_capacities,
+    geo_planning_default,
+    locate_places,
+    order_route,
+    pairwise,
+    plan_days,
+    route_length,
+)
+
+# Three neighbourhoods about 5 km apart, three places each (lat, lon near Madurai)
+AREAS = {"north": (9.97, 78.12), "east": (9.92, 78.17), "south": (9.87, 78.12)}
+POINTS = {f"{area} {index}": (lat + 0.002 * index, lon + 0.002 * index)
+          for area, (lat, lon) in AREAS.items() for index in range(3)}
+
+
+class TableGeocoder:
+    def __init__(self, points):
+        self.points = points
+        self.calls = 0
+
+    def locate(self, place, city):
+        self.calls += 1
+        return self.points.get(place)
+
+
+class FailingGeocoder:
+    def locate(self, place, city):
+        raise OSError("offline")
+
+
+def test_day_capacities_are_balanced_with_light_edge_days():
+    assert list(day_capacities(5, 8)) == [1, 2, 2, 2, 1]
+    assert list(day_capacities(2, 5)) == [3, 2]
+    assert day_capacities(4, 2).sum() == 2
+
+
+def test_balanced_kmeans_finds_the_areas():
+    xy = TravelGeo.project(np.array(list(POINTS.values())))
+    labels = balanced_kmeans(xy, np.array([3, 3, 3]))
+    groups = {tuple(sorted(name.split()[0] for name, label in zip(POINTS, labels) if label == cluster))
+              for cluster in range(3)}
+    assert groups == {("east",) * 3, ("north",) * 3, ("south",) * 3}
+
+
+def test_balanced_kmeans_respects_capacities():
+    xy = np.array([[0, 0], [0.1, 0], [0.2, 0], [0.3, 0], [10, 0]], dtype=float)
+    labels = balanced_kmeans(xy, np.array([2, 3]))
+    assert sorted(np.bincount(labels)) == [2, 3]
+
+
+def test_order_route_is_optimal_on_small_inputs():
+    rng = np.random.default_rng(7)
+    xy = rng.uniform(0, 10, size=(7, 2))
+    order, length = order_route(xy)
+    assert sorted(order) == list(range(7))
+    distance = pairwise(xy, xy)
+    best = min(route_length(np.array(path), distance) for path in itertools.permutations(range(7)))
+    assert length == pytest.approx(route_length(np.array(order), distance))
+    assert length <= best * 1.05
+
+
+def test_order_route_small_inputs():
+    assert order_route(np.zeros((0, 2)))[0] == []
+    assert order_route(np.array([[0.0, 0.0], [3.0, 4.0]])) == ([0, 1], 5.0)
+
+
+def test_locate_places_drops_far_outliers():
+    points = dict(POINTS, **{"Meenakshi Temple": (13.08, 80.27)})  # a same-named place in Chennai
+    located = locate_places(list(points), "Madurai", TableGeocoder(points), budget_seconds=5)
+    assert "Meenakshi Temple" not in located
+    assert len(located) == len(POINTS)
+
+
+def test_plan_days_groups_each_day_by_area():
+    # Two full days (no arrival or departure weighting), so each area fills one day
+    places = [name for name in POINTS if not name.startswith("east")] + ["Unknown Cafe"]
+    plan = plan_days(places, 2, "Madurai", geocoder=TableGeocoder(POINTS), budget_seconds=5)
+    areas = [{name.split()[0] for name in plan.days[number] if name != "Unknown Cafe"} for number in (1, 2)]
+    assert sorted(map(sorted, areas)) == [["north"], ["south"]]
+    assert plan.unlocated == ["Unknown Cafe"]
+    assert sum(len(names) for names in plan.days.values()) == len(places)
+    assert plan.stats() == {"places": 7, "located": 6, "days": 2, "route_km": plan.stats()["route_km"]}
+    # Each day's stops are in route order along the diagonal they lie on
+    for names in plan.days.values():
+        indexes = [int(name.split()[1]) for name in names if name != "Unknown Cafe"]
+        assert indexes in ([0, 1, 2], [2, 1, 0])
+    # The same inputs always give the same days
+    assert plan_days(places, 2, "Madurai", geocoder=TableGeocoder(POINTS), budget_seconds=5).days == plan.days
+
+
+def test_plan_days_keeps_edge_days_light():
+    plan = plan_days(list(POINTS), 3, "Madurai", geocoder=TableGeocoder(POINTS), budget_seconds=5)
+    assert [len(plan.days[number]) for number in (1, 2, 3)] == [2, 5, 2]
+
+
+def test_plan_days_gives_up_when_too_few_places_are_located():
+    sparse = {name: POINTS[name] for name in list(POINTS)[:3]}
+    assert plan_days(list(POINTS), 3, "Madurai", geocoder=TableGeocoder(sparse), budget_seconds=5) is None
+    assert plan_days(list(POINTS), 3, "Madurai", geocoder=TableGeocoder({}), budget_seconds=5) is None
+
+
+def test_gazetteer_reads_csv_and_matches_city(tmp_path):
+    path = tmp_path / "gazetteer.csv"
+    path.write_text("name,city,lat,lon\nThe Meenakshi Temple,Madurai,9.9195,78.1193\nBad row,Madurai,x,y\n"
+                    "Marina Beach,,13.05,80.28\n", encoding="utf-8")
+    gazetteer = Gazetteer(str(path))
+    assert gazetteer.locate("meenakshi temple", "Madurai, Tamil Nadu") == (9.9195, 78.1193)
+    assert gazetteer.locate("Meenakshi Temple", "Chennai") is None
+    # Rows without a city match any city
+    assert gazetteer.locate("Marina Beach", "Chennai") == (13.05, 80.28)
+    assert Gazetteer(str(tmp_path / "missing.csv")).points == {}
+
+
+def test_gazetteer_answers_and_empty_fallback_are_not_cached(tmp_path):
+    empty = CachedGeocoder(Gazetteer(str(tmp_path / "missing.csv")))
+    assert empty.cache is None
+    assert empty.locate("Meenakshi Temple", "Madurai") is None
+
+    cache = DiskCache("geocode", path=str(tmp_path / "cache.sqlite3"))
+    live = TableGeocoder({"north 0": POINTS["north 0"]})
+    geocoder = CachedGeocoder(TableGeocoder({"south 0": POINTS["south 0"]}), [live], cache=cache)
+    assert geocoder.locate("south 0", "Madurai") == POINTS["south 0"]
+    assert len(cache) == 0
+    assert geocoder.locate("north 0", "Madurai") == POINTS["north 0"]
+    assert geocoder.locate("nowhere", "Madurai") is None
+    assert geocoder.locate("north 0", "Madurai") == POINTS["north 0"]
+    assert geocoder.locate("nowhere", "Madurai") is None
+    # Live answers, misses included, are looked up once
+    assert live.calls == 2
+    assert len(cache) == 2
+
+
+def test_failed_live_lookups_are_not_cached(tmp_path):
+    cache = DiskCache("geocode", path=str(tmp_path / "cache.sqlite3"))
+    geocoder = CachedGeocoder(None, [FailingGeocoder()], cache=cache)
+    assert geocoder.locate("north 0", "Madurai") is None
+    assert len(cache) == 0
+
+
+def test_geo_planning_is_on_only_when_places_can_be_located(tmp_path, monkeypatch):
+    monkeypatch.delenv("GEOCODER", raising=False)
+    monkeypatch.setenv("GAZETTEER_PATH", str(tmp_path / "gazetteer.csv"))
+    assert not geo_planning_default()
+    (tmp_path / "gazetteer.csv").write_text("name,city,lat,lon\n", encoding="utf-8")
+    assert geo_planning_default()
+    monkeypatch.setenv("GAZETTEER_PATH", str(tmp_path / "missing.csv"))
+    monkeypatch.setenv("GEOCODER", "nominatim")
+    assert geo_planning_default()
@@ -0,0 +1,52 @@
+from datetime import date
+
+from TravelItinerary import (
+    assemble_plan,
+    candidate_places,
+    merge_day_batches,
+    partition_days,
+    place_key,
+    trip_days,
+)
+
+
+def test_place_key_ignores_case_punctuation_and_leading_article():
+    assert place_key("The Meenakshi  Temple!") == place_key("meenakshi temple")
+
+
+def test_candidate_places_skip_logistics_sections():
+    guide = "## Top Attractions\n- [[Meenakshi Temple]] and [[Thirumalai Nayak Palace]]\n"
+    location = "## Accommodation\n- [[Hotel Madurai]]\n## Events\n- Festival at [[the meenakshi temple]]\n"
+    assert candidate_places([guide, location]) == ["Meenakshi Temple", "Thirumalai Nayak Palace"]
+
+
+def test_partition_days_keeps_arrival_and_departure_light():
+    dates = trip_days("2026-03-01", "2026-03-05")
+    batches = partition_days(dates, [f"P{index}" for index in range(3)], batch_days=2)
+    assert [batch.label for batch in batches] == ["Days 1–2", "Days 3–4", "Day 5"]
+    places = {number: batch.places[number] for batch in batches for number in batch.places}
+    assert places == {1: [], 2: ["P0"], 3: ["P1"], 4: ["P2"], 5: []}
+
+
+def test_partition_days_uses_fixed_day_places():
+    dates = trip_days(date(2026, 3, 1), date(2026, 3, 3))
+    batches = partition_days(dates, ["A", "B", "C"], batch_days=3, day_places={1: ["C"], 2: ["B", "A"], 3: []})
+    assert batches[0].places == {1: ["C"], 2: ["B", "A"], 3: []}
+
+
+def test_merge_drops_repeated_places_and_unmarks_passing_references():
+    first = "Intro to drop\n## Day 1 — Mar 1\n- [[Temple]] — visit\n- [[Market]] — walk from [[Temple]]\n"
+    second = ("## Day 2 — Mar 2\n- [[Temple]] — again\n- [[Palace]] — near [[Market]] and [[Park]]\n")
+    markdown, dropped = merge_day_batches([first, second])
+    assert dropped == ["Temple"]
+    assert "Intro to drop" not in markdown
+    assert "again" not in markdown
+    # Market belongs to day 1, so day 2 only names it; Park is unclaimed and keeps its marker
+    assert "- [[Palace]] — near Market and [[Park]]" in markdown
+    assert "- [[Market]] — walk from [[Temple]]" in markdown
+
+
+def test_assemble_plan_puts_days_between_intro_and_budget():
+    frame = "# 🌏 Welcome to Madurai\nIntro\n\n---\n\n# 💰 Budget Overview\n| a |"
+    plan = assemble_plan(frame, "## Day 1 — Mar 1\n- x", "Madurai")
+    assert plan.index("Welcome") < plan.index("Your Madurai Itinerary") < plan.index("Budget Overview")
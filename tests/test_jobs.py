@@ -0,0 +1,43 @@
+from concurrent.futures import Future
+
+import pytest
+
+import TravelJobs
+from TravelJobs import DONE, QUEUED, RUNNING, JobManager
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(TravelJobs, "stage_key", lambda stage, **params: "research")
+    manager = JobManager(max_workers=1)
+    # Jobs are driven by hand; nothing is submitted to the pool
+    monkeypatch.setattr(manager, "_start", lambda job: None)
+    yield manager
+    manager._executor.shutdown()
+
+
+def finished_future(report):
+    future = Future()
+    future.set_result(report)
+    return future
+
+
+def test_started_moves_a_queued_job_to_running(manager):
+    job = manager.get(manager.submit({"destination_city": "Madurai"}, "session"))
+    assert job.status == QUEUED
+    manager._handle_event(job.id, "started", None)
+    assert job.status == RUNNING
+    assert job.started_at is not None
+
+
+def test_late_started_event_does_not_revive_a_finished_job(manager):
+    job = manager.get(manager.submit({"destination_city": "Madurai"}, "session"))
+    manager._handle_event(job.id, "started", None)
+    started_at = job.started_at
+    manager._finish(job.id, finished_future({"result": "plan"}))
+    assert job.status == DONE
+
+    manager._handle_event(job.id, "started", None)
+    assert job.status == DONE
+    assert job.started_at == started_at
+    assert not job.active
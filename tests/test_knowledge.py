@@ -0,0 +1,115 @@
+from datetime import date
+
+import pytest
+
+import TravelKnowledge
+from TravelKnowledge import KnowledgeBase, query_terms, split_passages, travel_month
+
+SEARCH_RESULT = (
+    "Title: Meenakshi Temple timings\nLink: https://a.example\nSnippet: Meenakshi Temple opens at 5am.\n---\n"
+    "Title: Temple dress code\nLink: https://b.example\nSnippet: Meenakshi Temple requires covered shoulders.\n---\n"
+    "Title: Temple entry fee\nLink: https://c.example\nSnippet: Entry to Meenakshi Temple is free; cameras cost extra."
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(TravelKnowledge.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture
+def knowledge(tmp_path, clock):
+    store = KnowledgeBase(path=str(tmp_path / "knowledge.sqlite3"), max_docs=100, max_age_days=30)
+    store.min_hits, store.min_coverage, store.results = 3, 0.75, 5
+    return store
+
+
+def test_query_terms_drop_stopwords_and_repeats():
+    assert query_terms("Best time to visit the Meenakshi temple, temple hours") == [
+        "time", "visit", "meenakshi", "temple", "hours"]
+
+
+def test_split_passages_at_headings_and_long_sections():
+    text = "# Guide\nintro\n## Food\n" + ("word " * 200 + "\n\n") * 2
+    passages = split_passages(text)
+    assert passages[0] == "# Guide\nintro"
+    assert all(len(passage) <= TravelKnowledge.MAX_PASSAGE_CHARS for passage in passages)
+    assert len(passages) == 3
+
+
+def test_passages_are_stored_once(knowledge):
+    assert knowledge.add_search("meenakshi temple", SEARCH_RESULT, "Madurai", "2026-03") == 3
+    assert knowledge.add_search("meenakshi temple hours", SEARCH_RESULT, "madurai ") == 0
+    # The same text for another destination is a different passage
+    assert knowledge.add_search("meenakshi temple", SEARCH_RESULT, "Chennai") == 3
+    assert knowledge.stats()["passages"] == 6
+
+
+def test_reports_skip_heading_only_passages(knowledge):
+    report = "# Local Guide\n## Food\nTry [[Murugan Idli Shop]] for idli.\n---\n## Shopping\n"
+    assert knowledge.add_report("guide", report, "Madurai") == 1
+    (passage,) = knowledge.search("idli", "Madurai")
+    assert passage["title"] == "Food"
+    assert passage["source"] == "guide"
+
+
+def test_search_is_limited_to_the_destination(knowledge):
+    knowledge.add_search("meenakshi temple", SEARCH_RESULT, "Madurai")
+    assert len(knowledge.search("temple timings", "Madurai")) == 3
+    assert knowledge.search("temple timings", "Chennai") == []
+    assert knowledge.search("the of and") == []
+
+
+def test_coverage_counts_stemmed_query_words(knowledge):
+    knowledge.add_search("meenakshi temple", SEARCH_RESULT, "Madurai")
+    passages = knowledge.search("meenakshi temple cameras", "Madurai")
+    assert knowledge.coverage("meenakshi temple cameras", passages) == 1.0
+    assert knowledge.coverage("meenakshi temple parking", passages) == pytest.approx(2 / 3)
+
+
+def test_lookup_answers_only_well_covered_queries(knowledge):
+    knowledge.add_search("meenakshi temple", SEARCH_RESULT, "Madurai")
+    answer = knowledge.lookup("Meenakshi temple", "Madurai")
+    assert answer.count("From past research") == 3
+    assert "0 days old" in answer
+    assert knowledge.lookup("meenakshi temple parking rules", "Madurai") is None
+    assert knowledge.lookup("meenakshi temple", "Chennai") is None
+    stats = knowledge.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_old_passages_are_pruned(knowledge, clock):
+    knowledge.add_search("meenakshi temple", SEARCH_RESULT, "Madurai")
+    clock.now += 31 * 86400
+    knowledge.add_search("madurai weather", "Title: Weather\nLink: https://w.example\nSnippet: Hot in March.",
+                         "Madurai")
+    assert knowledge.stats()["passages"] == 1
+    assert knowledge.pruned == 3
+    # Pruned rows are gone from the full-text index too
+    assert knowledge.search("meenakshi temple", "Madurai") == []
+
+
+def test_oldest_passages_go_beyond_max_docs(knowledge, clock):
+    knowledge.max_docs = 2
+    for index in range(4):
+        clock.now += 1
+        knowledge.add_search(f"query {index}", f"Snippet: fact number{index}", "Madurai")
+    assert knowledge.stats()["passages"] == 2
+    assert knowledge.search("number0", "Madurai") == []
+    assert len(knowledge.search("fact", "Madurai")) == 2
+
+
+def test_travel_month():
+    assert travel_month(date(2026, 3, 2)) == "2026-03"
+    assert travel_month("2026-11-01") == "2026-11"
+    assert travel_month("") is None
@@ -0,0 +1,55 @@
+from TravelModels import ANSWER_STEP, ModelRouter
+
+
+class FakeClient:
+    def __init__(self, model):
+        self.model = model
+        self.stop = []
+        self.calls = 0
+        self.seen_stops = []
+
+    def paced_call(self, messages, forced, attrs, *args, **kwargs):
+        self.calls += 1
+        self.seen_stops.append(list(self.stop))
+        return self.model
+
+    def reset_stats(self):
+        self.calls = 0
+
+    def stats(self):
+        return {"calls": self.calls, "wait_seconds": 1.0, "avg_latency": float(self.calls)}
+
+
+def make_router(target):
+    router = ModelRouter(FakeClient)
+    router.route = lambda llm, agent, messages, forced: (target, ANSWER_STEP)
+    return router
+
+
+def test_routed_requests_keep_the_caller_stop_words():
+    router = make_router("fast")
+    planner, guide = router.client("large"), router.client("other")
+    planner.stop, guide.stop = ["\nObservation:"], ["\nResult:"]
+
+    assert router.call(planner, [], None) == "fast"
+    assert router.call(guide, [], None) == "fast"
+    assert router.call(planner, [], None) == "fast"
+
+    fast = router.routed
+    assert fast[("fast", ("\nObservation:",))].seen_stops == [["\nObservation:"]] * 2
+    assert fast[("fast", ("\nResult:",))].seen_stops == [["\nResult:"]]
+    assert planner.stop == ["\nObservation:"] and planner.calls == 0
+
+
+def test_own_model_requests_use_the_caller_and_stats_merge_per_model():
+    router = make_router("large")
+    planner = router.client("large")
+    router.call(planner, [], None)
+    assert planner.calls == 1 and not router.routed
+
+    router.route = lambda llm, agent, messages, forced: ("fast", ANSWER_STEP)
+    router.call(planner, [], None)
+    router.call(router.client("fast"), [], None)
+    stats = router.stats()
+    assert stats["calls"] == 3
+    assert stats["models"]["fast"] == {"calls": 2, "wait_seconds": 2.0, "avg_latency": 1.0}
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import TravelRateLimiter
+from TravelRateLimiter import (
+    Grant,
+    RateLimiter,
+    estimate_message_tokens,
+    estimate_tokens,
+    get_rate_limiter,
+    set_budget_share,
+)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("x" * 400) == 100
+    assert estimate_message_tokens([{"role": "user", "content": "x" * 40}]) == 14
+
+
+def test_requests_fit_until_rpm_is_reached():
+    limiter = RateLimiter(rpm=2, tpm=1000)
+    now = time.monotonic()
+    assert limiter._seconds_until_room(10, now) == 0
+    limiter._window.extend([Grant(now - 50, 10, 0), Grant(now - 20, 10, 0)])
+    # Room again when the oldest request leaves the 60s window
+    assert abs(limiter._seconds_until_room(10, now) - 10) < 1e-6
+
+
+def test_tokens_wait_for_enough_of_the_window_to_expire():
+    limiter = RateLimiter(rpm=10, tpm=100)
+    now = time.monotonic()
+    limiter._window.extend([Grant(now - 40, 30, 0), Grant(now - 30, 60, 0)])
+    assert limiter._seconds_until_room(10, now) == 0
+    # 40 tokens fit once the oldest grant expires, in 20s; 50 need both gone
+    assert abs(limiter._seconds_until_room(40, now) - 20) < 1e-6
+    assert abs(limiter._seconds_until_room(50, now) - 30) < 1e-6
+
+
+def test_oversized_request_runs_on_an_empty_window():
+    limiter = RateLimiter(rpm=10, tpm=100)
+    assert limiter._seconds_until_room(500, time.monotonic()) == 0
+
+
+def test_window_expires_old_grants():
+    limiter = RateLimiter(rpm=1, tpm=1000, window_seconds=0.2)
+    limiter.acquire("a", 10)
+    started = time.monotonic()
+    grant = limiter.acquire("a", 10)
+    assert time.monotonic() - started >= 0.15
+    assert grant.waited >= 0.15
+    assert limiter.stats()["granted"] == 2
+
+
+def test_settle_replaces_the_estimate():
+    limiter = RateLimiter(rpm=10, tpm=100)
+    grant = limiter.acquire("a", 90)
+    limiter.settle(grant, 20)
+    assert limiter.stats()["tokens_in_window"] == 20
+    assert limiter._seconds_until_room(50, time.monotonic()) == 0
+
+
+def test_pause_holds_every_caller():
+    limiter = RateLimiter(rpm=10, tpm=1000)
+    limiter.pause(0.2)
+    started = time.monotonic()
+    limiter.acquire("a", 10)
+    assert time.monotonic() - started >= 0.15
+
+
+def test_sessions_are_served_round_robin():
+    limiter = RateLimiter(rpm=1, tpm=1000, window_seconds=0.1)
+    limiter.acquire("busy", 1)
+    order = []
+
+    def call(session):
+        limiter.acquire(session, 1)
+        order.append(session)
+
+    threads = [threading.Thread(target=call, args=("busy",)) for _ in range(2)]
+    threads[0].start()
+    time.sleep(0.02)
+    threads[1].start()
+    time.sleep(0.02)
+    threads.append(threading.Thread(target=call, args=("other",)))
+    threads[-1].start()
+    for thread in threads:
+        thread.join(5)
+    # The other session is not stuck behind the busy session's whole queue
+    assert order.index("other") < 2
+
+
+def test_process_workers_split_the_budget(monkeypatch):
+    monkeypatch.setenv("LLM_RPM_LIMIT", "30")
+    monkeypatch.setenv("LLM_TPM_LIMIT", "6000")
+    monkeypatch.setattr(TravelRateLimiter, "_limiters", {})
+    monkeypatch.setattr(TravelRateLimiter, "_budget_share", 1)
+    assert get_rate_limiter("model").rpm == 30
+    set_budget_share(4)
+    limiter = get_rate_limiter("model")
+    assert (limiter.rpm, limiter.tpm) == (7, 1500)
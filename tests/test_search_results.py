@@ -0,0 +1,122 @@
+import pytest
+
+pytest.importorskip("crewai")
+
+from tools.search_tools import (
+    NO_NEW_RESULTS,
+    CachedSearchTool,
+    ResultFilter,
+    SerperClient,
+    canonical_url,
+    shingles,
+    similarity,
+    truncate,
+)
+from TravelRateLimiter import estimate_tokens
+
+PAYLOAD = {
+    "answerBox": {"snippet": "Madurai is hot in March, 22–35 °C."},
+    "knowledgeGraph": {"title": "Madurai", "description": "City in Tamil Nadu"},
+    "peopleAlsoAsk": [{"question": "Is Madurai hot?"}],
+    "relatedSearches": [{"query": "madurai in april"}],
+    "organic": [
+        {"title": "Madurai weather in March", "link": "https://www.weather.example/madurai/march?utm_source=x",
+         "snippet": "March in Madurai is hot and dry with highs of 35C. Pack light cotton clothes."},
+        {"title": "Madurai March weather", "link": "https://weather.example/madurai/march/",
+         "snippet": "Same page, other URL."},
+        {"title": "Madurai climate", "link": "https://climate.example/madurai",
+         "snippet": "March in Madurai is hot and dry with highs of 35C. Pack light cotton clothes!"},
+        {"title": "Hotels", "link": "https://hotels.example/a", "snippet": "Rooms from 900 rupees."},
+        {"title": "Madurai March weather averages", "link": "https://weather.example/b",
+         "snippet": "Average March temperature in Madurai."},
+        {"title": "Madurai weather forecast", "link": "https://weather.example/c",
+         "snippet": "Forecast for Madurai weather this March."},
+    ],
+}
+
+
+def blocks(text):
+    return text.split("\n---\n")
+
+
+def test_serper_format_keeps_answer_and_organic_results_only():
+    text = SerperClient.format(PAYLOAD)
+    assert text.startswith("Answer: Madurai is hot")
+    assert "Tamil Nadu" not in text and "Is Madurai hot?" not in text and "april" not in text
+    assert len(blocks(text)) == 7
+
+
+def test_canonical_url():
+    assert canonical_url("https://www.Example.com/a/?utm_source=x&id=3#top") == "example.com/a?id=3"
+    assert canonical_url("http://m.example.com/a") == canonical_url("https://example.com/a/")
+
+
+def test_truncate_prefers_sentence_ends():
+    text = "The first sentence is here. " + "word " * 200
+    assert truncate("short", 10) == "short"
+    assert truncate(text, 10) == "The first sentence is here."
+    cut = truncate("word " * 200, 10)
+    assert cut.endswith(" …") and len(cut) <= 42
+
+
+def test_similarity_of_near_duplicates():
+    a = shingles("March in Madurai is hot and dry with highs of 35C.")
+    assert similarity(a, shingles("March in Madurai is hot and dry with highs of 35C!")) == 1.0
+    assert similarity(a, shingles("Rooms from 900 rupees.")) == 0.0
+
+
+def test_filter_dedups_ranks_and_caps_per_site():
+    result = SerperClient.format(PAYLOAD)
+    (filtered,), before, after = ResultFilter(max_results=4, result_tokens=100, max_similarity=0.6,
+                                              per_domain=2).apply(["Madurai weather March"], [result])
+    kept = blocks(filtered)
+    assert kept[0].startswith("Answer:")
+    links = [line for line in filtered.splitlines() if line.startswith("Link:")]
+    # The repeated URL, the near-duplicate snippet and the third weather.example page are gone
+    assert links == ["Link: https://www.weather.example/madurai/march?utm_source=x",
+                     "Link: https://weather.example/b", "Link: https://hotels.example/a"]
+    assert before == estimate_tokens(result) and after == estimate_tokens(filtered) < before
+
+
+def test_filter_dedups_across_the_queries_of_a_call():
+    result = SerperClient.format({"organic": PAYLOAD["organic"][:1]})
+    refiner = ResultFilter(max_results=5, result_tokens=100, max_similarity=0.6, per_domain=2)
+    filtered, _, _ = refiner.apply(["madurai weather", "madurai march weather"], [result, result])
+    assert filtered == [result, NO_NEW_RESULTS]
+
+
+def test_filter_trims_each_result_to_its_budget():
+    long = {"organic": [{"title": "Guide", "link": "https://a.example", "snippet": "Temple tips. " * 100}]}
+    (filtered,), _, _ = ResultFilter(result_tokens=40).apply(["temple"], [SerperClient.format(long)])
+    assert estimate_tokens(filtered) <= 40
+
+
+def test_plain_text_results_pass_through():
+    refiner = ResultFilter()
+    filtered, before, after = refiner.apply(["q"], ["No results found."])
+    assert filtered == ["No results found."] and before == after
+
+
+def test_tool_reports_tokens_saved():
+    class Backend:
+        def run(self, search_query, **kwargs):
+            return SerperClient.format(PAYLOAD)
+
+    tool = CachedSearchTool(backend=Backend(), refiner=ResultFilter(max_results=3))
+    output = tool._run(search_queries=["Madurai weather March", "Madurai weather in March"])
+    stats = tool.stats()["refine"]
+    assert stats["calls"] == 1
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"] > 0
+    assert stats["saved_per_call"] == stats["tokens_saved"]
+    assert output.count("## Results for") == 2
+
+
+def test_explicit_zero_settings_are_kept(monkeypatch):
+    monkeypatch.setenv("SEARCH_MAX_SIMILARITY", "0.9")
+    assert ResultFilter(max_similarity=0.0).max_similarity == 0.0
+    assert ResultFilter().max_similarity == 0.9
+
+
+def test_description_states_the_query_cap():
+    assert "(up to 3)" in CachedSearchTool(max_queries=3).description
+    assert "(up to 6)" in CachedSearchTool().description
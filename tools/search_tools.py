@@ -1,21 +1,495 @@
 """
 search_tools.py
 ---------------
-Configures the SerperDevTool for web search capabilities.
+Configures the web search tool backed by the Serper API.
 Relies on STREAMLIT_SECRETS or environment variables for the API key.
+One tool call takes a list of queries, which are fetched concurrently over a
+pooled HTTP session and returned as one merged result, so an agent can cover a
+whole research topic in a single reasoning step. Each query goes through a
+persistent on-disk cache so repeated queries for popular destinations do not
+spend Serper quota or latency again. Before going to Serper, a query is looked up
+in the local knowledge base of past research (TravelKnowledge), and live results
+are added to it. Results are deduplicated, ranked against their query and
+trimmed (ResultFilter) before they reach the agent, whose every later iteration
+re-reads them. The tool is built on first use by get_search_tool(), so
+importing this module stays cheap.
 """
 
+import logging
 import os
-import streamlit as st
-from crewai_tools import SerperDevTool
-
-# Get SERPER_API_KEY from Streamlit secrets or environment variable
-try:
-    serper_api_key = st.secrets.get("SERPER_API_KEY", os.getenv("SERPER_API_KEY", ""))
-    os.environ["SERPER_API_KEY"] = serper_api_key
-except:
-    serper_api_key = os.getenv("SERPER_API_KEY", "")
-    os.environ["SERPER_API_KEY"] = serper_api_key
-
-# Create the search tool using SerperDevTool from crewai_tools
-search_internet = SerperDevTool()
\ No newline at end of file
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Type
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from TravelStartup import configure_api_keys, prepare_crewai, profile
+
+prepare_crewai()
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from TravelBudgets import TOOL_REFUSAL
+from TravelCache import DiskCache
+from TravelConfig import get_flag, get_float, get_int, get_setting
+from TravelKnowledge import KnowledgeBackend, get_knowledge_base, query_terms
+from TravelRateLimiter import CHARS_PER_TOKEN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+RESULT_SEPARATOR = "\n---\n"
+RESULT_FIELD = re.compile(r"^(Title|Link|Snippet): ?(.*)$")
+NO_NEW_RESULTS = "No new results: everything found is already listed above."
+
+# Query-string parameters that only track the click, not the page
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|ref|srsltid)$")
+
+
+def normalize_query(query):
+    """
+    Canonical form of a search query used as the cache key.
+    Case, Unicode compatibility forms, punctuation and spacing do not change
+    what Serper returns, so "Madurai weather, March!" and "madurai  weather march"
+    share an entry.
+    """
+    query = unicodedata.normalize("NFKC", str(query)).lower()
+    query = re.sub(r"[^\w\s&+-]", " ", query)
+    return " ".join(query.split())
+
+
+class SerperClient:
+    """
+    Minimal Serper search client. All requests share one requests.Session whose
+    connection pool is sized for concurrent queries, so parallel searches reuse
+    kept-alive TLS connections; 429 and 5xx responses are retried with backoff.
+    """
+
+    URL = "https://google.serper.dev/search"
+
+    def __init__(self, api_key=None, results=None, timeout=None, pool_size=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.results = results or get_int("SEARCH_RESULTS_PER_QUERY", 8)
+        self.timeout = timeout or get_float("SEARCH_TIMEOUT_SECONDS", 15)
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset({"POST"}))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size or search_concurrency(),
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "X-API-KEY": api_key or os.environ.get("SERPER_API_KEY", ""),
+            "Content-Type": "application/json",
+        })
+
+    def run(self, search_query, **kwargs):
+        response = self.session.post(self.URL, json={"q": search_query, "num": self.results},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return self.format(response.json())
+
+    @staticmethod
+    def format(payload):
+        """
+        Answer box and organic results as plain text blocks. The knowledge graph,
+        "people also ask", related searches and sitelinks are left out: they
+        repeat the organic results or point away from the query.
+        """
+        blocks = []
+        answer = payload.get("answerBox") or {}
+        if answer.get("answer") or answer.get("snippet"):
+            blocks.append(f"Answer: {answer.get('answer') or answer.get('snippet')}")
+        for item in payload.get("organic", []):
+            blocks.append(
+                f"Title: {item.get('title', '')}\nLink: {item.get('link', '')}\n"
+                f"Snippet: {item.get('snippet', '')}"
+            )
+        return "\n---\n".join(blocks)
+
+
+def canonical_url(link):
+    """Host without "www."/"m.", path without a trailing slash, and no tracking parameters or fragment."""
+    parts = urlsplit(str(link).strip().lower())
+    host = re.sub(r"^(www|m)\.", "", parts.netloc)
+    params = [(name, value) for name, value in parse_qsl(parts.query) if not TRACKING_PARAMS.match(name)]
+    query = urlencode(params)
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{query}" if query else "")
+
+
+def shingles(text, size=3):
+    words = re.findall(r"\w+", str(text).lower())
+    return {tuple(words[index:index + size]) for index in range(max(1, len(words) - size + 1))}
+
+
+def similarity(a, b):
+    """Jaccard similarity of two shingle sets."""
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def truncate(text, tokens):
+    """Cuts `text` to about `tokens` tokens, at a sentence end when one is near, else at a word."""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    sentence = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    if sentence >= limit // 2:
+        return cut[:sentence + 1]
+    return cut[:cut.rfind(" ")].rstrip(" ,;:") + " …" if " " in cut else cut + "…"
+
+
+class SearchResult:
+    """One block of a formatted search result: an organic hit (title, link, snippet) or free text."""
+
+    def __init__(self, block, position):
+        self.position = position
+        self.title = self.link = ""
+        self.text = block
+        self.fields = {}
+        for line in block.splitlines():
+            match = RESULT_FIELD.match(line)
+            if match:
+                self.fields[match.group(1)] = match.group(2).strip()
+        if "Link" in self.fields:
+            self.title, self.link = self.fields.get("Title", ""), self.fields["Link"]
+            self.text = self.fields.get("Snippet", "")
+        # Answer boxes come first and are kept whatever their score
+        self.pinned = block.startswith("Answer:")
+        self.url = canonical_url(self.link) if self.link else ""
+        self.domain = self.url.split("/")[0]
+        body = self.text
+        if not self.link and "\n" in body and body.split("\n", 1)[0].endswith(":"):
+            # Past-research passages start with a provenance line that differs between copies
+            body = body.split("\n", 1)[1]
+        self.shingles = shingles(f"{self.title} {body}")
+
+    def relevance(self, terms):
+        """Share of query terms in the title and text (titles count extra), plus a little for search rank."""
+        if not terms:
+            return 1.0 / (1 + self.position)
+        title, text = self.title.lower(), f"{self.title} {self.text}".lower()
+        # Prefix match as a cheap stemmer: "temple" matches "temples"
+        found = sum(1 for term in terms if term[:5] in text) / len(terms)
+        in_title = sum(1 for term in terms if term[:5] in title) / len(terms)
+        return found + 0.5 * in_title + 0.3 / (1 + self.position)
+
+    def render(self, tokens):
+        if not self.link:
+            return truncate(self.text, tokens)
+        head = f"Title: {self.title}\nLink: {self.link}\nSnippet: "
+        return head + truncate(self.text, max(20, tokens - estimate_tokens(head)))
+
+
+class ResultFilter:
+    """
+    Post-processes the results of one tool call before the agent sees them:
+    drops repeated URLs and near-duplicate snippets (also across the call's
+    queries), keeps at most SEARCH_MAX_PER_DOMAIN results per site, ranks the
+    rest by relevance to their query, keeps the best SEARCH_MAX_RESULTS and cuts
+    each to SEARCH_RESULT_TOKENS. Counts the tokens it saves; cached and raw
+    results stay untouched, so changed settings apply to them too.
+    """
+
+    def __init__(self, max_results=None, result_tokens=None, max_similarity=None, per_domain=None):
+        self.max_results = max_results if max_results is not None else get_int("SEARCH_MAX_RESULTS", 5)
+        self.result_tokens = result_tokens if result_tokens is not None else get_int("SEARCH_RESULT_TOKENS", 100)
+        self.max_similarity = (max_similarity if max_similarity is not None
+                               else get_float("SEARCH_MAX_SIMILARITY", 0.6))
+        self.per_domain = per_domain if per_domain is not None else get_int("SEARCH_MAX_PER_DOMAIN", 2)
+        self.calls = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    def apply(self, queries, results):
+        """Filtered result text per query, and the (before, after) token counts of the call."""
+        seen_urls, seen_shingles = set(), []
+        filtered = []
+        for query, result in zip(queries, results):
+            filtered.append(self._filter(query, result, seen_urls, seen_shingles))
+        before = sum(estimate_tokens(result) for result in results)
+        after = sum(estimate_tokens(result) for result in filtered)
+        with self._lock:
+            self.calls += 1
+            self.tokens_before += before
+            self.tokens_after += after
+        return filtered, before, after
+
+    def _filter(self, query, result, seen_urls, seen_shingles):
+        blocks = [block.strip() for block in str(result).split(RESULT_SEPARATOR)]
+        candidates = [SearchResult(block, position) for position, block in enumerate(blocks) if block]
+        if len(candidates) <= 1 and not any(candidate.link for candidate in candidates):
+            # Errors, "No results found." and stand-in backends pass through, only trimmed
+            return result if not candidates else candidates[0].render(self.result_tokens)
+
+        terms = query_terms(query)
+        ranked = sorted(candidates, key=lambda candidate: (not candidate.pinned, -candidate.relevance(terms),
+                                                           candidate.position))
+        kept, per_domain = [], {}
+        for candidate in ranked:
+            if len(kept) >= self.max_results:
+                break
+            if candidate.url and candidate.url in seen_urls:
+                continue
+            if candidate.domain and per_domain.get(candidate.domain, 0) >= self.per_domain:
+                continue
+            if any(similarity(candidate.shingles, other) >= self.max_similarity for other in seen_shingles):
+                continue
+            kept.append(candidate)
+            if candidate.url:
+                seen_urls.add(candidate.url)
+                per_domain[candidate.domain] = per_domain.get(candidate.domain, 0) + 1
+            seen_shingles.append(candidate.shingles)
+        if not kept:
+            return NO_NEW_RESULTS
+        return RESULT_SEPARATOR.join(candidate.render(self.result_tokens) for candidate in kept)
+
+    def stats(self):
+        saved = self.tokens_before - self.tokens_after
+        return {
+            "calls": self.calls,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": saved,
+            "saved_per_call": saved / self.calls if self.calls else 0.0,
+            "saved_share": saved / self.tokens_before if self.tokens_before else 0.0,
+        }
+
+
+def search_concurrency():
+    return max(1, get_int("SEARCH_CONCURRENCY", 4))
+
+
+_search_executor = None
+_search_executor_lock = threading.Lock()
+
+
+def get_search_executor():
+    """Thread pool shared by all sessions for fetching the queries of one tool call."""
+    global _search_executor
+    with _search_executor_lock:
+        if _search_executor is None:
+            _search_executor = ThreadPoolExecutor(max_workers=search_concurrency(),
+                                                  thread_name_prefix="search")
+        return _search_executor
+
+
+class SearchQuery(BaseModel):
+    search_queries: List[str] = Field(
+        default_factory=list,
+        description=(
+            "List of search queries to run together, e.g. "
+            '["Madurai weather March", "Madurai budget hotels", "Chennai to Madurai trains"]'
+        ),
+    )
+    search_query: Optional[str] = Field(
+        None, description="A single search query, if you only need one"
+    )
+
+    @field_validator("search_queries", mode="before")
+    @classmethod
+    def _wrap_single_query(cls, value):
+        # Models sometimes send one string where a list is expected
+        if value is None:
+            return []
+        return [value] if isinstance(value, str) else value
+
+
+SEARCH_DESCRIPTION = (
+    "Searches the internet. Pass every query you need for your current topic at once "
+    "as a list in search_queries (up to {max_queries}), e.g. weather, hotels and transport together; "
+    "they run in parallel and the results for each query are returned together."
+)
+
+
+class CachedSearchTool(BaseTool):
+    """
+    Wraps a search backend with a TTL/LRU DiskCache keyed by the normalized query.
+    A call runs up to `max_queries` distinct queries concurrently and returns one
+    section per query; a failed query reports its error in its own section and
+    is not cached. Each agent uses its own copy (`for_run`) sharing the backend
+    and cache, so a run can bind its tracer, the agent's budget and the trip's
+    destination without affecting other agents or sessions; a call over budget
+    runs no queries. With a `knowledge` base, a query it covers well is answered
+    from past research, and live results are stored in it. With a `refiner`
+    (ResultFilter), the call's results are deduplicated, ranked and trimmed
+    before they are returned.
+    """
+
+    name: str = "Search the internet"
+    description: str = ""
+    args_schema: Type[BaseModel] = SearchQuery
+    backend: Any = None
+    cache: Any = None
+    bypass: bool = False
+    tracer: Any = None
+    budget: Any = None
+    knowledge: Any = None
+    refiner: Any = None
+    destination: str = ""
+    travel_month: Optional[str] = None
+    max_queries: int = 6
+
+    @model_validator(mode="before")
+    @classmethod
+    def _describe_max_queries(cls, data):
+        # The description tells the model the query cap this tool really applies
+        if isinstance(data, dict) and not data.get("description"):
+            data = dict(data, description=SEARCH_DESCRIPTION.format(max_queries=data.get("max_queries", 6)))
+        return data
+
+    def for_run(self):
+        """A copy sharing the backend and cache, for one agent."""
+        return self.model_copy()
+
+    def _run(self, search_queries: Optional[List[str]] = None, search_query: Optional[str] = None,
+             **kwargs):
+        queries = self._queries(search_queries, search_query)
+        if not queries:
+            return "No search query given. Pass a list of queries in search_queries."
+        if self.budget is not None and not self.budget.use_tool():
+            return TOOL_REFUSAL
+        if self.tracer is None:
+            return self._search_all(queries, None)
+        with self.tracer.span("search_internet", "tool", queries=len(queries)) as span:
+            return self._search_all(queries, span)
+
+    def _queries(self, search_queries, search_query):
+        """Distinct queries in the order given, capped at max_queries."""
+        if isinstance(search_queries, str):
+            search_queries = [search_queries]
+        queries, seen = [], set()
+        for query in list(search_queries or []) + [search_query]:
+            key = normalize_query(query) if query else ""
+            if key and key not in seen:
+                seen.add(key)
+                queries.append(str(query).strip())
+        return queries[:self.max_queries]
+
+    def _search_all(self, queries, span):
+        parent_id = span.id if span is not None else None
+        if len(queries) == 1:
+            results = [self._search_one(queries[0], parent_id)]
+        else:
+            results = list(get_search_executor().map(
+                lambda query: self._search_one(query, parent_id), queries
+            ))
+        if self.refiner is not None:
+            results, before, after = self.refiner.apply(queries, results)
+            if span is not None:
+                span.attrs.update(tokens_raw=before, tokens_kept=after, tokens_saved=before - after)
+        return "\n\n".join(
+            f'## Results for "{query}"\n{result}' for query, result in zip(queries, results)
+        )
+
+    def _search_one(self, query, parent_id):
+        start = time.perf_counter()
+        attrs = {}
+        try:
+            result = self._search(query, attrs) or "No results found."
+        except Exception as exc:
+            attrs["error"] = f"{type(exc).__name__}: {exc}"[:200]
+            result = f"Search failed ({type(exc).__name__}); try a different query."
+        if self.tracer is not None:
+            # Recorded with add(): worker threads do not share the caller's span stack
+            self.tracer.add("search", "search", start, time.perf_counter(), parent_id=parent_id,
+                            query=query[:120], **attrs)
+        return result
+
+    def _search(self, search_query, attrs):
+        use_cache = not self.bypass and self.cache is not None
+        key = normalize_query(search_query)
+        if use_cache:
+            cached = self.cache.get(key)
+            attrs["cached"] = cached is not None
+            if cached is not None:
+                return cached
+
+        known = self._lookup(search_query)
+        attrs["knowledge"] = known is not None
+        if known is not None:
+            return known
+
+        result = self.backend.run(search_query=search_query, destination=self.destination)
+        if result and use_cache:
+            self.cache.set(key, result)
+        if result and self.knowledge is not None:
+            try:
+                self.knowledge.add_search(search_query, result, self.destination, self.travel_month)
+            except sqlite3.Error as exc:
+                logger.warning("Could not store search results in the knowledge base: %s", exc)
+        return result
+
+    def _lookup(self, search_query):
+        # The knowledge base is an optimization: when it fails, search live
+        if self.knowledge is None:
+            return None
+        try:
+            return self.knowledge.lookup(search_query, self.destination or None)
+        except sqlite3.Error as exc:
+            logger.warning("Knowledge base lookup failed: %s", exc)
+            return None
+
+    def stats(self):
+        if self.cache is None:
+            stats = {"hits": 0, "misses": 0, "hit_rate": 0.0, "evictions": 0, "entries": 0}
+        else:
+            stats = self.cache.stats()
+        if self.knowledge is not None:
+            stats["knowledge"] = self.knowledge.stats()
+        if self.refiner is not None:
+            stats["refine"] = self.refiner.stats()
+        return stats
+
+
+_search_tool = None
+_search_tool_lock = threading.Lock()
+
+
+def get_search_tool():
+    """Returns the shared search tool, building the Serper client and its cache on first use."""
+    global _search_tool
+    with _search_tool_lock:
+        if _search_tool is None:
+            # Get SERPER_API_KEY from Streamlit secrets or environment variable
+            configure_api_keys()
+            with profile.timed("init search tool"):
+                # Create the search tool using the pooled Serper client, fronted by the
+                # cache and the knowledge base; SEARCH_BACKEND = "knowledge" runs offline
+                if get_setting("SEARCH_BACKEND", "serper") == "knowledge":
+                    backend, knowledge = KnowledgeBackend(), None
+                else:
+                    backend, knowledge = SerperClient(), get_knowledge_base()
+                _search_tool = CachedSearchTool(
+                    backend=backend,
+                    knowledge=knowledge,
+                    cache=DiskCache(
+                        "search",
+                        ttl_seconds=get_float("SEARCH_CACHE_TTL_HOURS", 24) * 3600,
+                        max_entries=get_int("SEARCH_CACHE_MAX_ENTRIES", 2000),
+                    ),
+                    bypass=get_flag("SEARCH_CACHE_BYPASS", False),
+                    refiner=ResultFilter() if get_flag("SEARCH_FILTER", True) else None,
+                    max_queries=get_int("SEARCH_MAX_QUERIES", 6),
+                )
+        return _search_tool
+
+
+def set_search_tool(tool):
+    """Replaces the shared tool, e.g. with a stand-in backend for offline benchmarks."""
+    global _search_tool
+    with _search_tool_lock:
+        _search_tool = tool
+
+
+def __getattr__(name):
+    # `search_internet` keeps working as a module attribute, built lazily
+    if name == "search_internet":
+        return get_search_tool()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")